@@ -18,6 +18,28 @@ MODEL_CONFIG = {
     "CHAT": "gemini-1.5-flash-latest"
 }
 
+# 模型路由分級 (由快到精確)：model_router 依輸入大小、頁面複雜度與觀測到的延遲 / 錯誤率，
+# 在這些分級之間為每個請求選擇模型；只有困難的頁面才使用 pro 分級
+MODEL_TIERS = {
+    "fast": "gemini-1.5-flash-latest",
+    "standard": "gemini-2.5-flash-preview-05-20",
+    "pro": "gemini-1.5-pro-latest",
+}
+
+# 主要分級的模型過慢或過載時改用的備援分級
+MODEL_TIER_FALLBACK = {
+    "fast": "standard",
+    "standard": "fast",
+    "pro": "standard",
+}
+
+# 各分級的平均延遲 (秒) 超過此值時，視為過慢並改用備援分級
+MODEL_TIER_LATENCY_BUDGET = {
+    "fast": 20,
+    "standard": 45,
+    "pro": 90,
+}
+
 
 # ==============================================================================
 #                                  Prompts
@@ -110,4 +132,41 @@ PROMPTS = {
     "page": 98
   }
 ]
-"""}
\ No newline at end of file
+""",
+
+    "OCR_BATCH_FORMAT": """
+以下一次提供 {page_count} 張頁面圖片，每張圖片前都標有頁碼（例如 `[頁碼 12]`）。請依上述說明分別處理每一頁。
+【輸出格式（優先於上述說明）】
+- 每一頁的結果之前，先單獨一行輸出分隔標記 `<<<PAGE 頁碼>>>`，例如 `<<<PAGE 12>>>`。
+- 依頁碼順序輸出，每一頁都必須有分隔標記；某頁沒有可輸出的文字時，分隔標記之後留空即可。
+- 不要在分隔標記以外加入任何說明文字。
+""",
+
+    "PDF_SPLIT_TOC_LOCATE": """
+你是一個文件結構偵測助理。以下是一份 PDF 文件部分頁面的低解析度縮圖，每張縮圖前都標有其頁面索引（例如 `[頁面索引 12]`）。
+你的任務【只是】判斷哪些頁面屬於文件的目錄（Table of Contents / 目次），不需要辨識目錄內容。
+
+- 目錄頁通常包含多行「章節標題 + 頁碼」的排列，常見標題為「目錄」、「目次」、「Contents」。
+- 圖目錄、表目錄也算目錄頁。
+- 如果沒有任何目錄頁，請回傳空陣列。
+
+請只輸出一個 JSON 整數陣列，內容為目錄頁的頁面索引，例如：`[3, 4, 5]`
+""",
+
+    "CHAT_HISTORY_SUMMARY": """
+請將以下對話紀錄濃縮成一份簡潔的【繁體中文】摘要，供 AI 在後續對話中作為背景參考。
+- 保留使用者的目標、偏好、已確認的事實、重要的數字與結論。
+- 省略寒暄與重複的內容。
+- 只輸出摘要本身，不要加入任何前言。
+
+先前的摘要 (可能為空)：
+---
+{previous_summary}
+---
+
+需要併入摘要的新對話：
+---
+{conversation_text}
+---
+"""
+}
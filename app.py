@@ -8,26 +8,41 @@ import queue
 import threading
 import logging
 import shutil
-import locale
 import sys
 import configparser
 import socket
 import time
-
-# --- Web 框架與 GUI ---
+import argparse
+import contextlib
+import multiprocessing
+STARTUP_T0 = time.perf_counter()
+# 打包後的執行檔中，文件建構行程池的子行程也以本執行檔啟動，需在其他初始化之前交給 multiprocessing (未打包時為 no-op)
+multiprocessing.freeze_support()
+
+# --- Web 框架 ---
 from flask import Flask, request, render_template, flash, redirect, url_for, Response, jsonify, session
 from werkzeug.utils import secure_filename
-import webview
-import google.generativeai as genai
-import docx
+
+# --- 延遲載入：SDK 在第一次使用時才 import ---
+# (webview 只在 __main__ 中 import，讓設定錯誤視窗也不必付出其他模組的載入成本)
+from lazy_imports import LazyModule, start_prewarm_thread, check_startup_budget
+from logging_setup import setup_logging
+genai = LazyModule("google.generativeai")
 
 # --- 專案內部模組 ---
 from ai_config import MODEL_CONFIG, PROMPTS
-from workflow_scripts.pdf_ocr_translator import run_ocr_translation, run_ocr_only, run_ocr_translation_for_image
-from workflow_scripts.text_summarizer import run_summarization
-from workflow_scripts.summary_to_ppt import run_conversion_to_ppt
-from workflow_scripts.pdf_splitter import run_pdf_split
-from desktop_utils import copy_to_desktop_folder, open_folder_in_explorer
+from task_workflows import (ALLOWED_EXTENSIONS_OCR, ALLOWED_EXTENSIONS_BY_TASK, OCR_IMAGE_EXTENSIONS, parse_output_formats,
+                            parse_page_ranges, run_task)
+from desktop_utils import open_folder_in_explorer
+from event_hub import EventHub
+from chat_store import ConversationStore, start_compaction
+from progress_events import ProgressEmitter, ErrorEvent
+from task_cancel import CancelToken, TaskCancelled
+from key_pool import KeyPool, keys_from_config, set_key_pool
+from usage_store import UsageStore, get_usage_store, set_usage_store, record_model_call
+from document_pool import DOCUMENT_POOL_WORKERS, DocumentPool, set_document_pool
+from web_server import (SERVER_MODES, SERVER_THREADS, StreamLimiter, precompress_static, resolve_server_mode, serve,
+                        setup_gzip, setup_static_caching, sse_stream_limit)
 
 # ==============================================================================
 #                                  應用程式設置
@@ -41,23 +56,14 @@ def get_base_path():
 BASE_PATH = get_base_path()
 CONFIG_FILE = os.path.join(BASE_PATH, 'config.ini')
 LOG_FILE = os.path.join(BASE_PATH, 'ai_toolkit.log')
+USAGE_DB_FILE = os.path.join(BASE_PATH, 'usage_metrics.db')
 
-logging.basicConfig(level=logging.INFO,
-                    format='%(asctime)s [%(levelname)s] %(threadName)s: %(message)s',
-                    handlers=[
-                        logging.FileHandler(LOG_FILE, mode='a', encoding='utf-8'),
-                        logging.StreamHandler(sys.stdout)
-                    ])
+# 日誌經由佇列交給背景執行緒寫入 (依大小輪替的日誌檔 + 主控台)，不阻塞請求與任務執行緒
+setup_logging(LOG_FILE, level=logging.INFO, stream=sys.stdout)
 
 app = Flask(__name__)
 UPLOAD_FOLDER = os.path.join(BASE_PATH, 'uploads')
 OUTPUT_FOLDER = os.path.join(BASE_PATH, 'outputs')
-ALLOWED_EXTENSIONS_PDF = {'pdf'}
-ALLOWED_EXTENSIONS_OCR = {'pdf', 'png', 'jpg', 'jpeg', 'bmp', 'gif', 'webp'}
-ALLOWED_EXTENSIONS_FULL_REPORT = {'pdf'}
-# +++ 新增：允許的文字檔案類型 +++
-ALLOWED_EXTENSIONS_TEXT = {'docx', 'txt'}
-
 
 app.secret_key = os.environ.get("FLASK_SECRET_KEY", "a_very_secret_key_that_should_be_changed")
 app.config['UPLOAD_FOLDER'] = UPLOAD_FOLDER
@@ -66,391 +72,126 @@ app.config['OUTPUT_FOLDER'] = OUTPUT_FOLDER
 os.makedirs(app.config['UPLOAD_FOLDER'], exist_ok=True)
 os.makedirs(app.config['OUTPUT_FOLDER'], exist_ok=True)
 
+# 每次模型呼叫的 token 數與延遲記錄在本機 SQLite，統計結果見 /usage
+set_usage_store(UsageStore(USAGE_DB_FILE))
+
+# 靜態檔案長期快取 (網址帶版本參數)、文字回應 gzip 壓縮
+setup_static_caching(app)
+setup_gzip(app)
+
 # ==============================================================================
 #                              背景任務處理機制
 # ==============================================================================
 central_task_queue = queue.Queue()
-task_progress_queues = {}
+event_hub = EventHub()
+chat_store = ConversationStore()
+# 每條 SSE 串流佔用一條伺服器執行緒；上限在選擇伺服器時依執行緒數設定
+stream_limiter = StreamLimiter()
+# 執行中的任務沒有任何 SSE 訂閱者 (例如分頁已關閉) 超過此秒數時自動取消；0 表示不自動取消。
+# 可在 config.ini 的 [Tasks] IDLE_CANCEL_SECONDS 設定
+app.config['TASK_IDLE_CANCEL_SECONDS'] = 120
+TASK_IDLE_CHECK_INTERVAL = 5
+# 工作流程輸出的格式 (以逗號分隔，Word 一律輸出)，例如 "docx, md, json"；
+# 可在 config.ini 的 [Output] FORMATS 設定，或由 /process_task 的 output_formats 欄位逐一指定
+app.config['OUTPUT_FORMATS'] = 'docx'
+# 尚未結束的任務 (排隊中或執行中): task_id -> {'token': CancelToken, 'started_at': 開始執行的時間或 None}
+active_tasks = {}
+active_tasks_lock = threading.Lock()
+
+def register_task(task_id):
+    """建立任務的事件頻道與取消權杖；取消時立即通知所有訂閱者。"""
+    channel = event_hub.create(task_id)
+    token = CancelToken()
+    token.add_callback(lambda: ProgressEmitter(channel).error(f'{token.reason}。'))
+    with active_tasks_lock:
+        active_tasks[task_id] = {'token': token, 'started_at': None}
+    return token
+
+def cancel_task(task_id, reason):
+    with active_tasks_lock:
+        entry = active_tasks.get(task_id)
+    if entry is None:
+        return False
+    if entry['token'].cancel(reason):
+        logging.info(f"[任務取消] 任務 {task_id}: {reason}")
+    return True
 
 def task_worker():
     logging.info("[背景工作者] 工作者執行緒已啟動，等待任務...")
     while True:
         task_info = None
         task_id = None
-        progress_queue = None
+        progress = None
         try:
             task_info = central_task_queue.get()
             task_id = task_info.get('task_id')
             task_type = task_info.get('task_type')
-            progress_queue = task_progress_queues.get(task_id)
+            channel = event_hub.get(task_id)
 
-            if not task_id or not task_type or not progress_queue:
-                logging.error(f"[背景工作者] 從佇列收到無效的任務資訊或找不到進度佇列: {task_info}")
-                central_task_queue.task_done()
+            if not task_id or not task_type or not channel:
+                logging.error(f"[背景工作者] 從佇列收到無效的任務資訊或找不到事件頻道: {task_info}")
+                continue
+            progress = ProgressEmitter(channel)
+            token = task_info.get('cancel_token')
+            if token is not None and token.cancelled:
+                logging.info(f"[背景工作者] 任務 {task_id} 在開始前已取消，略過。")
                 continue
+            with active_tasks_lock:
+                if task_id in active_tasks: active_tasks[task_id]['started_at'] = time.monotonic()
 
             logging.info(f"[背景工作者] 開始處理任務 {task_id} (類型: {task_type})")
             api_key = app.config.get('GEMINI_API_KEY')
             if not api_key:
                 raise ValueError(f"任務 {task_id} 缺少 GEMINI_API_KEY")
-            
+
+            # 工作流程的請求經由金鑰池綁定各自的金鑰；其餘呼叫使用全域設定的第一組金鑰
             genai.configure(api_key=api_key)
 
-            if task_type == 'pdf_to_ppt':
-                run_full_workflow(progress_queue, task_id, api_key, task_info)
-            elif task_type == 'full_report':
-                run_full_report_workflow(progress_queue, task_id, api_key, task_info)
-            elif task_type == 'ocr':
-                run_ocr_workflow(progress_queue, task_id, api_key, task_info)
-            elif task_type == 'summarize':
-                run_summarize_workflow(progress_queue, task_id, api_key, task_info)
-            elif task_type == 'file_split':
-                run_split_workflow(progress_queue, task_id, api_key, task_info)
-            # +++ 新增：處理新的任務類型 +++
-            elif task_type == 'text_to_ppt':
-                run_text_to_ppt_workflow(progress_queue, task_id, api_key, task_info)
-            else:
-                logging.warning(f"[背景工作者] 未知的任務類型: {task_type} (ID: {task_id})")
-                progress_queue.put(json.dumps({'type': 'error', 'message': f'未知的任務類型: {task_type}'}))
+            run_task(progress, task_info, api_key)
 
             logging.info(f"[背景工作者] 任務 {task_id} 處理完成。")
 
+        except TaskCancelled as cancelled:
+            # 取消事件已在取消當下送出 (見 register_task)
+            logging.info(f"[背景工作者] 任務 {task_id} 已取消: {cancelled}")
         except Exception as worker_e:
             logging.error(f"[背景工作者] 處理任務 {task_id} 時發生錯誤: {worker_e}", exc_info=True)
-            if progress_queue:
-                progress_queue.put(json.dumps({'type': 'error', 'message': f'處理任務時發生內部錯誤: {worker_e}'}))
+            if progress:
+                progress.error(f'處理任務時發生內部錯誤: {worker_e}')
         finally:
             central_task_queue.task_done()
             if task_id:
-                task_progress_queues.pop(task_id, None)
-                logging.debug(f"[背景工作者] 任務 {task_id} 已完成並清理其進度佇列。")
+                with active_tasks_lock: active_tasks.pop(task_id, None)
+                event_hub.close(task_id)
+                logging.debug(f"[背景工作者] 任務 {task_id} 已完成，事件頻道將保留 {event_hub.retention_seconds} 秒供重新連線。")
 
 worker_thread = threading.Thread(target=task_worker, daemon=True, name="TaskWorkerThread")
 worker_thread.start()
 
+def idle_task_watchdog():
+    """取消執行中、但已沒有任何頁面在監看的任務，避免繼續消耗 API 額度並讓後面排隊的任務等待。"""
+    while True:
+        time.sleep(TASK_IDLE_CHECK_INTERVAL)
+        idle_limit = app.config.get('TASK_IDLE_CANCEL_SECONDS') or 0
+        if idle_limit <= 0: continue
+        with active_tasks_lock:
+            running = [(task_id, entry['started_at']) for task_id, entry in active_tasks.items()
+                       if entry['started_at'] is not None and not entry['token'].cancelled]
+        for task_id, started_at in running:
+            channel = event_hub.get(task_id)
+            # 排隊期間瀏覽器的連線可能還在等待其他串流結束，因此從任務開始執行時才起算
+            if channel is not None and channel.idle_seconds(since=started_at) > idle_limit:
+                cancel_task(task_id, f"已超過 {idle_limit} 秒沒有頁面監看此任務，已自動取消")
+
+watchdog_thread = threading.Thread(target=idle_task_watchdog, daemon=True, name="IdleTaskWatchdog")
+watchdog_thread.start()
+
 # ==============================================================================
 #                                輔助函式
 # ==============================================================================
 def allowed_file(filename, allowed_extensions):
     return '.' in filename and filename.rsplit('.', 1)[1].lower() in allowed_extensions
 
-def read_text_from_file(filepath):
-    _, extension = os.path.splitext(filepath)
-    extension = extension.lower()
-    text = ""
-    logging.info(f"嘗試讀取檔案: {filepath}")
-    try:
-        if extension == '.docx':
-            doc = docx.Document(filepath)
-            text = "\n".join([para.text for para in doc.paragraphs if para.text])
-        elif extension == '.txt':
-            try:
-                with open(filepath, 'r', encoding='utf-8') as f:
-                    text = f.read()
-            except UnicodeDecodeError:
-                default_encoding = locale.getpreferredencoding(False)
-                with open(filepath, 'r', encoding=default_encoding) as f:
-                    text = f.read()
-        else:
-            raise ValueError(f"不支援讀取文字的檔案類型: {extension}")
-        logging.info(f"成功讀取檔案: {os.path.basename(filepath)} (文字長度: {len(text)})")
-        return text
-    except Exception as e:
-        logging.error(f"讀取檔案失敗 ({filepath}): {e}", exc_info=True)
-        raise
-
-# ==============================================================================
-#                                工作流程函式
-# ==============================================================================
-
-# +++ 新增：處理文字檔到簡報的工作流程 +++
-def run_text_to_ppt_workflow(progress_queue, task_id, api_key, task_info):
-    """從文字檔 (docx, txt) 開始，執行 摘要 -> 簡報 的流程。"""
-    logging.info(f"[工作流程 {task_id} - 文字檔->PPT] 開始...")
-    original_fn = task_info['original_base_filename_preserved']
-    uploaded_file = task_info['uploaded_file_path']
-    task_folder = task_info['task_output_folder']
-    
-    summary_subfolder = "sum"
-    ppt_subfolder = "ppt"
-    
-    summary_word_path = os.path.join(task_folder, "summary.docx")
-    temp_ppt_path = os.path.join(task_folder, "ppt.pptx")
-    
-    overall_success = False
-    output_path = None
-    
-    try:
-        # 步驟 1: 讀取檔案內容
-        progress_queue.put(json.dumps({'type': 'status', 'step': 1, 'status': '讀取檔案內容...', 'percent': 10}))
-        document_text = read_text_from_file(uploaded_file)
-        if not document_text.strip():
-            raise ValueError("上傳的檔案內容為空或無法讀取。")
-
-        # 步驟 2: 生成摘要
-        progress_queue.put(json.dumps({'type': 'status', 'step': 2, 'status': '生成摘要...', 'percent': 25}))
-        if not run_summarization(api_key, MODEL_CONFIG['SUMMARIZE'], document_text, summary_word_path, progress_queue):
-            raise Exception("步驟 2 (生成摘要) 失敗")
-        copy_to_desktop_folder(summary_word_path, summary_subfolder, f"sum_{original_fn}.docx")
-
-        # 步驟 3: 生成簡報
-        progress_queue.put(json.dumps({'type': 'status', 'step': 3, 'status': '生成簡報...', 'percent': 80}))
-        if not run_conversion_to_ppt(summary_word_path, temp_ppt_path):
-            raise Exception("步驟 3 (轉換為簡報) 失敗")
-
-        final_path, final_ppt_name = copy_to_desktop_folder(temp_ppt_path, ppt_subfolder, f"ppt_{original_fn}.pptx")
-        if not final_path:
-            raise Exception("儲存最終簡報到桌面失敗")
-        
-        output_path = os.path.dirname(os.path.dirname(final_path))
-        progress_queue.put(json.dumps({
-            'type': 'complete', 
-            'message': f'簡報 "{final_ppt_name}" 及摘要檔案已分類儲存。',
-            'folder_path': output_path
-        }))
-        overall_success = True
-
-    except Exception as e:
-        logging.error(f"[工作流程 {task_id} - 文字檔->PPT] 失敗: {e}", exc_info=True)
-        progress_queue.put(json.dumps({'type': 'error', 'message': f'處理失敗: {e}'}))
-    finally:
-        if os.path.exists(task_folder):
-            shutil.rmtree(task_folder, ignore_errors=True)
-        if not overall_success:
-            progress_queue.put(json.dumps({'type': 'done'}))
-
-
-def run_full_report_workflow(progress_queue, task_id, api_key, task_info):
-    """執行 PDF -> 原文 -> 翻譯 -> 摘要 -> 簡報 的完整流程，並將4個檔案分類儲存。"""
-    logging.info(f"[工作流程 {task_id} - 完整簡報生成] 開始...")
-    original_fn = task_info['original_base_filename_preserved']
-    uploaded_pdf = task_info['uploaded_file_path']
-    task_folder = task_info['task_output_folder']
-    
-    ocr_subfolder = "ocr"
-    trans_subfolder = "trans"
-    summary_subfolder = "sum"
-    ppt_subfolder = "ppt"
-    
-    ocr_path = os.path.join(task_folder, "ocr.docx")
-    trans_path = os.path.join(task_folder, "translated.docx")
-    summary_path = os.path.join(task_folder, "summary.docx")
-    ppt_path = os.path.join(task_folder, "ppt.pptx")
-    
-    overall_success = False
-    output_path = None
-    try:
-        # 步驟 1: 純 OCR 掃描原文
-        progress_queue.put(json.dumps({'type': 'status', 'step': 1, 'status': '掃描原文 (OCR)...', 'percent': 5}))
-        if not run_ocr_only(api_key, MODEL_CONFIG['OCR'], uploaded_pdf, ocr_path, progress_queue):
-            raise Exception("步驟 1 (掃描原文) 失敗")
-        copy_to_desktop_folder(ocr_path, ocr_subfolder, f"ocr_{original_fn}.docx")
-        
-        # 讀取 OCR 結果以進行下一步翻譯
-        ocr_text = read_text_from_file(ocr_path)
-        if not ocr_text.strip(): raise ValueError("掃描後的原文內容為空")
-
-        # 步驟 2: 翻譯原文
-        progress_queue.put(json.dumps({'type': 'status', 'step': 2, 'status': '翻譯原文...', 'percent': 30}))
-        translation_prompt = f"請將以下全文精確地翻譯成繁體中文，並盡可能保持原有的格式和段落結構。請不要添加任何摘要或評論，只需純粹的翻譯。\n\n---\n{ocr_text}\n---"
-        # 使用成本較低的模型進行純文字翻譯
-        trans_model = genai.GenerativeModel(MODEL_CONFIG['OCR']) 
-        response = trans_model.generate_content(translation_prompt)
-        if not hasattr(response, 'text') or not response.text: 
-            raise Exception("步驟 2 (翻譯) 失敗: AI 未返回有效的翻譯內容。")
-        
-        translated_text = response.text
-        trans_doc = docx.Document()
-        trans_doc.add_paragraph(translated_text)
-        trans_doc.save(trans_path)
-        copy_to_desktop_folder(trans_path, trans_subfolder, f"trans_{original_fn}.docx")
-
-        # 步驟 3: 生成摘要
-        progress_queue.put(json.dumps({'type': 'status', 'step': 3, 'status': '生成摘要...', 'percent': 55}))
-        if not run_summarization(api_key, MODEL_CONFIG['SUMMARIZE'], translated_text, summary_path, progress_queue):
-            raise Exception("步驟 3 (生成摘要) 失敗")
-        copy_to_desktop_folder(summary_path, summary_subfolder, f"sum_{original_fn}.docx")
-
-        # 步驟 4: 生成簡報
-        progress_queue.put(json.dumps({'type': 'status', 'step': 4, 'status': '生成簡報...', 'percent': 80}))
-        if not run_conversion_to_ppt(summary_path, ppt_path):
-            raise Exception("步驟 4 (轉換為簡報) 失敗")
-        
-        final_path, _ = copy_to_desktop_folder(ppt_path, ppt_subfolder, f"ppt_{original_fn}.pptx")
-        if not final_path: raise Exception("儲存最終簡報到桌面失敗")
-        
-        output_path = os.path.dirname(os.path.dirname(final_path))
-        progress_queue.put(json.dumps({
-            'type': 'complete', 
-            'message': '完整報告處理完成，4類檔案已分類儲存。',
-            'folder_path': output_path
-        }))
-        overall_success = True
-
-    except Exception as e:
-        logging.error(f"[工作流程 {task_id} - 完整簡報生成] 失敗: {e}", exc_info=True)
-        progress_queue.put(json.dumps({'type': 'error', 'message': f'處理失敗: {e}'}))
-    finally:
-        if os.path.exists(task_folder): shutil.rmtree(task_folder, ignore_errors=True)
-        if not overall_success: progress_queue.put(json.dumps({'type': 'done'}))
-
-
-def run_full_workflow(progress_queue, task_id, api_key, task_info):
-    logging.info(f"[工作流程 {task_id} - PDF->PPT] 開始...")
-    original_fn = task_info['original_base_filename_preserved']
-    uploaded_pdf = task_info['uploaded_file_path']
-    task_folder = task_info['task_output_folder']
-    
-    trans_subfolder = "trans"
-    summary_subfolder = "sum"
-    ppt_subfolder = "ppt"
-    
-    step1_word_path = os.path.join(task_folder, "translated.docx")
-    summary_word_path = os.path.join(task_folder, "summary.docx")
-    temp_ppt_path = os.path.join(task_folder, "ppt.pptx")
-    overall_success = False
-    output_path = None
-    try:
-        progress_queue.put(json.dumps({'type': 'status', 'step': 1, 'status': 'OCR與翻譯...', 'percent': 5}))
-        if not run_ocr_translation(api_key, MODEL_CONFIG['OCR'], uploaded_pdf, step1_word_path, progress_queue):
-            raise Exception("步驟 1 (OCR/翻譯) 失敗")
-        copy_to_desktop_folder(step1_word_path, trans_subfolder, f"trans_{original_fn}.docx")
-
-        progress_queue.put(json.dumps({'type': 'status', 'step': 2, 'status': '生成摘要...', 'percent': 40}))
-        step1_text = read_text_from_file(step1_word_path)
-        if not step1_text.strip(): raise ValueError("翻譯檔案內容為空")
-        if not run_summarization(api_key, MODEL_CONFIG['SUMMARIZE'], step1_text, summary_word_path, progress_queue):
-            raise Exception("步驟 2 (生成摘要) 失敗")
-        copy_to_desktop_folder(summary_word_path, summary_subfolder, f"sum_{original_fn}.docx")
-        
-        progress_queue.put(json.dumps({'type': 'status', 'step': 3, 'status': '生成簡報...', 'percent': 80}))
-        if not run_conversion_to_ppt(summary_word_path, temp_ppt_path):
-            raise Exception("步驟 3 (轉換為簡報) 失敗")
-
-        final_path, final_ppt_name = copy_to_desktop_folder(temp_ppt_path, ppt_subfolder, f"ppt_{original_fn}.pptx")
-        if not final_path: raise Exception("儲存最終簡報到桌面失敗")
-        
-        output_path = os.path.dirname(os.path.dirname(final_path))
-        progress_queue.put(json.dumps({
-            'type': 'complete', 
-            'message': f'快速簡報 "{final_ppt_name}" 及過程檔案已分類儲存。',
-            'folder_path': output_path
-        }))
-        overall_success = True
-
-    except Exception as e:
-        logging.error(f"[工作流程 {task_id} - PDF->PPT] 失敗: {e}", exc_info=True)
-        progress_queue.put(json.dumps({'type': 'error', 'message': f'處理失敗: {e}'}))
-    finally:
-        if os.path.exists(task_folder): shutil.rmtree(task_folder, ignore_errors=True)
-        if not overall_success: progress_queue.put(json.dumps({'type': 'done'}))
-
-
-def run_ocr_workflow(progress_queue, task_id, api_key, task_info):
-    logging.info(f"[工作流程 {task_id} - OCR] 開始...")
-    original_fn = task_info['original_base_filename_preserved']
-    uploaded_file = task_info['uploaded_file_path']
-    task_folder = task_info['task_output_folder']
-    temp_docx_path = os.path.join(task_folder, "ocr_result.docx")
-    output_subfolder = "trans"
-    overall_success = False
-    output_path = None
-    try:
-        progress_queue.put(json.dumps({'type': 'status', 'step': 1, 'status': 'OCR 與翻譯處理中...', 'percent': 5}))
-        _, ext = os.path.splitext(uploaded_file)
-        if ext.lower() == '.pdf':
-            success = run_ocr_translation(api_key, MODEL_CONFIG['OCR'], uploaded_file, temp_docx_path, progress_queue)
-        else:
-            success = run_ocr_translation_for_image(api_key, MODEL_CONFIG['OCR'], uploaded_file, temp_docx_path, progress_queue)
-        if not success: raise Exception("OCR 與翻譯步驟失敗")
-
-        final_path, final_name = copy_to_desktop_folder(temp_docx_path, output_subfolder, f"trans_{original_fn}.docx")
-        if not final_path: raise Exception("儲存檔案到桌面失敗")
-
-        output_path = os.path.dirname(os.path.dirname(final_path))
-        progress_queue.put(json.dumps({
-            'type': 'complete',
-            'message': f'翻譯檔案 "{final_name}" 已儲存。',
-            'folder_path': output_path
-        }))
-        overall_success = True
-    except Exception as e:
-        logging.error(f"[工作流程 {task_id} - OCR] 失敗: {e}", exc_info=True)
-        progress_queue.put(json.dumps({'type': 'error', 'message': f'處理失敗: {e}'}))
-    finally:
-        if os.path.exists(task_folder): shutil.rmtree(task_folder, ignore_errors=True)
-        if not overall_success: progress_queue.put(json.dumps({'type': 'done'}))
-
-
-def run_summarize_workflow(progress_queue, task_id, api_key, task_info):
-    logging.info(f"[工作流程 {task_id} - Summarize] 開始...")
-    original_fn = task_info['original_base_filename_preserved']
-    uploaded_pdf = task_info['uploaded_file_path']
-    task_folder = task_info['task_output_folder']
-    ocr_word_path = os.path.join(task_folder, "ocr_output.docx")
-    temp_summary_path = os.path.join(task_folder, "summary.docx")
-    output_subfolder = "sum"
-    overall_success = False
-    output_path = None
-    try:
-        if not run_ocr_translation(api_key, MODEL_CONFIG['OCR'], uploaded_pdf, ocr_word_path, progress_queue):
-            raise Exception("步驟 1 (OCR) 失敗")
-        
-        doc_text = read_text_from_file(ocr_word_path)
-        if not doc_text.strip(): raise ValueError("OCR 結果為空")
-        if not run_summarization(api_key, MODEL_CONFIG['SUMMARIZE'], doc_text, temp_summary_path, progress_queue):
-            raise Exception("步驟 2 (摘要) 失敗")
-        
-        final_path, final_name = copy_to_desktop_folder(temp_summary_path, output_subfolder, f"sum_{original_fn}.docx")
-        if not final_path: raise Exception("儲存檔案到桌面失敗")
-
-        output_path = os.path.dirname(os.path.dirname(final_path))
-        progress_queue.put(json.dumps({
-            'type': 'complete',
-            'message': f'摘要檔案 "{final_name}" 已儲存。',
-            'folder_path': output_path
-        }))
-        overall_success = True
-    except Exception as e:
-        logging.error(f"[工作流程 {task_id} - Summarize] 失敗: {e}", exc_info=True)
-        progress_queue.put(json.dumps({'type': 'error', 'message': f'處理失敗: {e}'}))
-    finally:
-        if os.path.exists(task_folder): shutil.rmtree(task_folder, ignore_errors=True)
-        if not overall_success: progress_queue.put(json.dumps({'type': 'done'}))
-
-
-def run_split_workflow(progress_queue, task_id, api_key, task_info):
-    logging.info(f"[工作流程 {task_id} - FileSplit] 開始...")
-    uploaded_pdf = task_info['uploaded_file_path']
-    task_folder = task_info['task_output_folder']
-    output_subfolder = "檔案分割輸出"
-    overall_success = False
-    try:
-        split_count, output_dir = run_pdf_split(
-            api_key=api_key,
-            model_name=MODEL_CONFIG['PDF_SPLIT_ANALYSIS'],
-            input_pdf_path=uploaded_pdf,
-            output_folder_name=output_subfolder,
-            progress_queue=progress_queue
-        )
-        if split_count > 0:
-            progress_queue.put(json.dumps({
-                'type': 'complete',
-                'message': f'成功分割成 {split_count} 個檔案。',
-                'folder_path': output_dir
-            }))
-            overall_success = True
-        elif split_count == 0:
-             raise Exception("AI 未能分析出有效的目錄結構，無法分割。")
-        else:
-            raise Exception("檔案分割過程中發生未知錯誤。")
-    except Exception as e:
-        logging.error(f"[工作流程 {task_id} - FileSplit] 失敗: {e}", exc_info=True)
-        progress_queue.put(json.dumps({'type': 'error', 'message': f'處理失敗: {e}'}))
-    finally:
-        if os.path.exists(task_folder): shutil.rmtree(task_folder, ignore_errors=True)
-        if not overall_success: progress_queue.put(json.dumps({'type': 'done'}))
-
 # ==============================================================================
 #                                Flask 路由
 # ==============================================================================
@@ -467,6 +208,7 @@ def pdf_to_ppt():
         "form_action_url": url_for('process_task'),
         "allowed_extensions": ".pdf",
         "task_type": "pdf_to_ppt",
+        "allow_page_selection": True,
         "button_text": "開始生成",
         "button_color_class": "btn-grad-1",
         "output_folder_name": "AI 工具輸出"
@@ -482,6 +224,7 @@ def full_report():
         "form_action_url": url_for('process_task'),
         "allowed_extensions": ".pdf",
         "task_type": "full_report",
+        "allow_page_selection": True,
         "button_text": "開始完整生成",
         "button_color_class": "btn-grad-special",
         "output_folder_name": "AI 工具輸出"
@@ -493,13 +236,15 @@ def ocr():
     page_context = {
         "title": "文字辨識 (含翻譯)",
         "icon": "bi-textarea-t",
-        "description": "選擇 PDF 或圖片檔案，系統將進行 OCR 並翻譯為繁體中文。結果將儲存到桌面的「翻譯檔案」資料夾。",
+        "description": "選擇 PDF、圖片或圖片的 zip 壓縮檔，系統將進行 OCR 並翻譯為繁體中文。zip 中的圖片會依檔名順序合併為一份文件。結果將儲存到桌面的「翻譯檔案」資料夾。",
         "form_action_url": url_for('process_task'),
         "allowed_extensions": ", ".join(f".{ext}" for ext in ALLOWED_EXTENSIONS_OCR),
         "task_type": "ocr",
+        "allow_page_selection": True,
         "button_text": "開始辨識翻譯",
         "button_color_class": "btn-grad-2",
-        "output_folder_name": "AI 工具輸出/trans"
+        "output_folder_name": "AI 工具輸出/trans",
+        "allow_merge_images": True
     }
     return render_template('process_page.html', **page_context)
 
@@ -512,6 +257,7 @@ def summarize():
         "form_action_url": url_for('process_task'),
         "allowed_extensions": ".pdf",
         "task_type": "summarize",
+        "allow_page_selection": True,
         "button_text": "開始整理",
         "button_color_class": "btn-grad-3",
         "output_folder_name": "AI 工具輸出/sum"
@@ -550,26 +296,41 @@ def file_split():
     }
     return render_template('process_page.html', **page_context)
 
+@app.route('/chapter_summary')
+def chapter_summary():
+    page_context = {
+        "title": "章節摘要",
+        "icon": "bi-journal-bookmark",
+        "description": "選擇有目錄的 PDF 文件 (例如書籍或長篇報告)，系統將依目錄分成章節，同時對各章進行 OCR、翻譯與摘要，並合併為一份每章一節的摘要與簡報。",
+        "form_action_url": url_for('process_task'),
+        "allowed_extensions": ".pdf",
+        "task_type": "chapter_summary",
+        "allow_page_selection": True,
+        "button_text": "開始摘要",
+        "button_color_class": "btn-grad-special",
+        "output_folder_name": "AI 工具輸出"
+    }
+    return render_template('process_page.html', **page_context)
+
 @app.route('/process_task', methods=['POST'])
 def process_task():
     task_type = request.form.get('task_type')
     if not task_type: return jsonify({'success': False, 'error': '未知的任務類型'}), 400
     if 'source_file' not in request.files: return jsonify({'success': False, 'error': '沒有選擇檔案'}), 400
-    file = request.files['source_file']
-    if file.filename == '': return jsonify({'success': False, 'error': '沒有選擇檔案'}), 400
+    files = [f for f in request.files.getlist('source_file') if f.filename]
+    if not files: return jsonify({'success': False, 'error': '沒有選擇檔案'}), 400
+    file = files[0]
     
-    # +++ 更新：加入新的任務類型和允許的副檔名 +++
-    allowed_ext_map = {
-        'pdf_to_ppt': ALLOWED_EXTENSIONS_PDF,
-        'full_report': ALLOWED_EXTENSIONS_FULL_REPORT,
-        'ocr': ALLOWED_EXTENSIONS_OCR,
-        'summarize': ALLOWED_EXTENSIONS_PDF,
-        'file_split': ALLOWED_EXTENSIONS_PDF,
-        'text_to_ppt': ALLOWED_EXTENSIONS_TEXT,
-    }
-    allowed_exts = allowed_ext_map.get(task_type)
+    allowed_exts = ALLOWED_EXTENSIONS_BY_TASK.get(task_type)
     
     if not allowed_exts: return jsonify({'success': False, 'error': f'不支援的任務類型: {task_type}'}), 400
+    task_options, option_error = _task_options_from_form()
+    if option_error: return jsonify({'success': False, 'error': option_error}), 400
+    if len(files) > 1:
+        # 一次上傳多個檔案只用於「多張圖片合併為一份 OCR 文件」
+        if task_type != 'ocr' or not all(allowed_file(f.filename, OCR_IMAGE_EXTENSIONS) for f in files):
+            return jsonify({'success': False, 'error': '一次上傳多個檔案時只能是圖片 (OCR)'}), 400
+        return _queue_image_set(task_type, files, task_options)
     if not allowed_file(file.filename, allowed_exts): return jsonify({'success': False, 'error': f'檔案類型不支援，請上傳 {"/".join(allowed_exts)} 檔案'}), 400
     
     original_full_filename = file.filename
@@ -586,38 +347,117 @@ def process_task():
         shutil.rmtree(task_output_folder, ignore_errors=True)
         return jsonify({'success': False, 'error': f'儲存上傳檔案失敗: {e}'}), 500
 
-    task_progress_queues[task_id] = queue.Queue()
-    task_info = {'task_id': task_id, 'task_type': task_type, 'original_base_filename_preserved': original_base, 'uploaded_file_path': uploaded_file_path, 'task_output_folder': task_output_folder}
+    token = register_task(task_id)
+    task_info = {'task_id': task_id, 'task_type': task_type, 'original_base_filename_preserved': original_base, 'uploaded_file_path': uploaded_file_path, 'task_output_folder': task_output_folder, 'cancel_token': token, **task_options}
     central_task_queue.put(task_info)
     return jsonify({'success': True, 'task_id': task_id, 'filename': original_full_filename})
 
+def _task_options_from_form():
+    """
+    讀取任務選項欄位，返回 (設定, 錯誤訊息)。
+    page_range 為 PDF 頁碼範圍 (例如 "1-5, 8")；auto_skip 的核取方塊搭配同名的隱藏欄位 "0"，
+    勾選時送出 ["0", "1"]，未送出此欄位 (例如其他程式呼叫 API) 時預設為開啟。
+    output_formats 為輸出格式 (例如 "md,json")，未指定時使用 app.config['OUTPUT_FORMATS']。
+    """
+    page_range = request.form.get('page_range', '').strip()
+    try:
+        parse_page_ranges(page_range)
+        output_formats = parse_output_formats(request.form.get('output_formats') or app.config['OUTPUT_FORMATS'])
+    except ValueError as e:
+        return None, str(e)
+    auto_skip_values = request.form.getlist('auto_skip')
+    auto_skip = not auto_skip_values or '1' in auto_skip_values
+    return {'page_range': page_range or None, 'auto_skip': auto_skip, 'output_formats': output_formats}, None
+
+def _queue_image_set(task_type, files, task_options):
+    """將多張圖片存到任務資料夾的 images/ 中，由工作流程依檔名的自然順序合併處理。"""
+    task_id = str(uuid.uuid4())
+    task_output_folder = os.path.join(app.config['OUTPUT_FOLDER'], task_id)
+    images_folder = os.path.join(task_output_folder, "images")
+    os.makedirs(images_folder, exist_ok=True)
+    try:
+        for index, image in enumerate(files):
+            safe_filename = secure_filename(image.filename)
+            stem, ext = os.path.splitext(safe_filename)
+            if not stem or os.path.exists(os.path.join(images_folder, safe_filename)):
+                # secure_filename 會移除非 ASCII 字元，可能造成檔名為空或互相重複
+                safe_filename = f"{stem or 'image'}_{index:04d}{ext or os.path.splitext(image.filename)[1].lower()}"
+            image.save(os.path.join(images_folder, safe_filename))
+    except Exception as e:
+        shutil.rmtree(task_output_folder, ignore_errors=True)
+        return jsonify({'success': False, 'error': f'儲存上傳檔案失敗: {e}'}), 500
+
+    original_base = os.path.splitext(files[0].filename)[0]
+    token = register_task(task_id)
+    task_info = {'task_id': task_id, 'task_type': task_type, 'original_base_filename_preserved': original_base, 'uploaded_file_path': images_folder, 'task_output_folder': task_output_folder, 'cancel_token': token, 'output_formats': task_options['output_formats']}
+    central_task_queue.put(task_info)
+    return jsonify({'success': True, 'task_id': task_id, 'filename': f"{files[0].filename} 等 {len(files)} 張圖片"})
+
+@app.route('/cancel_task/<task_id>', methods=['POST'])
+def cancel_task_route(task_id):
+    if not cancel_task(task_id, "使用者已取消任務"):
+        return jsonify({'success': False, 'error': '任務已結束或不存在。'}), 404
+    return jsonify({'success': True})
+
 @app.route('/stream/<task_id>')
 def stream(task_id):
+    try: last_event_id = int(request.headers.get('Last-Event-ID') or request.args.get('last_event_id') or 0)
+    except ValueError: last_event_id = 0
     def sse_event_stream():
-        logging.info(f"[SSE {task_id}] 客戶端已連接")
-        q = task_progress_queues.get(task_id)
-        if q is None: yield f"data: {json.dumps({'type':'error', 'message':'任務已完成或不存在。'})}\n\n"; return
-        done = False
+        logging.info(f"[SSE {task_id}] 客戶端已連接 (Last-Event-ID: {last_event_id})")
+        channel = event_hub.get(task_id)
+        if channel is None: yield f"data: {ErrorEvent(message='任務已完成或不存在。').to_json()}\n\n"; return
+        if not stream_limiter.acquire():
+            # 串流數已達上限：請瀏覽器稍後以 Last-Event-ID 重新連線，不佔用伺服器執行緒
+            logging.warning(f"[SSE {task_id}] 同時串流數已達上限 {stream_limiter.limit}，請客戶端稍後重連。")
+            yield "retry: 5000\n\n"; return
+        yield "retry: 3000\n\n"
+        events = channel.subscribe(last_event_id, keepalive=60)
         try:
-            while not done:
-                try:
-                    data_str = q.get(timeout=60)
-                    data = json.loads(data_str)
-                    yield f"data: {data_str}\n\n"
-                    if data.get('type') in ['done', 'error', 'complete']: done = True
-                except queue.Empty: yield ":keep-alive\n\n"
-                except (json.JSONDecodeError, TypeError): logging.warning(f"[SSE {task_id}] 從佇列收到無效資料: {data_str if 'data_str' in locals() else 'N/A'}"); continue
+            for event in events:
+                if event is None: yield ":keep-alive\n\n"; continue
+                event_id, progress_event = event
+                yield f"id: {event_id}\ndata: {progress_event.to_json()}\n\n"
         except GeneratorExit: logging.info(f"[SSE {task_id}] 客戶端已斷開連接")
-        finally: logging.info(f"[SSE {task_id}] 事件串流結束。")
+        finally: events.close(); stream_limiter.release(); logging.info(f"[SSE {task_id}] 事件串流結束。")
     try: uuid.UUID(task_id)
     except ValueError: return Response("Invalid task ID format", status=400)
-    return Response(sse_event_stream(), mimetype="text/event-stream")
+    return Response(sse_event_stream(), mimetype="text/event-stream", headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
 
 @app.route('/chat')
 def chat():
-    session.pop('chat_history', None)
+    old_id = session.pop('chat_id', None)
+    if old_id: chat_store.discard(old_id)
+    session['chat_id'] = chat_store.new_id()
     return render_template('chat.html')
 
+def _get_conversation():
+    """取得目前 session 對應的伺服器端對話；cookie 中只保存對話 ID。"""
+    chat_id = session.get('chat_id')
+    if not chat_id:
+        chat_id = chat_store.new_id()
+        session['chat_id'] = chat_id
+    return chat_store.get(chat_id)
+
+@contextlib.contextmanager
+def _recorded_chat_call():
+    """記錄一次對話模型呼叫的 token 數與延遲 (見 usage_store)；呼叫端將回應存入 call['response']。"""
+    call = {'response': None}
+    started = time.monotonic()
+    try:
+        yield call
+    except Exception as e:
+        record_model_call(None, MODEL_CONFIG['CHAT'], latency=time.monotonic() - started, error=e)
+        raise
+    record_model_call(None, MODEL_CONFIG['CHAT'], call['response'], latency=time.monotonic() - started)
+
+def _summarize_chat_turns(previous_summary, turns):
+    conversation_text = "\n".join(f"使用者: {u}\nAI: {m}" for u, m in turns)
+    prompt = PROMPTS["CHAT_HISTORY_SUMMARY"].format(previous_summary=previous_summary, conversation_text=conversation_text)
+    with _recorded_chat_call() as call:
+        call['response'] = genai.GenerativeModel(MODEL_CONFIG['CHAT']).generate_content(prompt)
+    return call['response'].text
+
 @app.route('/api/chat', methods=['POST'])
 def api_chat():
     api_key = app.config.get('GEMINI_API_KEY')
@@ -625,21 +465,65 @@ def api_chat():
     data = request.json
     user_message = data.get('message')
     if not user_message: return jsonify({'error': 'No message provided'}), 400
+    conversation = _get_conversation()
     try:
         genai.configure(api_key=api_key)
         model = genai.GenerativeModel(MODEL_CONFIG['CHAT'])
-        chat_history = session.get('chat_history', [])
-        temp_chat = model.start_chat(history=chat_history)
-        response = temp_chat.send_message(user_message)
-        ai_reply = response.text
-        chat_history.append({'role': 'user', 'parts': [user_message]})
-        chat_history.append({'role': 'model', 'parts': [ai_reply]})
-        session['chat_history'] = chat_history
+        with conversation.lock:
+            temp_chat = model.start_chat(history=conversation.build_history())
+            with _recorded_chat_call() as call:
+                call['response'] = temp_chat.send_message(user_message)
+            ai_reply = call['response'].text
+            conversation.turns.append((user_message, ai_reply))
+        start_compaction(conversation, _summarize_chat_turns)
         return jsonify({'reply': ai_reply})
     except Exception as e:
         logging.error(f"呼叫 Chat API 時發生錯誤: {e}", exc_info=True)
         return jsonify({'error': '與 AI 溝通時發生內部錯誤。'}), 500
 
+@app.route('/api/chat/stream', methods=['POST'])
+def api_chat_stream():
+    """以 SSE 格式逐段轉送 AI 回覆；對話紀錄保存在伺服器端。"""
+    api_key = app.config.get('GEMINI_API_KEY')
+    if not api_key: return jsonify({'error': 'API Key not configured'}), 500
+    data = request.json
+    user_message = data.get('message')
+    if not user_message: return jsonify({'error': 'No message provided'}), 400
+    conversation = _get_conversation()
+    def chat_event_stream():
+        if not stream_limiter.acquire():
+            yield f"data: {json.dumps({'type': 'error', 'message': '伺服器忙碌中，請稍後再試。'}, ensure_ascii=False)}\n\n"
+            return
+        try:
+            yield from _chat_event_stream(api_key, conversation, user_message)
+        finally:
+            stream_limiter.release()
+    return Response(chat_event_stream(), mimetype="text/event-stream", headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+def _chat_event_stream(api_key, conversation, user_message):
+    with conversation.lock:
+        reply_parts = []
+        try:
+            genai.configure(api_key=api_key)
+            model = genai.GenerativeModel(MODEL_CONFIG['CHAT'])
+            temp_chat = model.start_chat(history=conversation.build_history())
+            # 串流回應的 usage_metadata 在讀完所有片段後才完整，延遲為整個回覆的時間
+            with _recorded_chat_call() as call:
+                call['response'] = temp_chat.send_message(user_message, stream=True)
+                for chunk in call['response']:
+                    text = getattr(chunk, 'text', '')
+                    if not text: continue
+                    reply_parts.append(text)
+                    yield f"data: {json.dumps({'type': 'delta', 'text': text}, ensure_ascii=False)}\n\n"
+        except Exception as e:
+            logging.error(f"呼叫串流 Chat API 時發生錯誤: {e}", exc_info=True)
+            yield f"data: {json.dumps({'type': 'error', 'message': '與 AI 溝通時發生內部錯誤。'}, ensure_ascii=False)}\n\n"
+            return
+        conversation.turns.append((user_message, "".join(reply_parts)))
+    # 舊對話在背景壓縮 (不持有對話鎖、不佔用此回應)，回覆結束後使用者即可送出下一則訊息
+    start_compaction(conversation, _summarize_chat_turns)
+    yield f"data: {json.dumps({'type': 'done'})}\n\n"
+
 @app.route('/open_folder', methods=['POST'])
 def open_folder():
     data = request.json
@@ -648,6 +532,27 @@ def open_folder():
     try: open_folder_in_explorer(folder_path); return jsonify({'success': True})
     except Exception as e: logging.error(f"從 API 端點打開資料夾失敗: {e}"); return jsonify({'success': False, 'error': str(e)}), 500
 
+# 統計區間 (小時) 的選項
+USAGE_WINDOWS = {24: '最近 24 小時', 24 * 7: '最近 7 天', 24 * 30: '最近 30 天'}
+
+def _usage_window_hours():
+    try: hours = int(request.args.get('hours', 24))
+    except ValueError: hours = 24
+    return hours if hours in USAGE_WINDOWS else 24
+
+@app.route('/usage')
+def usage():
+    """用量統計頁面：吞吐量、各模型的延遲分布與最耗用量的文件。"""
+    hours = _usage_window_hours()
+    store = get_usage_store()
+    return render_template('usage.html', usage=store.dashboard(hours) if store else None, hours=hours, windows=USAGE_WINDOWS)
+
+@app.route('/api/usage')
+def api_usage():
+    store = get_usage_store()
+    if store is None: return jsonify({'error': '未啟用用量紀錄'}), 404
+    return jsonify(store.dashboard(_usage_window_hours()))
+
 @app.route('/translate')
 def translate():
     flash('「即時翻譯」功能仍在開發中，敬請期待！', 'info')
@@ -657,22 +562,80 @@ def translate():
 #                      桌面應用程式啟動器
 # ==============================================================================
 if __name__ == '__main__':
+    if '--check-startup-budget' in sys.argv:
+        sys.exit(0 if check_startup_budget() else 1)
+    parser = argparse.ArgumentParser(description="AI 工具箱")
+    parser.add_argument('--serve', action='store_true', help="不開啟視窗，只提供 HTTP 服務 (無介面或區域網路部署)")
+    parser.add_argument('--host', help="--serve 時監聽的位址 (預設 127.0.0.1；區域網路部署可用 0.0.0.0)")
+    parser.add_argument('--port', type=int, help="--serve 時監聽的連接埠 (預設 5000)")
+    parser.add_argument('--server', choices=SERVER_MODES, help="HTTP 伺服器 (預設 auto：有安裝 waitress 時使用 waitress)")
+    parser.add_argument('--threads', type=int, help=f"waitress 的執行緒數 (預設 {SERVER_THREADS})")
+    parser.add_argument('--precompress-static', action='store_true', help="為 static/ 中可壓縮的檔案產生 .gz 版本後結束")
+    args = parser.parse_args()
+    if args.precompress_static:
+        for path in precompress_static(app.static_folder): print(path)
+        sys.exit(0)
     logging.info("============================================"); logging.info("====== AI 工具箱桌面應用程式啟動中... ====="); logging.info(f"    基礎路徑: {BASE_PATH}"); logging.info("============================================")
     def get_api_key_from_config():
         if not os.path.exists(CONFIG_FILE):
             logging.error(f"設定檔 {CONFIG_FILE} 不存在。")
             try:
-                with open(CONFIG_FILE, 'w', encoding='utf-8') as f: f.write("[Credentials]\n"); f.write("GEMINI_API_KEY = YOUR_GEMINI_API_KEY_HERE\n")
+                with open(CONFIG_FILE, 'w', encoding='utf-8') as f: f.write("[Credentials]\n"); f.write("GEMINI_API_KEY = YOUR_GEMINI_API_KEY_HERE\n"); f.write("; 多組金鑰 (選用)：每行一組，格式為 金鑰[:每分鐘請求上限[:同時請求數]]\n; GEMINI_API_KEYS =\n;     KEY_1:15\n;     KEY_2:60:2\n")
                 return None, f"設定檔不存在。已建立模板 {os.path.basename(CONFIG_FILE)}，請填入您的 API Key 後重啟。"
             except Exception as e_cfg: return None, f"設定檔不存在且無法自動建立: {e_cfg}"
         config = configparser.ConfigParser()
         try:
             config.read(CONFIG_FILE, encoding='utf-8')
-            api_key = config.get('Credentials', 'GEMINI_API_KEY', fallback="").strip()
-            if not api_key or api_key == 'YOUR_GEMINI_API_KEY_HERE': return None, f"請在設定檔 {os.path.basename(CONFIG_FILE)} 中提供有效的 GEMINI_API_KEY。"
-            return api_key, None
+            # GEMINI_API_KEYS 可列出多組金鑰 (含每組的額度)，請求會分散到各組金鑰
+            keys = keys_from_config(config)
+            if not keys: return None, f"請在設定檔 {os.path.basename(CONFIG_FILE)} 中提供有效的 GEMINI_API_KEY 或 GEMINI_API_KEYS。"
+            set_key_pool(KeyPool(keys))
+            return keys[0].key, None
         except Exception as e: return None, f"讀取設定檔時出錯: {e}"
+    def get_server_settings():
+        """config.ini 的 [Server] 區段 (選用)：MODE、THREADS、HOST、PORT；命令列參數優先。"""
+        config = configparser.ConfigParser()
+        try: config.read(CONFIG_FILE, encoding='utf-8')
+        except Exception: pass
+        return {
+            'mode': args.server or config.get('Server', 'MODE', fallback='auto'),
+            'threads': args.threads or config.getint('Server', 'THREADS', fallback=SERVER_THREADS),
+            'host': args.host or config.get('Server', 'HOST', fallback='127.0.0.1'),
+            'port': args.port or config.getint('Server', 'PORT', fallback=5000),
+        }
+    def get_idle_cancel_setting():
+        config = configparser.ConfigParser()
+        try: config.read(CONFIG_FILE, encoding='utf-8'); return config.getint('Tasks', 'IDLE_CANCEL_SECONDS', fallback=app.config['TASK_IDLE_CANCEL_SECONDS'])
+        except Exception: return app.config['TASK_IDLE_CANCEL_SECONDS']
+    def get_output_formats_setting():
+        config = configparser.ConfigParser()
+        try: config.read(CONFIG_FILE, encoding='utf-8'); return config.get('Output', 'FORMATS', fallback=app.config['OUTPUT_FORMATS'])
+        except Exception: return app.config['OUTPUT_FORMATS']
+    def get_document_workers_setting():
+        """config.ini 的 [Performance] DOCUMENT_WORKERS：文件建構 (寫出 Word / 簡報、渲染頁面) 的子行程數，0 表示在本行程中執行。"""
+        config = configparser.ConfigParser()
+        try: config.read(CONFIG_FILE, encoding='utf-8'); return config.getint('Performance', 'DOCUMENT_WORKERS', fallback=DOCUMENT_POOL_WORKERS)
+        except Exception: return DOCUMENT_POOL_WORKERS
+    def get_prewarm_setting():
+        config = configparser.ConfigParser()
+        try: config.read(CONFIG_FILE, encoding='utf-8'); return config.getboolean('Startup', 'PREWARM_IMPORTS', fallback=True)
+        except Exception: return True
     loaded_api_key, config_error_msg = get_api_key_from_config()
+    server_settings = get_server_settings()
+    app.config['TASK_IDLE_CANCEL_SECONDS'] = get_idle_cancel_setting()
+    app.config['OUTPUT_FORMATS'] = get_output_formats_setting()
+    # waitress 的執行緒數固定，保留部分執行緒給頁面與 API 請求；werkzeug 每個請求一條新執行緒，不需限制
+    if resolve_server_mode(server_settings['mode']) == 'waitress': stream_limiter.limit = sse_stream_limit(server_settings['threads'])
+    if not loaded_api_key and args.serve:
+        logging.critical(f"因設定錯誤無法啟動: {config_error_msg}"); sys.exit(1)
+    # 文件建構交給常駐的子行程，大型轉換不會因 GIL 拖慢 SSE 串流與對話回應
+    document_workers = get_document_workers_setting()
+    if document_workers > 0: set_document_pool(DocumentPool(document_workers).start())
+    if args.serve:
+        app.config['GEMINI_API_KEY'] = loaded_api_key
+        if get_prewarm_setting(): start_prewarm_thread()
+        serve(app, server_settings['host'], server_settings['port'], server_settings['mode'], server_settings['threads']); sys.exit(0)
+    import webview
     if not loaded_api_key:
         logging.critical(f"因設定錯誤無法啟動: {config_error_msg}")
         webview.create_window("設定錯誤", html=f"<h1>設定錯誤</h1><p>{config_error_msg}</p>", width=500, height=200); webview.start(); sys.exit(1)
@@ -680,10 +643,11 @@ if __name__ == '__main__':
     def find_free_port():
         with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as s: s.bind(("127.0.0.1", 0)); return s.getsockname()[1]
     port = find_free_port()
-    server_thread = threading.Thread(target=lambda: app.run(host="127.0.0.1", port=port, debug=False, use_reloader=False)); server_thread.daemon = True; server_thread.start()
-    logging.info(f"Flask 伺服器執行緒已在 http://127.0.0.1:{port} 啟動")
+    server_thread = threading.Thread(target=lambda: serve(app, "127.0.0.1", port, server_settings['mode'], server_settings['threads'])); server_thread.daemon = True; server_thread.start()
+    logging.info(f"Flask 伺服器執行緒已在 http://127.0.0.1:{port} 啟動 (啟動耗時 {time.perf_counter() - STARTUP_T0:.2f} 秒)")
     try:
         webview.create_window("AI 工具庫", f"http://127.0.0.1:{port}/", width=1100, height=750, resizable=True, confirm_close=True)
-        webview.start(debug=False)
+        # 視窗顯示後才在背景預熱重量級模組，讓第一個任務不必等待 import
+        webview.start(func=start_prewarm_thread if get_prewarm_setting() else None, debug=False)
     except Exception as e_webview: logging.critical(f"建立 pywebview 視窗失敗: {e_webview}", exc_info=True); sys.exit(1)
     logging.info("pywebview 視窗已關閉，應用程式結束。"); sys.exit(0)
\ No newline at end of file
@@ -0,0 +1,144 @@
+# async_engine.py
+# 工作流程共用的 asyncio 執行引擎：一個背景事件迴圈同時驅動大量頁面 / 分段的模型請求
+# (generate_content_async)，不必為每個進行中的請求佔用一條執行緒。
+# 渲染、寫檔等 CPU 工作與阻塞式的迭代器交給執行緒池，避免阻塞事件迴圈。
+#
+#   results = get_engine().run(some_coroutine())   # 在任務執行緒中呼叫，等待完成
+#
+# 呼叫端的等待被中斷或任務被取消時，協程會被取消，進行中的模型請求也隨之中止。
+
+import os
+import asyncio
+import logging
+import threading
+import concurrent.futures
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+from task_cancel import TaskCancelled, current_cancel_token
+
+# 事件迴圈的預設執行緒池大小 (asyncio.to_thread 與 run_in_executor(None, ...) 使用)
+ASYNC_CPU_WORKERS = min(8, (os.cpu_count() or 1) + 4)
+
+_STOP = object()
+
+
+class AsyncEngine:
+    """在背景執行緒中執行的單一事件迴圈；run() 可從任何其他執行緒呼叫。"""
+
+    def __init__(self, cpu_workers: int = ASYNC_CPU_WORKERS):
+        self.cpu_workers = max(1, cpu_workers)
+        self._loop = None
+        self._thread = None
+        self._executor = None
+        self._lock = threading.Lock()
+
+    def _ensure_loop(self) -> asyncio.AbstractEventLoop:
+        with self._lock:
+            if self._loop is None:
+                loop = asyncio.new_event_loop()
+                self._executor = ThreadPoolExecutor(max_workers=self.cpu_workers, thread_name_prefix="AsyncCpuWorker")
+                loop.set_default_executor(self._executor)
+                started = threading.Event()
+
+                def run_loop():
+                    asyncio.set_event_loop(loop)
+                    loop.call_soon(started.set)
+                    loop.run_forever()
+
+                self._thread = threading.Thread(target=run_loop, daemon=True, name="AsyncEngineLoop")
+                self._thread.start()
+                started.wait()
+                self._loop = loop
+                logging.info(f"[AsyncEngine] 事件迴圈已啟動 (CPU 執行緒池 {self.cpu_workers})")
+            return self._loop
+
+    def in_loop_thread(self) -> bool:
+        return self._thread is not None and threading.current_thread() is self._thread
+
+    def submit(self, coro):
+        """將協程排入事件迴圈，返回 concurrent.futures.Future；future.cancel() 會取消協程。"""
+        if self.in_loop_thread():
+            raise RuntimeError("不可在事件迴圈執行緒中同步等待協程")
+        return asyncio.run_coroutine_threadsafe(coro, self._ensure_loop())
+
+    def run(self, coro, timeout: float | None = None):
+        """
+        在事件迴圈中執行協程並等待結果；等待逾時或被中斷時取消協程後再拋出。
+        呼叫執行緒所屬的任務被取消時 (見 task_cancel)，協程立即被取消並拋出 TaskCancelled。
+        """
+        future = self.submit(coro)
+        token = current_cancel_token()
+        unregister = token.add_callback(future.cancel) if token is not None else None
+        try:
+            return future.result(timeout)
+        except concurrent.futures.CancelledError:
+            if token is not None and token.cancelled:
+                raise TaskCancelled(token.reason) from None
+            raise
+        except BaseException:
+            future.cancel()
+            raise
+        finally:
+            if unregister is not None:
+                unregister()
+
+    def shutdown(self):
+        with self._lock:
+            loop, self._loop = self._loop, None
+            if loop is None:
+                return
+            loop.call_soon_threadsafe(loop.stop)
+            self._thread.join()
+            loop.close()
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._thread = self._executor = None
+
+
+_engine = None
+_engine_lock = threading.Lock()
+
+
+def get_engine() -> AsyncEngine:
+    """返回行程共用的 AsyncEngine (第一次呼叫時才啟動事件迴圈)。"""
+    global _engine
+    with _engine_lock:
+        if _engine is None:
+            _engine = AsyncEngine()
+        return _engine
+
+
+async def aiter_blocking(iterable):
+    """在執行緒池中逐項取出阻塞式迭代器的內容 (例如等待渲染的 PageWindow)，不阻塞事件迴圈。"""
+    iterator = iter(iterable)
+    while True:
+        item = await asyncio.to_thread(next, iterator, _STOP)
+        if item is _STOP:
+            return
+        yield item
+
+
+async def _aiter(iterable):
+    for item in iterable:
+        yield item
+
+
+async def ordered_map(coro_fn, items, limit: int):
+    """
+    對每個項目執行 coro_fn(item)，同時進行中的協程最多 limit 個，依項目原本的順序產出結果。
+    items 可以是一般或非同步的可迭代物件。任何一項失敗或整體被取消時，其餘進行中的協程一併取消。
+    """
+    limit = max(1, limit)
+    pending = deque()
+    try:
+        async for item in (items if hasattr(items, '__aiter__') else _aiter(items)):
+            pending.append(asyncio.ensure_future(coro_fn(item)))
+            while pending and (len(pending) >= limit or pending[0].done()):
+                yield await pending.popleft()
+        while pending:
+            yield await pending.popleft()
+    finally:
+        for task in pending:
+            task.cancel()
+        if pending:
+            await asyncio.gather(*pending, return_exceptions=True)
@@ -0,0 +1,116 @@
+# chat_store.py
+
+import time
+import uuid
+import logging
+import threading
+
+# 完整送出的最近對話輪數 (一輪 = 使用者訊息 + AI 回覆)
+CHAT_WINDOW_TURNS = 12
+# 視窗內對話的字數上限，超過時即使輪數未滿也會壓縮較舊的對話
+CHAT_WINDOW_MAX_CHARS = 24000
+# 閒置超過此秒數的對話會被清除
+CONVERSATION_TTL_SECONDS = 6 * 60 * 60
+
+
+class Conversation:
+    """單一對話的伺服器端狀態：最近的對話視窗，以及較舊對話的摘要。"""
+
+    def __init__(self, conversation_id: str):
+        self.id = conversation_id
+        self.turns = []      # [(user_message, model_reply), ...]
+        self.summary = ""    # 已被移出視窗的舊對話摘要
+        self.compacting = [] # 正在背景壓縮的舊輪次；摘要完成前仍完整送出
+        self.updated_at = time.monotonic()
+        self.lock = threading.Lock()
+
+    def build_history(self) -> list[dict]:
+        """轉換為 start_chat(history=...) 所需的格式；舊對話以摘要的形式放在最前面。"""
+        history = []
+        if self.summary:
+            history.append({'role': 'user', 'parts': [f"以下是我們先前對話的摘要，請在接下來的對話中參考：\n{self.summary}"]})
+            history.append({'role': 'model', 'parts': ["好的，我已了解先前的對話內容。"]})
+        for user_message, model_reply in self.compacting + self.turns:
+            history.append({'role': 'user', 'parts': [user_message]})
+            history.append({'role': 'model', 'parts': [model_reply]})
+        return history
+
+    def _window_chars(self) -> int:
+        return sum(len(u) + len(m) for u, m in self.turns)
+
+    def pop_overflow(self) -> list[tuple[str, str]]:
+        """移出超過視窗限制的最舊輪次並返回，供呼叫端壓縮成摘要。至少保留最近一輪。"""
+        overflow = []
+        while len(self.turns) > 1 and (len(self.turns) > CHAT_WINDOW_TURNS or self._window_chars() > CHAT_WINDOW_MAX_CHARS):
+            overflow.append(self.turns.pop(0))
+        return overflow
+
+
+class ConversationStore:
+    """以 session 中的對話 ID 為鍵、保存在伺服器記憶體中的對話儲存區。"""
+
+    def __init__(self, ttl_seconds: float = CONVERSATION_TTL_SECONDS):
+        self.ttl_seconds = ttl_seconds
+        self._conversations = {}
+        self._lock = threading.Lock()
+
+    def new_id(self) -> str:
+        return uuid.uuid4().hex
+
+    def get(self, conversation_id: str) -> Conversation:
+        self._sweep()
+        with self._lock:
+            conversation = self._conversations.get(conversation_id)
+            if conversation is None:
+                conversation = Conversation(conversation_id)
+                self._conversations[conversation_id] = conversation
+            conversation.updated_at = time.monotonic()
+            return conversation
+
+    def discard(self, conversation_id: str):
+        with self._lock:
+            self._conversations.pop(conversation_id, None)
+
+    def _sweep(self):
+        now = time.monotonic()
+        with self._lock:
+            expired = [cid for cid, c in self._conversations.items() if now - c.updated_at > self.ttl_seconds]
+            for cid in expired:
+                del self._conversations[cid]
+        if expired:
+            logging.debug(f"[ChatStore] 已清除 {len(expired)} 個閒置對話")
+
+
+def compact_conversation(conversation: Conversation, summarize_fn):
+    """
+    將超出視窗的舊對話交給 summarize_fn(previous_summary, overflow_turns) 壓縮成摘要。
+    呼叫端不可持有 conversation.lock：只在移出舊對話與寫回摘要時短暫取得鎖，
+    模型請求期間同一對話的新訊息不必等待 (被壓縮的輪次在摘要完成前仍包含在 build_history 中)。
+    摘要失敗時保留舊摘要並附上被移出對話的截斷版本，避免完全遺失上下文。
+    """
+    with conversation.lock:
+        if conversation.compacting:
+            return  # 上一次壓縮尚未完成，留待下一輪
+        overflow = conversation.pop_overflow()
+        if not overflow:
+            return
+        conversation.compacting = overflow
+        previous_summary = conversation.summary
+    try:
+        summary = summarize_fn(previous_summary, overflow).strip()
+        logging.info(f"[ChatStore] 對話 {conversation.id} 已將 {len(overflow)} 輪舊對話壓縮為摘要")
+    except Exception as e:
+        logging.warning(f"[ChatStore] 壓縮對話 {conversation.id} 失敗，改為截斷保留: {e}")
+        clipped = "\n".join(f"使用者: {u[:200]}\nAI: {m[:200]}" for u, m in overflow)
+        summary = (previous_summary + "\n" + clipped).strip()[-CHAT_WINDOW_MAX_CHARS // 4:]
+    with conversation.lock:
+        conversation.summary = summary
+        conversation.compacting = []
+
+
+def start_compaction(conversation: Conversation, summarize_fn) -> threading.Thread:
+    """在背景執行緒中壓縮對話 (見 compact_conversation)，回覆不必等待摘要請求。"""
+    thread = threading.Thread(target=compact_conversation, args=(conversation, summarize_fn),
+                              name=f"ChatCompact-{conversation.id[:8]}", daemon=True)
+    thread.start()
+    return thread
@@ -0,0 +1,178 @@
+# context_cache.py
+# 長的共用前綴 (大型文件、固定的系統提示) 使用 Gemini 的 context caching：
+# 同一個前綴在每組金鑰 / 模型下只上傳一次，之後的請求只送出差異的部分。
+# 前綴太短、模型不支援或建立快取失敗時，退回將前綴直接附在請求中。
+
+import re
+import time
+import hashlib
+import logging
+import threading
+
+from lazy_imports import LazyModule
+
+genai_caching = LazyModule("google.generativeai.caching")
+genai_protos = LazyModule("google.generativeai.protos")
+api_exceptions = LazyModule("google.api_core.exceptions")
+
+CONTEXT_CACHE_ENABLED = True
+# 估計 token 數低於此值的前綴不建立快取 (建立快取本身也有最低 token 數要求，依模型而不同)
+CONTEXT_CACHE_MIN_TOKENS = 4096
+# 模型名稱前綴 -> 最低 token 數；未列出的模型使用 CONTEXT_CACHE_MIN_TOKENS
+CONTEXT_CACHE_MIN_TOKENS_BY_MODEL = {
+    'gemini-1.5': 32768,
+}
+CONTEXT_CACHE_TTL_SECONDS = 3600
+# 快取剩餘時間少於此秒數時視為過期，改建新的快取
+CONTEXT_CACHE_EXPIRY_MARGIN = 120
+# 遠端快取的 display_name 前綴，後接前綴內容的雜湊值，用於行程重啟後找回既有快取
+CONTEXT_CACHE_NAME_PREFIX = "ai-toolbox-"
+# 每張圖片約佔的 token 數
+IMAGE_PART_TOKENS = 258
+
+# 建立快取失敗的原因：前綴低於模型的最低 token 數 (回應中帶有實際的下限)，或模型不支援快取
+_TOO_SMALL_ERROR = re.compile(r'too small|min_total_token_count', re.IGNORECASE)
+_MIN_TOKENS_IN_ERROR = re.compile(r'min_total_token_count\D{0,3}(\d+)', re.IGNORECASE)
+_UNSUPPORTED_ERROR = re.compile(r'not supported|does not support|unsupported', re.IGNORECASE)
+
+
+def estimate_tokens(parts) -> int:
+    """粗略估計前綴的 token 數 (UTF-8 位元組數 / 4，中英文皆大致相符)。"""
+    total = 0
+    for part in parts:
+        if isinstance(part, str):
+            total += len(part.encode('utf-8')) // 4
+        else:
+            total += IMAGE_PART_TOKENS
+    return total
+
+
+def min_cache_tokens(model_name: str) -> int:
+    """模型建立快取的最低 token 數 (見 CONTEXT_CACHE_MIN_TOKENS_BY_MODEL)。"""
+    name = model_name.split('/')[-1]
+    for prefix, tokens in CONTEXT_CACHE_MIN_TOKENS_BY_MODEL.items():
+        if name.startswith(prefix):
+            return tokens
+    return CONTEXT_CACHE_MIN_TOKENS
+
+
+def prefix_digest(model_name: str, parts) -> str:
+    digest = hashlib.sha256(model_name.encode('utf-8'))
+    for part in parts:
+        digest.update(b'\0')
+        if isinstance(part, str):
+            digest.update(part.encode('utf-8'))
+        elif isinstance(part, dict):
+            digest.update(part.get('mime_type', '').encode('utf-8'))
+            digest.update(part.get('data', b''))
+        else:
+            digest.update(repr(part).encode('utf-8'))
+    return digest.hexdigest()
+
+
+def _expire_timestamp(cached, fallback: float) -> float:
+    try:
+        return cached.expire_time.timestamp()
+    except (AttributeError, ValueError, OSError):
+        return fallback
+
+
+class ContextCache:
+    """記錄已建立的遠端快取：(金鑰, 模型, 前綴雜湊) -> (快取名稱, 到期時間)。所有方法皆為執行緒安全。"""
+
+    def __init__(self):
+        self._entries = {}
+        self._unsupported_models = set()
+        self._min_tokens = {}        # 由錯誤回應得知的模型最低 token 數
+        self._inline_entries = set() # 建立快取失敗 (非模型不支援) 的前綴，不再重試
+        self._listed_keys = set()
+        self._lock = threading.Lock()
+        self._entry_locks = {}
+
+    def _entry_lock(self, entry_key) -> threading.Lock:
+        with self._lock:
+            return self._entry_locks.setdefault(entry_key, threading.Lock())
+
+    def _valid_entry(self, entry_key) -> str | None:
+        entry = self._entries.get(entry_key)
+        if entry and entry[1] - time.time() > CONTEXT_CACHE_EXPIRY_MARGIN:
+            return entry[0]
+        return None
+
+    def lookup_or_create(self, key, model_name: str, prefix: list) -> tuple[str | None, str]:
+        """
+        返回 (快取名稱, 狀態)。狀態為 'hit'、'created' 或 'inline'；
+        'inline' 時快取名稱為 None，呼叫端應將前綴直接附在請求中。
+        """
+        if not CONTEXT_CACHE_ENABLED or model_name in self._unsupported_models:
+            return None, 'inline'
+        if estimate_tokens(prefix) < self._min_tokens.get(model_name, min_cache_tokens(model_name)):
+            return None, 'inline'
+        digest = prefix_digest(model_name, prefix)
+        entry_key = (key.fingerprint, model_name, digest)
+        if entry_key in self._inline_entries:
+            return None, 'inline'
+        # 同一個前綴同時只由一個執行緒建立快取，其餘執行緒等待後直接使用
+        with self._entry_lock(entry_key):
+            cache_name = self._valid_entry(entry_key)
+            if cache_name:
+                return cache_name, 'hit'
+            self._load_remote_entries(key)
+            cache_name = self._valid_entry(entry_key)
+            if cache_name:
+                return cache_name, 'hit'
+            return self._create(key, model_name, digest, prefix, entry_key)
+
+    def _load_remote_entries(self, key):
+        """每組金鑰只列出一次遠端快取，找回先前 (包含前一次執行) 建立的快取。"""
+        if key.fingerprint in self._listed_keys:
+            return
+        self._listed_keys.add(key.fingerprint)
+        try:
+            request = genai_protos.ListCachedContentsRequest(page_size=100)
+            for cached in key.cache_client().list_cached_contents(request):
+                if not cached.display_name.startswith(CONTEXT_CACHE_NAME_PREFIX):
+                    continue
+                digest = cached.display_name[len(CONTEXT_CACHE_NAME_PREFIX):]
+                model_name = cached.model.split('/', 1)[-1]
+                self._entries[(key.fingerprint, model_name, digest)] = (cached.name, _expire_timestamp(cached, 0))
+        except Exception as e:
+            logging.debug("[ContextCache] 無法列出金鑰 %s 的既有快取: %s", key.label, e)
+
+    def _create(self, key, model_name, digest, prefix, entry_key) -> tuple[str | None, str]:
+        try:
+            request = genai_caching.CachedContent._prepare_create_request(
+                model=model_name,
+                display_name=CONTEXT_CACHE_NAME_PREFIX + digest,
+                contents=prefix,
+                ttl=CONTEXT_CACHE_TTL_SECONDS,
+            )
+            cached = key.cache_client().create_cached_content(request)
+        except Exception as e:
+            self._record_failure(model_name, entry_key, e)
+            logging.warning(f"[ContextCache] 無法為 {model_name} 建立快取，改為直接送出前綴: {e}")
+            return None, 'inline'
+        expires_at = _expire_timestamp(cached, time.time() + CONTEXT_CACHE_TTL_SECONDS)
+        self._entries[entry_key] = (cached.name, expires_at)
+        logging.info(f"[ContextCache] 已為 {model_name} 建立快取 {cached.name} (約 {estimate_tokens(prefix)} tokens，金鑰 {key.label})")
+        return cached.name, 'created'
+
+    def _record_failure(self, model_name: str, entry_key, error: Exception):
+        """
+        前綴太短時記下模型的最低 token 數 (估計值可能偏高，只影響此前綴)；
+        模型不支援快取 (或版本別名不可快取) 時之後不再為此模型嘗試；其他錯誤只讓此前綴不再重試。
+        """
+        message = str(error)
+        if isinstance(error, api_exceptions.InvalidArgument) and _TOO_SMALL_ERROR.search(message):
+            match = _MIN_TOKENS_IN_ERROR.search(message)
+            if match:
+                self._min_tokens[model_name] = max(int(match.group(1)), self._min_tokens.get(model_name, 0))
+            self._inline_entries.add(entry_key)
+        elif (isinstance(error, (api_exceptions.NotFound, api_exceptions.FailedPrecondition))
+              or (isinstance(error, api_exceptions.InvalidArgument) and _UNSUPPORTED_ERROR.search(message))):
+            self._unsupported_models.add(model_name)
+        else:
+            self._inline_entries.add(entry_key)
+
+
+context_cache = ContextCache()
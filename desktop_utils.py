@@ -5,8 +5,21 @@ import shutil
 import logging
 import subprocess
 import sys
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor, Future
 
 BASE_OUTPUT_FOLDER_NAME = "AI 工具輸出"
+EXPORT_WORKERS = 2
+EXPORT_COPY_BUFFER_SIZE = 1024 * 1024
+FICLONE = 0x40049409  # linux/fs.h
+# 記住下一個可用編號的 (資料夾, 檔名) 數量上限；超過時捨棄最久未使用的，被捨棄的檔名從頭探測
+EXPORT_NAME_COUNTER_ENTRIES = 256
+
+_export_executor = ThreadPoolExecutor(max_workers=EXPORT_WORKERS, thread_name_prefix="DesktopExport")
+_name_counters = OrderedDict()
+_output_root_override = None
+_name_counters_lock = threading.Lock()
 
 def get_desktop_path():
     """安全地獲取桌面路徑，如果不存在則返回使用者根目錄。"""
@@ -16,9 +29,82 @@ def get_desktop_path():
         logging.warning(f"桌面資料夾 (~/Desktop) 不存在，將使用使用者根目錄: {desktop_path}")
     return desktop_path
 
+def set_output_root(path: str | None):
+    """指定所有輸出檔案的根資料夾 (例如命令列模式的 --output-dir)；None 表示恢復使用桌面。"""
+    global _output_root_override
+    _output_root_override = os.path.abspath(path) if path else None
+
+def get_output_root() -> str:
+    """輸出檔案的根資料夾；預設為桌面上的「AI 工具輸出」。"""
+    if _output_root_override:
+        return _output_root_override
+    return os.path.join(get_desktop_path(), BASE_OUTPUT_FOLDER_NAME)
+
+def _reflink(src_fd: int, dst_fd: int) -> bool:
+    """嘗試以 copy-on-write 方式複製 (Linux btrfs/XFS 的 FICLONE)，不支援時返回 False。"""
+    if not sys.platform.startswith("linux"):
+        return False
+    try:
+        import fcntl
+        fcntl.ioctl(dst_fd, FICLONE, src_fd)
+        return True
+    except (ImportError, OSError):
+        return False
+
+
+def _candidate_names(target_folder: str, desired_filename: str):
+    """依序產生候選檔名；從上次用過的編號繼續，避免在大量輸出的資料夾中逐一探測。"""
+    name, ext = os.path.splitext(desired_filename)
+    key = (target_folder, desired_filename)
+    with _name_counters_lock:
+        counter = _name_counters.get(key, 0)
+    while True:
+        candidate = desired_filename if counter == 0 else f"{name}_{counter}{ext}"
+        counter += 1
+        with _name_counters_lock:
+            _name_counters[key] = max(_name_counters.get(key, 0), counter)
+            _name_counters.move_to_end(key)
+            while len(_name_counters) > EXPORT_NAME_COUNTER_ENTRIES:
+                _name_counters.popitem(last=False)
+        yield os.path.join(target_folder, candidate)
+
+
+def _export_file(source_path: str, target_folder: str, desired_filename: str) -> str:
+    """
+    以原子方式取得不重複的檔名並輸出檔案，返回最終路徑。
+    優先使用硬連結 (零複製)，其次 reflink，最後才做一般複製；
+    檔名一律由 os.link 或 O_EXCL 原子地佔用，不會與同時進行的輸出互相覆蓋。
+    """
+    use_hardlink = True
+    for candidate in _candidate_names(target_folder, desired_filename):
+        if use_hardlink:
+            try:
+                os.link(source_path, candidate)
+                return candidate
+            except FileExistsError:
+                continue
+            except (OSError, NotImplementedError):
+                use_hardlink = False  # 跨磁碟區或檔案系統不支援，改用複製
+
+        try:
+            dst_fd = os.open(candidate, os.O_WRONLY | os.O_CREAT | os.O_EXCL | getattr(os, "O_BINARY", 0))
+        except FileExistsError:
+            continue
+        try:
+            with open(source_path, "rb") as src, os.fdopen(dst_fd, "wb") as dst:
+                if not _reflink(src.fileno(), dst.fileno()):
+                    shutil.copyfileobj(src, dst, EXPORT_COPY_BUFFER_SIZE)
+            shutil.copystat(source_path, candidate)
+        except Exception:
+            if os.path.exists(candidate):
+                os.remove(candidate)
+            raise
+        return candidate
+
+
 def copy_to_desktop_folder(source_path: str, subfolder_name: str, desired_filename: str) -> tuple[str | None, str | None]:
     """
-    將檔案複製到桌面「AI 工具輸出」下的指定子資料夾中。
+    將檔案輸出到桌面「AI 工具輸出」下的指定子資料夾中。
     (注意：現在 subfolder_name 直接是 '翻譯檔案', '摘要檔案' 等)
     """
     if not os.path.exists(source_path):
@@ -26,27 +112,30 @@ def copy_to_desktop_folder(source_path: str, subfolder_name: str, desired_filena
         return None, None
 
     try:
-        desktop_path = get_desktop_path()
-        base_output_folder = os.path.join(desktop_path, BASE_OUTPUT_FOLDER_NAME)
-        target_folder = os.path.join(base_output_folder, subfolder_name)
+        target_folder = os.path.join(get_output_root(), subfolder_name)
         os.makedirs(target_folder, exist_ok=True)
 
-        # 處理檔名衝突
-        final_desktop_path = os.path.join(target_folder, desired_filename)
-        counter = 1
-        name, ext = os.path.splitext(desired_filename)
-        while os.path.exists(final_desktop_path):
-            final_desktop_path = os.path.join(target_folder, f"{name}_{counter}{ext}")
-            counter += 1
-
+        final_desktop_path = _export_file(source_path, target_folder, desired_filename)
         final_display_filename = os.path.basename(final_desktop_path)
-        shutil.copy2(source_path, final_desktop_path)
-        logging.info(f"成功複製檔案到: {final_desktop_path}")
+        logging.info(f"成功輸出檔案到: {final_desktop_path}")
         return final_desktop_path, final_display_filename
     except Exception as e:
         logging.error(f"複製檔案 '{os.path.basename(source_path)}' 到桌面資料夾 '{subfolder_name}' 失敗: {e}", exc_info=True)
         return None, None
 
+def copy_to_desktop_folder_async(source_path: str, subfolder_name: str, desired_filename: str) -> Future:
+    """
+    在背景執行緒中輸出檔案，不阻塞工作流程的下一個步驟。
+    返回的 Future 結果與 copy_to_desktop_folder 相同；
+    呼叫端在刪除來源檔案 (例如清理任務資料夾) 前必須先呼叫 wait_for_exports。
+    """
+    return _export_executor.submit(copy_to_desktop_folder, source_path, subfolder_name, desired_filename)
+
+def wait_for_exports(futures: list[Future]):
+    """等待所有背景輸出完成；輸出失敗已在 copy_to_desktop_folder 中記錄，這裡不再拋出。"""
+    for future in futures:
+        future.result()
+
 def open_folder_in_explorer(folder_path: str):
     """在作業系統的檔案總管中打開指定資料夾。"""
     if not os.path.isdir(folder_path):
@@ -0,0 +1,275 @@
+# document_pool.py
+# 文件建構的行程池：寫出 DOCX / PPTX / MD / JSON 與渲染 PDF 頁面都是純 CPU 的工作，
+# 與 Flask 在同一個直譯器中執行時會因 GIL 讓 SSE 串流與對話回應卡頓。
+# 這些工作改由常駐、已預先 import 重量級模組的子行程執行，主行程只負責交付與等待結果。
+#
+#   set_document_pool(DocumentPool(workers=2).start())   # app.py 啟動時
+#   output_writers.write_outputs(...) / page_window.make_pdf_page_renderer(...) 自動改用行程池
+#
+# 交付方式：
+#   - 寫出文件：DocumentResult 的區塊以 pickle 序列化，超過 HANDOFF_INLINE_BYTES 時放進共享記憶體
+#     (multiprocessing.shared_memory)，子行程直接從共享記憶體讀取，不經過管線複製；
+#   - 渲染頁面：只交付 PDF 的路徑與頁碼，子行程自行開啟檔案 (保留最近使用的文件)，回傳編碼後的圖片；
+#     渲染結束後以 close_document() 讓每個子行程關閉該檔案 (否則 Windows 上無法刪除任務資料夾)。
+# 未設定行程池時一律在目前的行程中執行；子行程異常結束時重建行程池並重試一次。
+
+import os
+import sys
+import pickle
+import logging
+import logging.handlers
+import importlib
+import importlib.util
+import threading
+import multiprocessing
+from collections import OrderedDict
+from multiprocessing import shared_memory
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+# 預設的子行程數 (config.ini 的 [Performance] DOCUMENT_WORKERS，0 表示不使用行程池)
+DOCUMENT_POOL_WORKERS = 2
+# 子行程啟動時預先 import 的模組，第一個工作不必等待載入
+WORKER_MODULES = (
+    "docx",
+    "fitz",
+    "pptx",
+    "workflow_scripts.docx_writer",
+    "workflow_scripts.output_writers",
+    "workflow_scripts.summary_to_ppt",
+    "workflow_scripts.page_window",
+)
+# 序列化後超過此大小的輸入改以共享記憶體交付
+HANDOFF_INLINE_BYTES = 1024 * 1024
+# 每個子行程保留開啟的 PDF 數量
+WORKER_OPEN_DOCUMENTS = 4
+# close_document() 等待所有子行程都取得關閉工作的秒數 (其他子行程可能正在執行其他任務的工作)
+CLOSE_DOCUMENT_TIMEOUT = 30
+
+# 子行程中已開啟的 PDF：(路徑, 修改時間) -> fitz.Document
+_open_documents = OrderedDict()
+# 子行程中：close_document() 用來讓每個子行程各執行一次關閉工作的屏障
+_close_barrier = None
+
+
+# ==============================================================================
+#                            子行程中執行的函式
+# ==============================================================================
+class _ForwardToLogger(logging.Handler):
+    """主行程中：將子行程送回的日誌紀錄交給同名的 logger，與主行程的日誌走同一條管線 (見 logging_setup)。"""
+
+    def handle(self, record):
+        logger = logging.getLogger(record.name)
+        if logger.isEnabledFor(record.levelno):
+            logger.handle(record)
+        return True
+
+
+def _init_worker(module_names, log_queue, log_level, close_barrier):
+    global _close_barrier
+    _close_barrier = close_barrier
+    # 子行程的日誌經由佇列送回主行程寫入，不直接開啟 (會被輪替的) 日誌檔
+    root = logging.getLogger()
+    for handler in list(root.handlers):
+        root.removeHandler(handler)
+    root.addHandler(logging.handlers.QueueHandler(log_queue))
+    root.setLevel(log_level)
+    for module_name in module_names:
+        try:
+            importlib.import_module(module_name)
+        except Exception as e:
+            logging.warning(f"[DocumentPool] 子行程預先載入 {module_name} 失敗: {e}")
+
+
+def _ping() -> int:
+    return os.getpid()
+
+
+def _load_payload(payload):
+    """payload 為 pickle 的位元組，或 ('shm', 共享記憶體名稱, 大小)。"""
+    if isinstance(payload, bytes):
+        return pickle.loads(payload)
+    _, name, size = payload
+    shm = shared_memory.SharedMemory(name=name)
+    try:
+        return pickle.loads(shm.buf[:size])
+    finally:
+        shm.close()
+
+
+def _write_outputs_job(payload, output_base: str, formats) -> dict[str, str]:
+    from workflow_scripts.output_writers import DocumentResult, write_outputs_local
+    return write_outputs_local(DocumentResult(_load_payload(payload)), output_base, formats)
+
+
+def _open_document(pdf_path: str):
+    import fitz
+    key = (pdf_path, os.path.getmtime(pdf_path))
+    document = _open_documents.pop(key, None)
+    if document is None:
+        document = fitz.open(pdf_path)
+    _open_documents[key] = document
+    while len(_open_documents) > WORKER_OPEN_DOCUMENTS:
+        _, oldest = _open_documents.popitem(last=False)
+        oldest.close()
+    return document
+
+
+def _close_document_job(pdf_path: str, timeout: float):
+    for key in [key for key in _open_documents if key[0] == pdf_path]:
+        _open_documents.pop(key).close()
+    # 已取得關閉工作的子行程在此等待，其他的關閉工作只會由其他子行程取得
+    _close_barrier.wait(timeout)
+
+
+def _render_page_job(pdf_path: str, index: int, matrix, dpi, image_format: str) -> bytes:
+    import fitz
+    from workflow_scripts.page_window import make_local_pdf_page_renderer
+    render = make_local_pdf_page_renderer(_open_document(pdf_path), fitz.Matrix(*matrix) if matrix else None,
+                                          dpi, image_format)
+    return render(index)
+
+
+# ==============================================================================
+#                                  主行程
+# ==============================================================================
+class _SharedPayload:
+    """將序列化後的輸入放進共享記憶體 (較小的輸入直接經由管線交付)；離開時釋放共享記憶體。"""
+
+    def __init__(self, data: bytes):
+        self.data = data
+        self._shm = None
+
+    def __enter__(self):
+        if len(self.data) <= HANDOFF_INLINE_BYTES:
+            return self.data
+        self._shm = shared_memory.SharedMemory(create=True, size=len(self.data))
+        self._shm.buf[:len(self.data)] = self.data
+        return ('shm', self._shm.name, len(self.data))
+
+    def __exit__(self, exc_type, exc, tb):
+        if self._shm is not None:
+            self._shm.close()
+            self._shm.unlink()
+            self._shm = None
+        return False
+
+
+class DocumentPool:
+    """常駐的文件建構行程池 (spawn)。run() 可由任何執行緒呼叫，並行數為子行程數。"""
+
+    def __init__(self, workers: int = DOCUMENT_POOL_WORKERS, module_names=WORKER_MODULES):
+        self.workers = max(1, workers)
+        self.module_names = tuple(module_names)
+        self._executor = None
+        self._log_queue = None
+        self._log_listener = None
+        self._close_barrier = None
+        self._lock = threading.Lock()
+        self._close_lock = threading.Lock()
+
+    def start(self) -> 'DocumentPool':
+        """建立子行程並開始預先載入模組 (不等待載入完成)。"""
+        with self._lock:
+            if self._executor is None:
+                context = multiprocessing.get_context('spawn')
+                self._log_queue = context.Queue()
+                self._log_listener = logging.handlers.QueueListener(self._log_queue, _ForwardToLogger())
+                self._log_listener.start()
+                self._close_barrier = context.Barrier(self.workers)
+                self._executor = self._create_executor()
+        return self
+
+    def _create_executor(self) -> ProcessPoolExecutor:
+        executor = ProcessPoolExecutor(max_workers=self.workers, mp_context=multiprocessing.get_context('spawn'),
+                                       initializer=_init_worker,
+                                       initargs=(self.module_names, self._log_queue, logging.getLogger().level,
+                                                 self._close_barrier))
+        # spawn 的子行程會先重新執行主模組 (app.py 會設定日誌、啟動工作者執行緒)；
+        # 建立子行程的期間把主模組指向本模組，子行程只會載入這個輕量的模組。
+        # 同時送出 workers 個工作，讓所有子行程在此一次建立，之後不會再以其他主模組建立子行程。
+        main_module = sys.modules['__main__']
+        original_spec = getattr(main_module, '__spec__', None)
+        main_module.__spec__ = importlib.util.find_spec(__name__)
+        try:
+            for _ in range(self.workers):
+                executor.submit(_ping)
+        finally:
+            main_module.__spec__ = original_spec
+        logging.info(f"[DocumentPool] 已啟動 {self.workers} 個文件建構子行程")
+        return executor
+
+    def run(self, fn, *args):
+        """
+        在子行程中執行 fn(*args) 並返回結果；行程池已關閉時在目前的行程中執行。
+        子行程異常結束 (例如損壞的頁面讓 MuPDF 崩潰) 時重建行程池並重試一次，
+        仍然失敗時拋出 BrokenProcessPool，不在目前的行程中重試，以免拖垮主行程。
+        """
+        for attempt in range(2):
+            with self._lock:
+                executor = self._executor
+            if executor is None:
+                return fn(*args)
+            try:
+                return executor.submit(fn, *args).result()
+            except BrokenProcessPool as e:
+                logging.warning(f"[DocumentPool] 子行程異常結束，重建行程池: {e}")
+                with self._lock:
+                    if self._executor is executor:
+                        executor.shutdown(wait=False, cancel_futures=True)
+                        self._close_barrier.reset()
+                        self._executor = self._create_executor()
+                if attempt:
+                    raise
+
+    def write_outputs(self, result, output_base: str, formats) -> dict[str, str]:
+        with _SharedPayload(pickle.dumps(result.blocks, protocol=pickle.HIGHEST_PROTOCOL)) as payload:
+            return self.run(_write_outputs_job, payload, output_base, formats)
+
+    def pdf_page_renderer(self, pdf_path: str, matrix=None, dpi=None, image_format: str = "png"):
+        """與 page_window.make_pdf_page_renderer 相同的渲染函式，渲染在子行程中進行。"""
+        matrix = tuple(matrix) if matrix is not None else None
+        def render(index: int) -> bytes:
+            return self.run(_render_page_job, pdf_path, index, matrix, dpi, image_format)
+        return render
+
+    def close_document(self, pdf_path: str):
+        """
+        讓每個子行程關閉已開啟的 pdf_path (渲染結束時呼叫)。送出子行程數個關閉工作，
+        每個子行程取得一個後在屏障等待，因此每個子行程都會執行一次；逾時時記錄警告後返回。
+        """
+        with self._lock:
+            executor = self._executor
+        if executor is None:
+            return
+        with self._close_lock:
+            try:
+                futures = [executor.submit(_close_document_job, pdf_path, CLOSE_DOCUMENT_TIMEOUT)
+                           for _ in range(self.workers)]
+                for future in futures:
+                    future.result()
+            except Exception as e:
+                logging.warning(f"[DocumentPool] 子行程關閉 {os.path.basename(pdf_path)} 失敗: {e!r}")
+                self._close_barrier.reset()
+
+    def shutdown(self):
+        with self._lock:
+            executor, self._executor = self._executor, None
+            listener, self._log_listener = self._log_listener, None
+        if executor is not None:
+            executor.shutdown(wait=True, cancel_futures=True)
+        if listener is not None:
+            listener.stop()
+
+
+_pool = None
+
+
+def set_document_pool(pool: DocumentPool | None):
+    """設定全域的文件建構行程池 (由 app.py 在啟動時呼叫)；未設定時在目前的行程中執行。"""
+    global _pool
+    _pool = pool
+
+
+def get_document_pool() -> DocumentPool | None:
+    return _pool
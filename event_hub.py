@@ -0,0 +1,142 @@
+# event_hub.py
+
+import time
+import logging
+import threading
+from collections import deque
+
+# 每個任務在記憶體中保留的事件數上限 (環形緩衝區)
+EVENT_BUFFER_SIZE = 256
+# 任務結束後仍保留事件供重新連線 / 其他分頁重播的秒數
+RETENTION_SECONDS = 300
+# 這些事件類型代表串流結束
+TERMINAL_EVENT_TYPES = ('done', 'error', 'complete')
+
+
+class TaskChannel:
+    """
+    單一任務的事件頻道。
+    工作者透過 put() 發佈事件 (介面與 queue.Queue.put 相同)，
+    任意數量的 SSE 訂閱者可各自從指定的事件 ID 之後開始讀取，彼此不會搶走事件。
+    """
+
+    def __init__(self, task_id: str, capacity: int = EVENT_BUFFER_SIZE):
+        self.task_id = task_id
+        self._events = deque(maxlen=capacity)  # (event_id, ProgressEvent)
+        self._next_id = 1
+        self._cond = threading.Condition()
+        self.closed_at = None
+        self.subscriber_count = 0
+        # 最後一個訂閱者離開 (或頻道建立) 的時間；有訂閱者時為 None
+        self.idle_since = time.monotonic()
+
+    @property
+    def closed(self) -> bool:
+        return self.closed_at is not None
+
+    def put(self, event):
+        """發佈一則 ProgressEvent。連續的 progress 事件會被合併，只保留最新的一則；lane 事件則是每條子流程只保留最新的一則。"""
+        if not hasattr(event, 'to_json'):
+            logging.warning(f"[EventHub {self.task_id}] 收到無效的事件資料: {event!r}")
+            return
+        with self._cond:
+            if event.type == 'progress' and self._events and self._events[-1][1].type == 'progress':
+                self._events.pop()
+            elif event.type == 'lane':
+                self._drop_running_lane(event.lane)
+            self._events.append((self._next_id, event))
+            self._next_id += 1
+            self._cond.notify_all()
+
+    def _drop_running_lane(self, lane: int):
+        """移除同一條子流程上一則仍在執行中的 lane 事件 (各子流程交錯發送，不一定是最後一則)。"""
+        for index in range(len(self._events) - 1, -1, -1):
+            previous = self._events[index][1]
+            if previous.type == 'lane' and previous.lane == lane:
+                if previous.state == 'running':
+                    del self._events[index]
+                return
+
+    def close(self):
+        with self._cond:
+            if self.closed_at is None:
+                self.closed_at = time.monotonic()
+            self._cond.notify_all()
+
+    def _events_after(self, last_event_id: int):
+        return [event for event in self._events if event[0] > last_event_id]
+
+    def subscribe(self, last_event_id: int = 0, keepalive: float = 60):
+        """
+        產生 (event_id, ProgressEvent)；在 keepalive 秒內沒有新事件時產生 None，
+        讓呼叫端可送出心跳。讀到結束事件或頻道已關閉且無新事件時結束。
+        """
+        with self._cond:
+            self.subscriber_count += 1
+            self.idle_since = None
+        try:
+            while True:
+                with self._cond:
+                    pending = self._events_after(last_event_id)
+                    if not pending and not self.closed:
+                        self._cond.wait(timeout=keepalive)
+                        pending = self._events_after(last_event_id)
+                    channel_closed = self.closed
+                if not pending:
+                    if channel_closed:
+                        return
+                    yield None
+                    continue
+                for event in pending:
+                    last_event_id = event[0]
+                    yield event
+                    if event[1].type in TERMINAL_EVENT_TYPES:
+                        return
+        finally:
+            with self._cond:
+                self.subscriber_count -= 1
+                if self.subscriber_count == 0:
+                    self.idle_since = time.monotonic()
+
+    def idle_seconds(self, since: float | None = None) -> float:
+        """沒有任何訂閱者的持續秒數 (從 since 與最後一個訂閱者離開兩者中較晚的時間起算)；有訂閱者時為 0。"""
+        with self._cond:
+            if self.idle_since is None:
+                return 0.0
+            return time.monotonic() - max(self.idle_since, since or 0.0)
+
+
+class EventHub:
+    """管理所有任務的事件頻道，並在保留期過後清除已結束的頻道。"""
+
+    def __init__(self, retention_seconds: float = RETENTION_SECONDS):
+        self.retention_seconds = retention_seconds
+        self._channels = {}
+        self._lock = threading.Lock()
+
+    def create(self, task_id: str) -> TaskChannel:
+        self._sweep()
+        channel = TaskChannel(task_id)
+        with self._lock:
+            self._channels[task_id] = channel
+        return channel
+
+    def get(self, task_id: str) -> TaskChannel | None:
+        self._sweep()
+        with self._lock:
+            return self._channels.get(task_id)
+
+    def close(self, task_id: str):
+        channel = self.get(task_id)
+        if channel:
+            channel.close()
+
+    def _sweep(self):
+        now = time.monotonic()
+        with self._lock:
+            expired = [task_id for task_id, channel in self._channels.items()
+                       if channel.closed and now - channel.closed_at > self.retention_seconds]
+            for task_id in expired:
+                del self._channels[task_id]
+        for task_id in expired:
+            logging.debug(f"[EventHub] 已清除過期的任務頻道 {task_id}")
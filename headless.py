@@ -0,0 +1,248 @@
+# headless.py
+# 無介面的命令列 / 函式庫入口，適合在沒有 GUI 的伺服器上批次執行。
+#
+#   python headless.py ocr scans/ --output-dir out/ --concurrency 4
+#   python headless.py summarize a.pdf b.pdf --json > progress.jsonl
+#
+# 也可在其他程式中直接呼叫 run_batch()。
+
+import os
+import sys
+import json
+import uuid
+import logging
+import argparse
+import tempfile
+import threading
+import configparser
+from concurrent.futures import ThreadPoolExecutor
+
+from lazy_imports import LazyModule, lazy_function
+from ai_config import MODEL_CONFIG
+from desktop_utils import set_output_root
+from logging_setup import setup_logging
+from progress_events import ProgressEmitter
+from task_workflows import ALLOWED_EXTENSIONS_BY_TASK, parse_output_formats, parse_page_ranges, run_task
+from key_pool import KeyPool, parse_key_specs, set_key_pool
+from usage_store import UsageStore, get_usage_store, set_usage_store
+from task_cancel import TaskCancelled
+
+genai = LazyModule("google.generativeai")
+benchmark_ocr_batch_sizes = lazy_function("workflow_scripts.pdf_ocr_translator", "benchmark_ocr_batch_sizes")
+
+DEFAULT_CONFIG_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'config.ini')
+# 與桌面應用程式共用的用量紀錄 (見 /usage 頁面)
+DEFAULT_USAGE_DB = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'usage_metrics.db')
+
+_print_lock = threading.Lock()
+
+
+def load_api_key(config_file: str = DEFAULT_CONFIG_FILE) -> str | None:
+    """依序從環境變數 GEMINI_API_KEY 與 config.ini 取得 API Key。"""
+    api_key = os.environ.get('GEMINI_API_KEY', '').strip()
+    if api_key:
+        return api_key
+    if not os.path.exists(config_file):
+        return None
+    config = configparser.ConfigParser()
+    config.read(config_file, encoding='utf-8')
+    api_key = config.get('Credentials', 'GEMINI_API_KEY', fallback='').strip()
+    if not api_key or api_key == 'YOUR_GEMINI_API_KEY_HERE':
+        return None
+    return api_key
+
+
+def load_key_pool(config_file: str = DEFAULT_CONFIG_FILE) -> KeyPool | None:
+    """依序從環境變數 GEMINI_API_KEYS 與 config.ini 的 GEMINI_API_KEYS 讀取多組金鑰；都沒有設定時返回 None。"""
+    keys = parse_key_specs(os.environ.get('GEMINI_API_KEYS', ''))
+    if not keys and os.path.exists(config_file):
+        config = configparser.ConfigParser()
+        config.read(config_file, encoding='utf-8')
+        keys = parse_key_specs(config.get('Credentials', 'GEMINI_API_KEYS', fallback=''))
+    return KeyPool(keys) if keys else None
+
+
+def iter_input_files(task_type: str, inputs) -> list[str]:
+    """展開輸入的檔案與資料夾 (遞迴)，只保留此任務類型支援的副檔名，並依路徑排序。"""
+    allowed_exts = ALLOWED_EXTENSIONS_BY_TASK[task_type]
+    files = []
+    for path in inputs:
+        if os.path.isdir(path):
+            for root, _, names in os.walk(path):
+                files.extend(os.path.join(root, name) for name in names)
+        else:
+            files.append(path)
+    return sorted(os.path.abspath(f) for f in files if os.path.splitext(f)[1].lower().lstrip('.') in allowed_exts)
+
+
+class _TaskSink:
+    """接收單一任務的進度事件，記錄最終結果並轉交給 on_event 回呼。"""
+
+    def __init__(self, task_id: str, input_path: str, on_event):
+        self.task_id = task_id
+        self.input_path = input_path
+        self.on_event = on_event
+        self.result = {'task_id': task_id, 'file': input_path, 'status': 'failed', 'message': '', 'folder_path': None}
+
+    def put(self, event):
+        if event.type == 'complete':
+            self.result.update(status='complete', message=event.message, folder_path=event.folder_path)
+        elif event.type == 'error' and self.result['status'] != 'complete':
+            self.result.update(status='error', message=event.message)
+        if self.on_event:
+            self.on_event(self.task_id, self.input_path, event)
+
+
+def run_file(task_type: str, input_path: str, api_key: str, on_event=None,
+             page_range: str | None = None, auto_skip: bool = True, output_formats=None) -> dict:
+    """
+    對單一檔案執行工作流程，返回結果 dict
+    (task_id, file, status: complete/error/failed/cancelled, message, folder_path, metrics)。
+    page_range / auto_skip 為 PDF 的頁面選取設定 (見 task_workflows.page_selection_options)；
+    output_formats 為 Word 之外要同時輸出的格式，例如 ['md', 'json']。
+    輸入檔案不會被移動或刪除，中間檔案放在暫存資料夾中並於結束時清除。
+    """
+    task_id = str(uuid.uuid4())
+    sink = _TaskSink(task_id, input_path, on_event)
+    task_info = {
+        'task_id': task_id,
+        'task_type': task_type,
+        'original_base_filename_preserved': os.path.splitext(os.path.basename(input_path))[0],
+        'uploaded_file_path': input_path,
+        'task_output_folder': tempfile.mkdtemp(prefix=f"ai_toolbox_{task_id[:8]}_"),
+        'page_range': page_range,
+        'auto_skip': auto_skip,
+        'output_formats': output_formats,
+    }
+    try:
+        sink.result['metrics'] = run_task(ProgressEmitter(sink), task_info, api_key)
+    except TaskCancelled as e:
+        sink.result.update(status='cancelled', message=str(e))
+    except Exception as e:
+        logging.error(f"[Headless] 處理 {input_path} 時發生錯誤: {e}", exc_info=True)
+        sink.result.update(status='error', message=str(e))
+    return sink.result
+
+
+def run_batch(task_type: str, inputs, output_dir: str | None = None, api_key: str | None = None,
+              concurrency: int = 1, on_event=None, page_range: str | None = None, auto_skip: bool = True,
+              output_formats=None) -> list[dict]:
+    """
+    批次執行任務。inputs 可混合檔案與資料夾；output_dir 為 None 時沿用桌面「AI 工具輸出」。
+    未指定 api_key 且有設定 GEMINI_API_KEYS 時，請求會分散到金鑰池中的各組金鑰。
+    on_event(task_id, input_path, event) 會在每個進度事件時被呼叫 (可能來自不同執行緒)。
+    page_range / auto_skip 套用到每個 PDF 檔案，output_formats 套用到每個檔案。
+    返回與輸入檔案順序相同的結果列表。
+    """
+    if task_type not in ALLOWED_EXTENSIONS_BY_TASK:
+        raise ValueError(f"不支援的任務類型: {task_type}")
+    parse_page_ranges(page_range)
+    output_formats = parse_output_formats(output_formats)
+    if not api_key:
+        key_pool = load_key_pool()
+        if key_pool is not None:
+            set_key_pool(key_pool)
+            api_key = key_pool.keys[0].key
+    api_key = api_key or load_api_key()
+    if not api_key:
+        raise ValueError("缺少 GEMINI_API_KEY (請設定環境變數 GEMINI_API_KEY / GEMINI_API_KEYS、config.ini 或 --api-key)")
+    files = iter_input_files(task_type, inputs)
+    if not files:
+        logging.warning(f"[Headless] 找不到可供 {task_type} 處理的檔案。")
+        return []
+
+    if output_dir:
+        os.makedirs(output_dir, exist_ok=True)
+    set_output_root(output_dir)
+    if get_usage_store() is None:
+        set_usage_store(UsageStore(DEFAULT_USAGE_DB))
+    genai.configure(api_key=api_key)
+    logging.info(f"[Headless] 任務類型 {task_type}，共 {len(files)} 個檔案，並行數 {concurrency}")
+    with ThreadPoolExecutor(max_workers=max(1, concurrency), thread_name_prefix="HeadlessWorker") as executor:
+        return list(executor.map(lambda path: run_file(task_type, path, api_key, on_event, page_range, auto_skip, output_formats), files))
+
+
+def _print_event_text(task_id, input_path, event):
+    data = event.to_dict()
+    detail = data.get('status') or data.get('message') or ''
+    if event.type == 'progress':
+        detail = f"{detail} [{data.get('current')}/{data.get('total')}]"
+    elif event.type == 'lane':
+        detail = f"[{data.get('label')}] {detail}"
+        if data.get('total'):
+            detail = f"{detail} [{data.get('current')}/{data.get('total')}]"
+    elif event.type == 'status' and data.get('percent') is not None:
+        detail = f"{detail} ({data['percent']}%)"
+    with _print_lock:
+        print(f"[{os.path.basename(input_path)}] {event.type}: {detail}", flush=True)
+
+
+def _print_event_json(task_id, input_path, event):
+    line = json.dumps({'task_id': task_id, 'file': input_path, **event.to_dict()}, ensure_ascii=False)
+    with _print_lock:
+        print(line, flush=True)
+
+
+def _run_ocr_batch_benchmark(parser, args) -> int:
+    try:
+        batch_sizes = [int(size) for size in args.benchmark_ocr_batch.split(',') if size.strip()]
+    except ValueError:
+        parser.error(f"無法解析每批頁數: {args.benchmark_ocr_batch}")
+    pool = None if args.api_key else load_key_pool()
+    if pool is not None:
+        set_key_pool(pool)
+    api_key = args.api_key or (pool.keys[0].key if pool else load_api_key())
+    if not api_key:
+        parser.error("缺少 GEMINI_API_KEY (請設定環境變數 GEMINI_API_KEY / GEMINI_API_KEYS、config.ini 或 --api-key)")
+    genai.configure(api_key=api_key)
+    for path in iter_input_files('ocr', args.inputs):
+        if not path.lower().endswith('.pdf'):
+            continue
+        for row in benchmark_ocr_batch_sizes(api_key, MODEL_CONFIG['OCR'], path, batch_sizes):
+            row['file'] = path
+            if args.json:
+                print(json.dumps(row, ensure_ascii=False), flush=True)
+            else:
+                print(f"[{os.path.basename(path)}] K={row['batch_size']}: {row['seconds']} 秒 "
+                      f"(每頁 {row['seconds_per_page']} 秒，取得文字 {row['pages_with_text']}/{row['pages']} 頁)", flush=True)
+    return 0
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="AI 工具箱無介面批次模式")
+    parser.add_argument('task_type', choices=sorted(ALLOWED_EXTENSIONS_BY_TASK), help="任務類型")
+    parser.add_argument('inputs', nargs='+', help="輸入檔案或資料夾 (資料夾會遞迴搜尋)")
+    parser.add_argument('-o', '--output-dir', help="輸出資料夾 (預設為桌面的「AI 工具輸出」)")
+    parser.add_argument('-j', '--concurrency', type=int, default=1, help="同時處理的檔案數 (預設 1)")
+    parser.add_argument('--json', action='store_true', help="以 JSON lines 格式輸出進度到 stdout")
+    parser.add_argument('--api-key', help="Gemini API Key (預設讀取環境變數 GEMINI_API_KEY 或 config.ini)")
+    parser.add_argument('--log-level', default='WARNING', help="輸出到 stderr 的日誌等級 (預設 WARNING)")
+    parser.add_argument('--benchmark-ocr-batch', metavar='SIZES',
+                        help="不產生輸出，改以逗號分隔的每批頁數 (例如 1,2,4,8) 量測輸入 PDF 的 OCR 耗時")
+    parser.add_argument('--pages', metavar='RANGE', help="只處理 PDF 的這些頁面，例如 1-5,8,10- (預設為全部頁面)")
+    parser.add_argument('--no-auto-skip', action='store_true', help="不自動略過空白頁、重複頁與參考文獻")
+    parser.add_argument('--formats', default='docx', help="輸出格式，以逗號分隔 (docx, md, txt, json；Word 一律輸出，預設 docx)")
+    args = parser.parse_args(argv)
+
+    # stdout 保留給進度輸出，日誌一律寫到 stderr
+    setup_logging(level=args.log_level.upper(), stream=sys.stderr)
+    if args.benchmark_ocr_batch:
+        return _run_ocr_batch_benchmark(parser, args)
+    on_event = _print_event_json if args.json else _print_event_text
+    try:
+        results = run_batch(args.task_type, args.inputs, args.output_dir, args.api_key, args.concurrency, on_event,
+                            page_range=args.pages, auto_skip=not args.no_auto_skip, output_formats=args.formats)
+    except ValueError as e:
+        parser.error(str(e))
+
+    failed = [r for r in results if r['status'] != 'complete']
+    summary = {'type': 'summary', 'total': len(results), 'succeeded': len(results) - len(failed), 'failed': len(failed)}
+    if args.json:
+        print(json.dumps(summary, ensure_ascii=False), flush=True)
+    else:
+        print(f"完成 {summary['succeeded']}/{summary['total']} 個檔案，失敗 {summary['failed']} 個。", flush=True)
+    return 1 if failed or not results else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,460 @@
+# key_pool.py
+# 多組 API Key 的排程池：頁面 OCR、分段摘要等請求會分散到各組金鑰，
+# 被限流 (429) 的金鑰暫時移出輪替，冷卻後自動回復。
+#
+# config.ini 範例 (每行一組金鑰，冒號後可選填每分鐘請求上限與同時請求數)：
+#   [Credentials]
+#   GEMINI_API_KEYS =
+#       AIza...key1:15
+#       AIza...key2:60:2
+
+import re
+import time
+import hashlib
+import asyncio
+import logging
+import threading
+from collections import deque
+
+from lazy_imports import LazyModule
+from context_cache import context_cache
+from usage_store import record_model_call
+
+genai = LazyModule("google.generativeai")
+genai_client = LazyModule("google.generativeai.client")
+api_exceptions = LazyModule("google.api_core.exceptions")
+
+# 被限流的金鑰在沒有 retry 提示時的冷卻秒數
+KEY_COOLDOWN_SECONDS = 60
+# 每組金鑰預設的同時請求數 (1 表示與單一金鑰時的逐頁處理相同)
+KEY_MAX_IN_FLIGHT = 1
+# 等待可用金鑰的最長秒數
+KEY_ACQUIRE_TIMEOUT = 300
+PLACEHOLDER_KEY = 'YOUR_GEMINI_API_KEY_HERE'
+
+_RETRY_DELAY_PATTERN = re.compile(r'retry in (\d+(?:\.\d+)?)\s*s|retry_delay\s*\{\s*seconds:\s*(\d+)', re.IGNORECASE)
+
+
+class ApiKey:
+    """池中的一組金鑰與其用量狀態。key 為 None 時使用 genai.configure 設定的全域用戶端。"""
+
+    def __init__(self, key: str | None, rpm: int = 0, max_in_flight: int = KEY_MAX_IN_FLIGHT):
+        self.key = key
+        self.rpm = rpm                      # 每分鐘請求上限，0 表示不限制
+        self.max_in_flight = max(1, max_in_flight)
+        self.label = f"...{key[-4:]}" if key else "default"   # 只用於日誌與狀態顯示
+        # 以完整金鑰的雜湊區分金鑰 (用戶端、遠端快取的索引)；label 相同的不同金鑰不會混用
+        self.fingerprint = hashlib.sha256(key.encode()).hexdigest()[:16] if key else "default"
+        self.in_flight = 0
+        self.cooldown_until = 0.0
+        self.disabled_reason = None
+        self.total_requests = 0
+        self.rate_limited_count = 0
+        self.last_used = 0.0
+        self._recent = deque()              # 最近 60 秒內的請求時間
+        self._manager = None
+        self._client_lock = threading.Lock()
+
+    def _client_for(self, service: str):
+        with self._client_lock:
+            if self._manager is None:
+                self._manager = genai_client._ClientManager()
+                self._manager.configure(api_key=self.key)
+            return self._manager.get_default_client(service)
+
+    def client(self):
+        """此金鑰專屬的 GenerativeServiceClient；不影響 genai.configure 的全域設定。"""
+        if self.key is None:
+            return None
+        return self._client_for("generative")
+
+    def async_client(self):
+        """此金鑰專屬的 GenerativeServiceAsyncClient；必須在使用它的事件迴圈中建立。"""
+        if self.key is None:
+            return None
+        return self._client_for("generative_async")
+
+    def cache_client(self):
+        """此金鑰的 CacheServiceClient (context caching 屬於各金鑰所在的專案)。"""
+        if self.key is None:
+            return genai_client.get_default_cache_client()
+        return self._client_for("cache")
+
+    def wait_seconds(self, now: float) -> float | None:
+        """距離此金鑰可再送出請求的秒數；0 表示立即可用，None 表示需等其他請求結束。"""
+        while self._recent and now - self._recent[0] >= 60:
+            self._recent.popleft()
+        if self.in_flight >= self.max_in_flight:
+            return None
+        if self.cooldown_until > now:
+            return self.cooldown_until - now
+        if self.rpm and len(self._recent) >= self.rpm:
+            return self._recent[0] + 60 - now
+        return 0.0
+
+    def load(self) -> float:
+        used = self.in_flight / self.max_in_flight
+        if self.rpm:
+            used += len(self._recent) / self.rpm
+        return used
+
+    def to_dict(self) -> dict:
+        return {
+            'key': self.label,
+            'rpm': self.rpm,
+            'requests': self.total_requests,
+            'rate_limited': self.rate_limited_count,
+            'cooling_down': self.cooldown_until > time.monotonic(),
+            'disabled': self.disabled_reason,
+        }
+
+
+class KeyPool:
+    """依各金鑰的剩餘額度分派請求；所有方法皆為執行緒安全。"""
+
+    def __init__(self, keys: list[ApiKey]):
+        if not keys:
+            raise ValueError("金鑰池至少需要一組 API Key")
+        self.keys = keys
+        self._cond = threading.Condition()
+        self._async_waiters = []    # 等待金鑰的協程: (事件迴圈, future)
+
+    @property
+    def max_in_flight(self) -> int:
+        return sum(k.max_in_flight for k in self.keys if k.disabled_reason is None) or 1
+
+    def _notify_locked(self):
+        """喚醒等待金鑰的執行緒與協程；呼叫端需持有 self._cond。"""
+        self._cond.notify_all()
+        for loop, waiter in self._async_waiters:
+            loop.call_soon_threadsafe(_wake_waiter, waiter)
+        self._async_waiters.clear()
+
+    def _try_acquire_locked(self) -> tuple[ApiKey | None, float | None]:
+        """取得一組立即可用的金鑰；沒有時返回 (None, 最短等待秒數或 None)。呼叫端需持有 self._cond。"""
+        usable = [k for k in self.keys if k.disabled_reason is None]
+        if not usable:
+            raise RuntimeError("沒有可用的 API Key: " + "; ".join(f"{k.label} {k.disabled_reason}" for k in self.keys))
+        now = time.monotonic()
+        waits = [(k.wait_seconds(now), k) for k in usable]
+        ready = [k for w, k in waits if w == 0]
+        if ready:
+            key = min(ready, key=lambda k: (k.load(), k.last_used))
+            key.in_flight += 1
+            key.total_requests += 1
+            key.last_used = now
+            key._recent.append(now)
+            return key, 0.0
+        timed_waits = [w for w, _ in waits if w is not None]
+        return None, min(timed_waits) if timed_waits else None
+
+    def acquire(self, timeout: float = KEY_ACQUIRE_TIMEOUT) -> ApiKey:
+        deadline = time.monotonic() + timeout
+        with self._cond:
+            while True:
+                key, wait = self._try_acquire_locked()
+                if key is not None:
+                    return key
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    raise TimeoutError(f"等待可用的 API Key 超過 {timeout} 秒")
+                self._cond.wait(min(remaining, wait) if wait is not None else remaining)
+
+    async def acquire_async(self, timeout: float = KEY_ACQUIRE_TIMEOUT) -> ApiKey:
+        """acquire 的非同步版本：等待期間不佔用執行緒。"""
+        loop = asyncio.get_running_loop()
+        deadline = time.monotonic() + timeout
+        while True:
+            waiter = loop.create_future()
+            with self._cond:
+                key, wait = self._try_acquire_locked()
+                if key is not None:
+                    return key
+                self._async_waiters.append((loop, waiter))
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                raise TimeoutError(f"等待可用的 API Key 超過 {timeout} 秒")
+            try:
+                await asyncio.wait_for(waiter, min(remaining, wait) if wait is not None else remaining)
+            except asyncio.TimeoutError:
+                pass
+            finally:
+                with self._cond:
+                    if (loop, waiter) in self._async_waiters:
+                        self._async_waiters.remove((loop, waiter))
+
+    def release(self, key: ApiKey):
+        with self._cond:
+            key.in_flight -= 1
+            self._notify_locked()
+
+    def mark_rate_limited(self, key: ApiKey, retry_after: float | None = None):
+        cooldown = retry_after or KEY_COOLDOWN_SECONDS
+        with self._cond:
+            key.cooldown_until = time.monotonic() + cooldown
+            key.rate_limited_count += 1
+            self._notify_locked()
+        logging.warning("[KeyPool] 金鑰 %s 被限流，暫停使用 %.0f 秒。", key.label, cooldown)
+
+    def disable(self, key: ApiKey, reason: str):
+        with self._cond:
+            key.disabled_reason = reason
+            self._notify_locked()
+        logging.error(f"[KeyPool] 金鑰 {key.label} 已停用: {reason}")
+
+    def _should_retry(self, key: ApiKey, error: Exception, attempts: int) -> bool:
+        """金鑰被限流或無效時標記該金鑰並返回 True (換下一組金鑰重試)；其他錯誤返回 False。"""
+        kind = classify_key_error(error)
+        if kind is None or key.key is None or attempts >= len(self.keys):
+            return False
+        if kind == 'rate_limited':
+            self.mark_rate_limited(key, _retry_after(error))
+            return True
+        if sum(1 for k in self.keys if k.disabled_reason is None) > 1:
+            self.disable(key, str(error)[:200])
+            return True
+        return False
+
+    def call(self, fn):
+        """
+        以一組可用的金鑰執行 fn(key) 並返回其結果。
+        金鑰被限流或無效時，換下一組金鑰重試；其他錯誤直接拋出。
+        """
+        attempts = 0
+        while True:
+            key = self.acquire()
+            try:
+                return fn(key)
+            except Exception as e:
+                if not self._should_retry(key, e, attempts):
+                    raise
+                attempts += 1
+            finally:
+                self.release(key)
+
+    async def call_async(self, fn):
+        """call 的非同步版本：fn(key) 需返回 awaitable。協程被取消時金鑰同樣會歸還。"""
+        attempts = 0
+        while True:
+            key = await self.acquire_async()
+            try:
+                return await fn(key)
+            except Exception as e:
+                if not self._should_retry(key, e, attempts):
+                    raise
+                attempts += 1
+            finally:
+                self.release(key)
+
+    def stats(self) -> list[dict]:
+        with self._cond:
+            return [k.to_dict() for k in self.keys]
+
+
+class PooledModel:
+    """
+    可取代 genai.GenerativeModel 的模型包裝：每次 generate_content (或 generate_content_async)
+    都從金鑰池取得一組金鑰，並使用綁定該金鑰的用戶端送出請求。
+    generate_content 可額外接收 cached_prefix (內容列表)：前綴夠長時以 context caching
+    在該金鑰下只上傳一次，之後的請求只送出其餘內容；否則前綴直接放在內容之前送出。
+    count_pages(response) -> 頁數 可選：回應可能只包含部分頁面的結果時 (例如批次 OCR)，
+    用量紀錄以實際取得結果的頁數為準，而不是請求中的頁面數。
+    """
+
+    def __init__(self, model_name: str, pool: KeyPool, metrics=None, **model_kwargs):
+        self.model_name = model_name
+        self.pool = pool
+        self.metrics = metrics
+        self._model_kwargs = model_kwargs
+        self._models = {}
+        self._lock = threading.Lock()
+
+    def model_for(self, key: ApiKey, cache_name: str | None = None):
+        with self._lock:
+            model = self._models.get((key.fingerprint, cache_name))
+            if model is None:
+                model = genai.GenerativeModel(self.model_name, **self._model_kwargs)
+                client = key.client()
+                if client is not None:
+                    model._client = client
+                if cache_name is not None:
+                    model._cached_content = cache_name
+                self._models[(key.fingerprint, cache_name)] = model
+            return model
+
+    def async_model_for(self, key: ApiKey, cache_name: str | None = None):
+        """與 model_for 相同，但另外綁定此金鑰的非同步用戶端 (需在事件迴圈中呼叫)。"""
+        model = self.model_for(key, cache_name)
+        with self._lock:
+            if model._async_client is None:
+                model._async_client = key.async_client()
+        return model
+
+    def _generate(self, key: ApiKey, cached_prefix, args, kwargs):
+        if cached_prefix is None:
+            return self.model_for(key).generate_content(*args, **kwargs)
+        cache_name, status = context_cache.lookup_or_create(key, self.model_name, cached_prefix)
+        if self.metrics is not None:
+            self.metrics.increment('context_cache', status)
+        contents, rest = args[0], args[1:]
+        if cache_name is not None:
+            return self.model_for(key, cache_name).generate_content(contents, *rest, **kwargs)
+        contents = list(cached_prefix) + (contents if isinstance(contents, list) else [contents])
+        return self.model_for(key).generate_content(contents, *rest, **kwargs)
+
+    async def _generate_async(self, key: ApiKey, cached_prefix, args, kwargs):
+        if cached_prefix is None:
+            return await self.async_model_for(key).generate_content_async(*args, **kwargs)
+        # 快取的查詢與建立是同步的 (每個前綴只發生一次)，放到執行緒池中進行
+        cache_name, status = await asyncio.to_thread(context_cache.lookup_or_create, key, self.model_name, cached_prefix)
+        if self.metrics is not None:
+            self.metrics.increment('context_cache', status)
+        contents, rest = args[0], args[1:]
+        if cache_name is not None:
+            return await self.async_model_for(key, cache_name).generate_content_async(contents, *rest, **kwargs)
+        contents = list(cached_prefix) + (contents if isinstance(contents, list) else [contents])
+        return await self.async_model_for(key).generate_content_async(contents, *rest, **kwargs)
+
+    def _record(self, attempts: '_Attempts', args, response=None, error: Exception | None = None, count_pages=None):
+        """記錄這次呼叫的 token 數、最後一次嘗試的延遲與換金鑰重試的次數 (見 usage_store)。"""
+        pages = _count_page_parts(args)
+        if count_pages is not None and response is not None:
+            try:
+                pages = min(pages, count_pages(response))
+            except Exception as e:
+                logging.debug("[KeyPool] 無法計算回應中的頁數，以請求的頁數記錄: %s", e)
+        record_model_call(self.metrics, self.model_name, response, latency=attempts.latency(),
+                          retries=max(0, attempts.count - 1), pages=pages, error=error)
+
+    def generate_content(self, *args, cached_prefix: list | None = None, count_pages=None, **kwargs):
+        attempts = _Attempts()
+
+        def send(key):
+            attempts.begin()
+            return self._generate(key, cached_prefix, args, kwargs)
+
+        try:
+            response = self.pool.call(send)
+        except Exception as e:
+            self._record(attempts, args, error=e)
+            raise
+        self._record(attempts, args, response, count_pages=count_pages)
+        return response
+
+    async def generate_content_async(self, *args, cached_prefix: list | None = None, count_pages=None, **kwargs):
+        attempts = _Attempts()
+
+        async def send(key):
+            attempts.begin()
+            return await self._generate_async(key, cached_prefix, args, kwargs)
+
+        try:
+            response = await self.pool.call_async(send)
+        except Exception as e:
+            self._record(attempts, args, error=e)
+            raise
+        self._record(attempts, args, response, count_pages=count_pages)
+        return response
+
+
+class _Attempts:
+    """一次 generate_content 中實際送出的請求次數，以及最後一次送出的時間。"""
+
+    def __init__(self):
+        self.count = 0
+        self.started = None
+
+    def begin(self):
+        self.count += 1
+        self.started = time.monotonic()
+
+    def latency(self) -> float:
+        return time.monotonic() - self.started if self.started is not None else 0.0
+
+
+def _count_page_parts(args) -> int:
+    """請求內容中的圖片 / PDF 部分數 (即這次請求處理的頁數)。"""
+    contents = args[0] if args else None
+    if not isinstance(contents, list):
+        return 0
+    return sum(1 for part in contents if isinstance(part, dict)
+               and str(part.get('mime_type', '')).startswith(('image/', 'application/pdf')))
+
+
+def _wake_waiter(waiter):
+    if not waiter.done():
+        waiter.set_result(None)
+
+
+def classify_key_error(error: Exception) -> str | None:
+    """'rate_limited'：金鑰被限流；'invalid'：金鑰無效或無權限；None：與金鑰無關的錯誤。"""
+    if isinstance(error, (api_exceptions.ResourceExhausted, api_exceptions.TooManyRequests)):
+        return 'rate_limited'
+    if isinstance(error, (api_exceptions.PermissionDenied, api_exceptions.Unauthenticated)):
+        return 'invalid'
+    if isinstance(error, api_exceptions.InvalidArgument) and 'api key' in str(error).lower():
+        return 'invalid'
+    return None
+
+
+def _retry_after(error: Exception) -> float | None:
+    match = _RETRY_DELAY_PATTERN.search(str(error))
+    if not match:
+        return None
+    return float(match.group(1) or match.group(2))
+
+
+def parse_key_specs(text: str) -> list[ApiKey]:
+    """解析「金鑰[:每分鐘上限[:同時請求數]]」格式的清單，以換行或逗號分隔。"""
+    keys = []
+    for spec in re.split(r'[\n,]', text or ''):
+        spec = spec.strip()
+        if not spec or spec.startswith(('#', ';')):
+            continue
+        key, *limits = [part.strip() for part in spec.split(':')]
+        if not key or key == PLACEHOLDER_KEY:
+            continue
+        try:
+            rpm = int(limits[0]) if len(limits) > 0 and limits[0] else 0
+            max_in_flight = int(limits[1]) if len(limits) > 1 and limits[1] else KEY_MAX_IN_FLIGHT
+        except ValueError:
+            logging.warning(f"[KeyPool] 無法解析金鑰 ...{key[-4:]} 的額度設定 '{spec.split(':', 1)[1]}'，使用預設值。")
+            rpm, max_in_flight = 0, KEY_MAX_IN_FLIGHT
+        keys.append(ApiKey(key, rpm, max_in_flight))
+    return keys
+
+
+def keys_from_config(config) -> list[ApiKey]:
+    """從 configparser 讀取 [Credentials] 的 GEMINI_API_KEYS；沒有設定時退回單一的 GEMINI_API_KEY。"""
+    keys = parse_key_specs(config.get('Credentials', 'GEMINI_API_KEYS', fallback=''))
+    if not keys:
+        keys = parse_key_specs(config.get('Credentials', 'GEMINI_API_KEY', fallback=''))
+    return keys
+
+
+_pool = None
+_single_key_pools = {}
+_pool_lock = threading.Lock()
+
+
+def set_key_pool(pool: KeyPool | None):
+    """設定全域金鑰池 (由 app.py / headless.py 在啟動時呼叫)。"""
+    global _pool
+    _pool = pool
+    if pool is not None:
+        logging.info(f"[KeyPool] 已載入 {len(pool.keys)} 組 API Key: {', '.join(k.label for k in pool.keys)}")
+
+
+def get_key_pool(api_key: str | None = None) -> KeyPool:
+    """返回全域金鑰池；尚未設定時，以傳入的單一金鑰 (或全域用戶端) 建立一個池。"""
+    if _pool is not None:
+        return _pool
+    with _pool_lock:
+        pool = _single_key_pools.get(api_key)
+        if pool is None:
+            pool = _single_key_pools[api_key] = KeyPool([ApiKey(api_key)])
+        return pool
+
+
+def pooled_model(model_name: str, api_key: str | None = None, **model_kwargs) -> PooledModel:
+    return PooledModel(model_name, get_key_pool(api_key), **model_kwargs)
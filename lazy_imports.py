@@ -0,0 +1,111 @@
+# lazy_imports.py
+
+import os
+import sys
+import json
+import time
+import logging
+import importlib
+import threading
+import subprocess
+
+# 只有在第一個任務或聊天請求時才需要的重量級模組 (SDK 與文件處理函式庫)
+HEAVY_MODULES = (
+    "google.generativeai",
+    "docx",
+    "fitz",
+    "PIL.Image",
+    "pptx",
+    "workflow_scripts.pdf_ocr_translator",
+    "workflow_scripts.text_summarizer",
+    "workflow_scripts.summary_to_ppt",
+    "workflow_scripts.pdf_splitter",
+    "workflow_scripts.docx_writer",
+    "workflow_scripts.page_window",
+    "workflow_scripts.image_pages",
+    "workflow_scripts.output_writers",
+    "workflow_scripts.page_selection",
+    "workflow_scripts.text_reader",
+    "workflow_scripts.chapter_summarizer",
+)
+
+# `import app` 允許花費的時間上限 (毫秒)
+STARTUP_IMPORT_BUDGET_MS = 1500
+
+def _import(module_name: str):
+    # 不直接讀 sys.modules：其他執行緒可能正在初始化同一模組，
+    # importlib.import_module 會等待初始化完成後才返回
+    if module_name in sys.modules:
+        return importlib.import_module(module_name)
+    start = time.perf_counter()
+    module = importlib.import_module(module_name)
+    logging.debug(f"[LazyImport] 已載入 {module_name} ({(time.perf_counter() - start) * 1000:.0f} ms)")
+    return module
+
+
+class LazyModule:
+    """在第一次存取屬性時才 import 的模組代理。"""
+
+    def __init__(self, module_name: str):
+        self._module_name = module_name
+
+    def __getattr__(self, attr):
+        return getattr(_import(self._module_name), attr)
+
+    def __repr__(self):
+        return f"<LazyModule '{self._module_name}'>"
+
+
+def lazy_function(module_name: str, function_name: str):
+    """返回一個包裝函式，第一次呼叫時才 import 實際所在的模組。"""
+    def wrapper(*args, **kwargs):
+        return getattr(_import(module_name), function_name)(*args, **kwargs)
+    wrapper.__name__ = function_name
+    wrapper.__qualname__ = function_name
+    return wrapper
+
+
+def prewarm(module_names=HEAVY_MODULES):
+    """依序載入重量級模組；設計為在視窗顯示後於背景執行緒執行。"""
+    start = time.perf_counter()
+    for module_name in module_names:
+        try:
+            _import(module_name)
+        except Exception as e:
+            logging.warning(f"[LazyImport] 預熱載入 {module_name} 失敗: {e}")
+    logging.info(f"[LazyImport] 背景預熱完成，共 {len(module_names)} 個模組，耗時 {time.perf_counter() - start:.2f} 秒")
+
+
+def start_prewarm_thread(module_names=HEAVY_MODULES) -> threading.Thread:
+    thread = threading.Thread(target=prewarm, args=(module_names,), daemon=True, name="ImportPrewarmThread")
+    thread.start()
+    return thread
+
+
+def check_startup_budget(entry_module: str = "app", budget_ms: float = STARTUP_IMPORT_BUDGET_MS) -> bool:
+    """
+    在全新的子行程中量測 `import entry_module` 的耗時，並確認沒有任何重量級模組被提前載入。
+    返回是否符合預算。
+    """
+    probe = (
+        "import sys, time, json\n"
+        "start = time.perf_counter()\n"
+        f"import {entry_module}\n"
+        "elapsed = (time.perf_counter() - start) * 1000\n"
+        f"heavy = [m for m in {list(HEAVY_MODULES)!r} if m in sys.modules]\n"
+        "print('STARTUP_BUDGET ' + json.dumps({'elapsed_ms': elapsed, 'heavy': heavy}))\n"
+    )
+    base_dir = os.path.dirname(os.path.abspath(__file__))
+    result = subprocess.run([sys.executable, "-c", probe], cwd=base_dir, capture_output=True, text=True, encoding="utf-8")
+    if result.returncode != 0:
+        logging.error(f"[StartupBudget] 無法量測匯入時間: {result.stderr.strip()}")
+        return False
+
+    # 子行程的日誌也會輸出到 stdout，只取帶有標記的那一行
+    report_line = next(line for line in result.stdout.splitlines() if line.startswith('STARTUP_BUDGET '))
+    report = json.loads(report_line[len('STARTUP_BUDGET '):])
+    elapsed_ms, heavy = report['elapsed_ms'], report['heavy']
+    within_budget = elapsed_ms <= budget_ms and not heavy
+    log = logging.info if within_budget else logging.error
+    log(f"[StartupBudget] import {entry_module}: {elapsed_ms:.0f} ms (預算 {budget_ms:.0f} ms)，提前載入的重量級模組: {heavy or '無'}")
+    return within_budget
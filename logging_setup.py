@@ -0,0 +1,69 @@
+# logging_setup.py
+# 非同步的日誌管線：所有執行緒只把紀錄放入佇列 (QueueHandler)，由一條監聽執行緒 (QueueListener)
+# 寫入依大小輪替的日誌檔與主控台，檔案 I/O 不會拖慢頁面處理或 SSE 回應。
+#
+# 熱迴圈 (逐頁、逐段落、逐張投影片、逐個請求) 中的日誌：
+#   - 使用 % 參數而非 f-string，例如 logging.debug("處理段落 %d", index)，等級未啟用時不會格式化字串；
+#   - 進度型的訊息以 sampled_level() 取樣，只有第一筆與每 LOG_SAMPLE_EVERY 筆記為 INFO，其餘為 DEBUG。
+
+import sys
+import queue
+import atexit
+import logging
+import logging.handlers
+
+LOG_FORMAT = '%(asctime)s [%(levelname)s] %(threadName)s: %(message)s'
+# 日誌檔超過此大小時輪替，保留 LOG_BACKUP_COUNT 個舊檔 (ai_toolkit.log.1 ...)
+LOG_MAX_BYTES = 5 * 1024 * 1024
+LOG_BACKUP_COUNT = 5
+# 進度型日誌每幾筆記錄一次 INFO
+LOG_SAMPLE_EVERY = 10
+
+_listener = None
+
+
+def setup_logging(log_file: str | None = None, level=logging.INFO, stream=sys.stdout,
+                  max_bytes: int = LOG_MAX_BYTES, backup_count: int = LOG_BACKUP_COUNT):
+    """
+    以佇列取代 root logger 原有的 handler：log_file (依大小輪替) 與 stream (None 表示不輸出到主控台)
+    由背景的監聽執行緒寫入。可重複呼叫，先前的監聽執行緒會寫完剩餘紀錄後停止。
+    """
+    global _listener
+    formatter = logging.Formatter(LOG_FORMAT)
+    handlers = []
+    if log_file:
+        handlers.append(logging.handlers.RotatingFileHandler(log_file, maxBytes=max_bytes, backupCount=backup_count,
+                                                             encoding='utf-8', delay=True))
+    if stream is not None:
+        handlers.append(logging.StreamHandler(stream))
+    for handler in handlers:
+        handler.setFormatter(formatter)
+
+    stop_logging()
+    log_queue = queue.SimpleQueue()
+    root = logging.getLogger()
+    for handler in list(root.handlers):
+        root.removeHandler(handler)
+    root.addHandler(logging.handlers.QueueHandler(log_queue))
+    root.setLevel(level)
+    _listener = logging.handlers.QueueListener(log_queue, *handlers, respect_handler_level=True)
+    _listener.start()
+    return _listener
+
+
+def stop_logging():
+    """寫完佇列中的紀錄並停止監聽執行緒 (行程結束時自動呼叫)。"""
+    global _listener
+    listener, _listener = _listener, None
+    if listener is not None:
+        listener.stop()
+        for handler in listener.handlers:
+            handler.close()
+
+
+def sampled_level(count: int, every: int = LOG_SAMPLE_EVERY) -> int:
+    """第 count 筆 (從 1 開始) 進度型日誌的等級：第一筆與每 every 筆為 INFO，其餘為 DEBUG。"""
+    return logging.INFO if count == 1 or count % every == 0 else logging.DEBUG
+
+
+atexit.register(stop_logging)
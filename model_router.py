@@ -0,0 +1,252 @@
+# model_router.py
+# 依輸入大小、頁面複雜度與各模型觀測到的延遲 / 錯誤率，為每個請求在 MODEL_TIERS 分級間選擇模型。
+# 主要分級的模型過慢或過載時改用備援分級，路由結果記錄在任務統計中。
+
+import time
+import logging
+import threading
+from collections import deque
+from dataclasses import dataclass
+
+from lazy_imports import LazyModule
+from ai_config import MODEL_TIERS, MODEL_TIER_FALLBACK, MODEL_TIER_LATENCY_BUDGET
+from key_pool import PooledModel, get_key_pool
+from task_metrics import current_task_metrics
+
+api_exceptions = LazyModule("google.api_core.exceptions")
+
+# 設為 False 時一律使用工作流程指定的模型 (仍會記錄延遲與錯誤率)
+MODEL_ROUTING_ENABLED = True
+# 文字層字元數達此值、且圖片覆蓋率低於 PAGE_TEXT_RICH_MAX_IMAGE_COVERAGE 的頁面交給 fast 分級
+PAGE_TEXT_RICH_CHARS = 300
+PAGE_TEXT_RICH_MAX_IMAGE_COVERAGE = 0.3
+# 圖片數達此值 (圖表密集) 的頁面交給 pro 分級
+PAGE_COMPLEX_IMAGE_COUNT = 4
+# 純文字請求 (摘要、翻譯) 的輸入不超過此字元數時交給 fast 分級，否則使用 standard 分級
+TEXT_FAST_MAX_CHARS = 60000
+# 延遲以指數移動平均估計；錯誤率以最近 ERROR_WINDOW 次請求計算
+LATENCY_EWMA_ALPHA = 0.2
+ERROR_WINDOW = 20
+ERROR_RATE_THRESHOLD = 0.3
+MIN_SAMPLES = 5
+
+
+@dataclass
+class PageFeatures:
+    """由 PDF 頁面本身 (不呼叫 AI) 取得的便宜特徵。"""
+    text_chars: int
+    image_count: int
+    image_coverage: float   # 圖片覆蓋頁面面積的比例 (0 ~ 1)
+
+
+def analyze_pdf_page(page) -> PageFeatures:
+    text_chars = len(page.get_text("text").strip())
+    images = page.get_image_info()
+    px0, py0, px1, py1 = page.rect
+    page_area = max((px1 - px0) * (py1 - py0), 1)
+    covered = 0.0
+    for image in images:
+        x0, y0, x1, y1 = image['bbox']
+        covered += max(0, min(x1, px1) - max(x0, px0)) * max(0, min(y1, py1) - max(y0, py0))
+    return PageFeatures(text_chars, len(images), min(1.0, covered / page_area))
+
+
+def merge_page_features(features: list[PageFeatures]) -> PageFeatures:
+    """多頁放在同一個請求時，以最困難的情況 (最少文字、最多圖片) 作為路由依據。"""
+    return PageFeatures(
+        text_chars=min(f.text_chars for f in features),
+        image_count=max(f.image_count for f in features),
+        image_coverage=max(f.image_coverage for f in features),
+    )
+
+
+class ModelStats:
+    """單一模型在本行程中觀測到的延遲與錯誤率 (所有任務共用)。"""
+
+    def __init__(self, model_name: str):
+        self.model_name = model_name
+        self.latency_ewma = None
+        self.requests = 0
+        self._outcomes = deque(maxlen=ERROR_WINDOW)
+        self._lock = threading.Lock()
+
+    def record(self, latency: float, ok: bool):
+        with self._lock:
+            self.requests += 1
+            self._outcomes.append(ok)
+            if ok:
+                self.latency_ewma = latency if self.latency_ewma is None else (
+                    LATENCY_EWMA_ALPHA * latency + (1 - LATENCY_EWMA_ALPHA) * self.latency_ewma)
+
+    @property
+    def error_rate(self) -> float:
+        with self._lock:
+            return self._outcomes.count(False) / len(self._outcomes) if self._outcomes else 0.0
+
+    def degraded_reason(self, latency_budget: float | None) -> str | None:
+        """模型目前過慢或錯誤率過高時返回原因，否則返回 None。"""
+        if self.requests < MIN_SAMPLES:
+            return None
+        if self.error_rate >= ERROR_RATE_THRESHOLD:
+            return f"錯誤率 {self.error_rate:.0%}"
+        if latency_budget and self.latency_ewma is not None and self.latency_ewma > latency_budget:
+            return f"平均延遲 {self.latency_ewma:.1f} 秒"
+        return None
+
+    def to_dict(self) -> dict:
+        return {
+            'model': self.model_name,
+            'requests': self.requests,
+            'latency_ewma': round(self.latency_ewma, 2) if self.latency_ewma is not None else None,
+            'error_rate': round(self.error_rate, 3),
+        }
+
+
+_stats = {}
+_stats_lock = threading.Lock()
+
+
+def get_model_stats(model_name: str) -> ModelStats:
+    with _stats_lock:
+        stats = _stats.get(model_name)
+        if stats is None:
+            stats = _stats[model_name] = ModelStats(model_name)
+        return stats
+
+
+def model_stats_snapshot() -> list[dict]:
+    with _stats_lock:
+        return [stats.to_dict() for stats in _stats.values()]
+
+
+def is_overload_error(error: Exception) -> bool:
+    """模型端過載或逾時等值得改用備援模型重試的錯誤。"""
+    return isinstance(error, (api_exceptions.ServiceUnavailable, api_exceptions.DeadlineExceeded,
+                              api_exceptions.InternalServerError, api_exceptions.ResourceExhausted))
+
+
+def choose_tier(default_tier: str, page: PageFeatures | None = None, input_chars: int | None = None) -> tuple[str, str]:
+    """依請求特徵選擇分級，返回 (分級, 原因)。"""
+    if page is not None:
+        if page.image_count >= PAGE_COMPLEX_IMAGE_COUNT:
+            return "pro", "圖片密集頁面"
+        if page.text_chars >= PAGE_TEXT_RICH_CHARS and page.image_coverage < PAGE_TEXT_RICH_MAX_IMAGE_COVERAGE:
+            return "fast", "文字層完整"
+        return "standard", "掃描或圖文混合頁面"
+    if input_chars is not None:
+        if input_chars <= TEXT_FAST_MAX_CHARS:
+            return "fast", "短文字"
+        return "standard", "長文字"
+    return default_tier, "預設"
+
+
+class RoutedModel:
+    """
+    可取代 genai.GenerativeModel 的模型包裝：generate_content 可額外接收路由提示
+    (page=PageFeatures、input_chars=字元數，或直接指定 tier=分級)，
+    依提示與各模型目前的狀態選擇分級後，經由金鑰池送出請求。cached_prefix 會原樣轉交給 PooledModel。
+    generate_content_async 為同樣行為的非同步版本。
+    指定的模型不在 MODEL_TIERS 中時不做路由，只記錄延遲與錯誤率。
+    """
+
+    def __init__(self, model_name: str, api_key: str | None = None, **model_kwargs):
+        self.model_name = model_name
+        self.pool = get_key_pool(api_key)
+        self.default_tier = next((tier for tier, name in MODEL_TIERS.items() if name == model_name), None)
+        self.routing_enabled = MODEL_ROUTING_ENABLED and self.default_tier is not None
+        # 請求可能在工作執行緒中送出，任務統計需在建立模型的任務執行緒中取得
+        self.metrics = current_task_metrics()
+        self._model_kwargs = model_kwargs
+        self._models = {}
+        self._lock = threading.Lock()
+
+    def _pooled(self, model_name: str) -> PooledModel:
+        with self._lock:
+            model = self._models.get(model_name)
+            if model is None:
+                model = self._models[model_name] = PooledModel(model_name, self.pool, self.metrics, **self._model_kwargs)
+            return model
+
+    def route(self, page: PageFeatures | None = None, input_chars: int | None = None, tier: str | None = None) -> tuple[str, str, str]:
+        """返回 (分級, 模型名稱, 原因)。"""
+        if not self.routing_enabled:
+            return self.default_tier or "custom", self.model_name, "未啟用路由"
+        if tier is not None:
+            reason = "指定分級"
+        else:
+            tier, reason = choose_tier(self.default_tier, page, input_chars)
+        degraded = get_model_stats(MODEL_TIERS[tier]).degraded_reason(MODEL_TIER_LATENCY_BUDGET.get(tier))
+        fallback = MODEL_TIER_FALLBACK.get(tier)
+        if degraded and fallback:
+            fallback_degraded = get_model_stats(MODEL_TIERS[fallback]).degraded_reason(MODEL_TIER_LATENCY_BUDGET.get(fallback))
+            if not fallback_degraded:
+                self._record_fallback(tier, fallback, degraded)
+                return fallback, MODEL_TIERS[fallback], f"{reason}；{MODEL_TIERS[tier]} {degraded}，改用備援"
+        return tier, MODEL_TIERS[tier], reason
+
+    def _record_fallback(self, from_tier: str, to_tier: str, reason: str):
+        logging.warning("[ModelRouter] %s %s，改用 %s。", MODEL_TIERS[from_tier], reason, MODEL_TIERS[to_tier])
+        if self.metrics is not None:
+            self.metrics.increment('model_fallbacks', f"{from_tier}->{to_tier}")
+
+    def _call(self, model_name: str, args, kwargs):
+        stats = get_model_stats(model_name)
+        start = time.monotonic()
+        try:
+            response = self._pooled(model_name).generate_content(*args, **kwargs)
+        except Exception:
+            stats.record(time.monotonic() - start, ok=False)
+            raise
+        stats.record(time.monotonic() - start, ok=True)
+        return response
+
+    async def _call_async(self, model_name: str, args, kwargs):
+        stats = get_model_stats(model_name)
+        start = time.monotonic()
+        try:
+            response = await self._pooled(model_name).generate_content_async(*args, **kwargs)
+        except Exception:
+            stats.record(time.monotonic() - start, ok=False)
+            raise
+        stats.record(time.monotonic() - start, ok=True)
+        return response
+
+    def _begin(self, page, input_chars, tier) -> tuple[str, str]:
+        tier, model_name, reason = self.route(page, input_chars, tier)
+        logging.debug("[ModelRouter] %s -> %s (%s)", tier, model_name, reason)
+        if self.metrics is not None:
+            self.metrics.increment('model_routes', model_name)
+        return tier, model_name
+
+    def _fallback_for(self, tier: str, error: Exception) -> str | None:
+        """請求因過載失敗且該分級有備援時，記錄並返回備援模型名稱；否則返回 None。"""
+        fallback = MODEL_TIER_FALLBACK.get(tier) if self.routing_enabled else None
+        if not fallback or not is_overload_error(error):
+            return None
+        self._record_fallback(tier, fallback, f"請求失敗 ({type(error).__name__})")
+        if self.metrics is not None:
+            self.metrics.increment('model_routes', MODEL_TIERS[fallback])
+        return MODEL_TIERS[fallback]
+
+    def generate_content(self, *args, page: PageFeatures | None = None, input_chars: int | None = None,
+                         tier: str | None = None, **kwargs):
+        tier, model_name = self._begin(page, input_chars, tier)
+        try:
+            return self._call(model_name, args, kwargs)
+        except Exception as e:
+            fallback_model = self._fallback_for(tier, e)
+            if fallback_model is None:
+                raise
+            return self._call(fallback_model, args, kwargs)
+
+    async def generate_content_async(self, *args, page: PageFeatures | None = None, input_chars: int | None = None,
+                                     tier: str | None = None, **kwargs):
+        """generate_content 的非同步版本 (見 async_engine)。"""
+        tier, model_name = self._begin(page, input_chars, tier)
+        try:
+            return await self._call_async(model_name, args, kwargs)
+        except Exception as e:
+            fallback_model = self._fallback_for(tier, e)
+            if fallback_model is None:
+                raise
+            return await self._call_async(fallback_model, args, kwargs)
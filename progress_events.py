@@ -0,0 +1,176 @@
+# progress_events.py
+
+import json
+import time
+import threading
+from dataclasses import dataclass, field, asdict
+
+# 高頻率的 progress 事件最短發送間隔 (秒)；首頁與最後一頁一律發送
+PROGRESS_MIN_INTERVAL = 0.25
+
+
+@dataclass
+class ProgressEvent:
+    """所有進度事件的基底類別。只在 SSE 邊界呼叫 to_json() 時序列化一次。"""
+    type: str = field(init=False, default='')
+    _json: str | None = field(init=False, default=None, repr=False, compare=False)
+
+    def to_dict(self) -> dict:
+        data = {k: v for k, v in asdict(self).items() if not k.startswith('_') and v is not None}
+        return data
+
+    def to_json(self) -> str:
+        if self._json is None:
+            self._json = json.dumps(self.to_dict(), ensure_ascii=False)
+        return self._json
+
+
+@dataclass
+class StatusEvent(ProgressEvent):
+    status: str = ''
+    step: int | None = None
+    percent: int | None = None
+
+    def __post_init__(self):
+        self.type = 'status'
+
+
+@dataclass
+class PageProgressEvent(ProgressEvent):
+    current: int = 0
+    total: int = 0
+    status: str = ''
+
+    def __post_init__(self):
+        self.type = 'progress'
+
+
+@dataclass
+class CompleteEvent(ProgressEvent):
+    message: str = ''
+    folder_path: str | None = None
+
+    def __post_init__(self):
+        self.type = 'complete'
+
+
+@dataclass
+class ErrorEvent(ProgressEvent):
+    message: str = ''
+
+    def __post_init__(self):
+        self.type = 'error'
+
+
+@dataclass
+class DoneEvent(ProgressEvent):
+    def __post_init__(self):
+        self.type = 'done'
+
+
+@dataclass
+class LaneEvent(ProgressEvent):
+    """
+    任務中一條並行子流程 (例如一個章節) 的進度。lane 為子流程的編號，label 為顯示名稱；
+    state 為 'running' / 'complete' / 'error'。子流程結束不代表任務結束，因此不是終止事件。
+    """
+    lane: int = 0
+    label: str = ''
+    status: str = ''
+    current: int | None = None
+    total: int | None = None
+    state: str = 'running'
+
+    def __post_init__(self):
+        self.type = 'lane'
+
+
+class ProgressEmitter:
+    """
+    工作流程回報進度的共用介面。
+    sink 為任何具備 put(event) 的物件 (例如 EventHub 的 TaskChannel)；sink 為 None 時所有呼叫皆為 no-op。
+    """
+
+    def __init__(self, sink=None, min_interval: float = PROGRESS_MIN_INTERVAL):
+        self.sink = sink
+        self.min_interval = min_interval
+        self._last_progress_at = 0.0
+        self._lock = threading.Lock()
+
+    def __bool__(self):
+        return self.sink is not None
+
+    def emit(self, event: ProgressEvent):
+        if self.sink is not None:
+            self.sink.put(event)
+
+    def status(self, status: str, step: int | None = None, percent: int | None = None):
+        self.emit(StatusEvent(status=status, step=step, percent=percent))
+
+    def progress(self, current: int, total: int, status: str = ''):
+        """依時間節流的逐頁進度；第一筆與最後一筆不受節流影響。"""
+        if self.sink is None:
+            return
+        now = time.monotonic()
+        with self._lock:
+            if 0 < current < total and now - self._last_progress_at < self.min_interval:
+                return
+            self._last_progress_at = now
+        self.emit(PageProgressEvent(current=current, total=total, status=status))
+
+    def complete(self, message: str, folder_path: str | None = None):
+        self.emit(CompleteEvent(message=message, folder_path=folder_path))
+
+    def error(self, message: str):
+        self.emit(ErrorEvent(message=message))
+
+    def done(self):
+        self.emit(DoneEvent())
+
+    def lane(self, lane: int, label: str) -> 'LaneEmitter':
+        """建立一條子流程的 emitter (見 LaneEmitter)，與本 emitter 共用同一個 sink。"""
+        return LaneEmitter(self.sink, lane, label, self.min_interval)
+
+
+class LaneEmitter(ProgressEmitter):
+    """
+    並行子流程 (例如章節) 的 emitter：所有呼叫都轉為該子流程的 LaneEvent，
+    子流程中的 error / complete 只結束這條子流程，done 為 no-op，任務的最終結果仍由工作流程回報。
+    """
+
+    def __init__(self, sink, lane: int, label: str, min_interval: float = PROGRESS_MIN_INTERVAL):
+        super().__init__(sink, min_interval)
+        self.lane_id = lane
+        self.label = label
+
+    def _lane_event(self, status: str, state: str = 'running', current=None, total=None) -> LaneEvent:
+        return LaneEvent(lane=self.lane_id, label=self.label, status=status, current=current, total=total, state=state)
+
+    def status(self, status: str, step: int | None = None, percent: int | None = None):
+        self.emit(self._lane_event(status))
+
+    def progress(self, current: int, total: int, status: str = ''):
+        if self.sink is None:
+            return
+        now = time.monotonic()
+        with self._lock:
+            if 0 < current < total and now - self._last_progress_at < self.min_interval:
+                return
+            self._last_progress_at = now
+        self.emit(self._lane_event(status, current=current, total=total))
+
+    def complete(self, message: str, folder_path: str | None = None):
+        self.emit(self._lane_event(message, state='complete'))
+
+    def error(self, message: str):
+        self.emit(self._lane_event(message, state='error'))
+
+    def done(self):
+        pass
+
+
+def as_emitter(progress) -> ProgressEmitter:
+    """將 None、任意 sink 或既有的 ProgressEmitter 統一轉為 ProgressEmitter。"""
+    if isinstance(progress, ProgressEmitter):
+        return progress
+    return ProgressEmitter(progress)
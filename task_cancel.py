@@ -0,0 +1,80 @@
+# task_cancel.py
+# 任務取消：每個任務有一個 CancelToken，由 run_task 綁定到執行任務的執行緒。
+# 工作流程在頁面 / 分段之間呼叫 check_cancelled()；async_engine 在權杖被取消時
+# 直接取消進行中的協程，正在等待回應的模型請求也會被中止。
+
+import logging
+import threading
+
+_current = threading.local()
+
+
+class TaskCancelled(BaseException):
+    """
+    任務已被取消。繼承 BaseException (與 asyncio.CancelledError 相同)，
+    讓工作流程中大量的 `except Exception` 不會把取消當成一般錯誤吞掉或改寫訊息，
+    finally 中的清理仍會照常執行。
+    """
+
+
+class CancelToken:
+    """可從任何執行緒取消的權杖；取消時依序呼叫已註冊的回呼 (例如中止進行中的請求)。"""
+
+    def __init__(self):
+        self.reason = None
+        self._event = threading.Event()
+        self._callbacks = []
+        self._lock = threading.Lock()
+
+    @property
+    def cancelled(self) -> bool:
+        return self._event.is_set()
+
+    def cancel(self, reason: str = "任務已取消") -> bool:
+        """取消權杖；已取消過時返回 False。"""
+        with self._lock:
+            if self._event.is_set():
+                return False
+            self.reason = reason
+            self._event.set()
+            callbacks, self._callbacks = self._callbacks, []
+        for callback in callbacks:
+            try:
+                callback()
+            except Exception as e:
+                logging.warning(f"[TaskCancel] 取消回呼執行失敗: {e}")
+        return True
+
+    def add_callback(self, callback):
+        """註冊取消時的回呼，返回取消註冊的函式。權杖已取消時立即呼叫。"""
+        with self._lock:
+            if not self._event.is_set():
+                self._callbacks.append(callback)
+                return lambda: self._remove_callback(callback)
+        callback()
+        return lambda: None
+
+    def _remove_callback(self, callback):
+        with self._lock:
+            if callback in self._callbacks:
+                self._callbacks.remove(callback)
+
+    def check(self):
+        if self._event.is_set():
+            raise TaskCancelled(self.reason)
+
+
+def bind_cancel_token(token: CancelToken | None):
+    """將權杖綁定到目前的執行緒 (由 run_task 呼叫)。"""
+    _current.token = token
+
+
+def current_cancel_token() -> CancelToken | None:
+    return getattr(_current, 'token', None)
+
+
+def check_cancelled():
+    """目前執行緒的任務已被取消時拋出 TaskCancelled。"""
+    token = current_cancel_token()
+    if token is not None:
+        token.check()
@@ -0,0 +1,110 @@
+# task_metrics.py
+
+import os
+import sys
+import time
+import logging
+import threading
+
+from usage_store import record_task
+
+try:
+    import psutil  # 選用相依套件；沒有安裝時改讀 /proc 或 getrusage
+except ImportError:
+    psutil = None
+
+_current = threading.local()
+
+
+def get_rss_bytes() -> int:
+    """目前行程的常駐記憶體 (RSS)，無法取得時返回 0。"""
+    if psutil is not None:
+        return psutil.Process().memory_info().rss
+    try:
+        with open('/proc/self/statm', 'r') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, IndexError, AttributeError):
+        pass
+    try:
+        import resource
+        # getrusage 只提供峰值；macOS 的單位是 bytes，Linux 是 KB
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak if sys.platform == 'darwin' else peak * 1024
+    except (ImportError, OSError):
+        return 0
+
+
+class TaskMetrics:
+    """單一任務的資源與執行統計。RSS 為整個行程的數值，多個任務並行時會互相影響。"""
+
+    def __init__(self, task_id: str, task_type: str, document: str | None = None):
+        self.task_id = task_id
+        self.task_type = task_type
+        self.document = document
+        self.started_at = time.monotonic()
+        self.finished_at = None
+        self.rss_start = get_rss_bytes()
+        self.rss_peak = self.rss_start
+        self.rss_end = None
+        self.extra = {}
+        self._lock = threading.Lock()
+
+    def sample_rss(self) -> int:
+        rss = get_rss_bytes()
+        with self._lock:
+            if rss > self.rss_peak:
+                self.rss_peak = rss
+        return rss
+
+    def increment(self, section: str, key: str, amount: int = 1):
+        """在 extra[section] 中累加計數 (例如各模型的請求數)；可由工作執行緒呼叫。"""
+        with self._lock:
+            counts = self.extra.setdefault(section, {})
+            counts[key] = counts.get(key, 0) + amount
+
+    def finish(self):
+        self.rss_end = self.sample_rss()
+        self.finished_at = time.monotonic()
+
+    @property
+    def elapsed(self) -> float:
+        return (self.finished_at or time.monotonic()) - self.started_at
+
+    def to_dict(self) -> dict:
+        mb = 1024 * 1024
+        return {
+            'task_id': self.task_id,
+            'task_type': self.task_type,
+            'elapsed_seconds': round(self.elapsed, 2),
+            'rss_start_mb': round(self.rss_start / mb, 1),
+            'rss_peak_mb': round(self.rss_peak / mb, 1),
+            'rss_end_mb': round((self.rss_end or 0) / mb, 1),
+            **self.extra,
+        }
+
+
+def begin_task(task_id: str, task_type: str, document: str | None = None) -> TaskMetrics:
+    """建立任務統計並設為目前執行緒的當前任務。document 為輸入檔案名稱 (用於用量統計)。"""
+    metrics = TaskMetrics(task_id, task_type, document)
+    _current.metrics = metrics
+    return metrics
+
+
+def end_task(metrics: TaskMetrics):
+    metrics.finish()
+    if getattr(_current, 'metrics', None) is metrics:
+        _current.metrics = None
+    record_task(metrics)
+    summary = metrics.to_dict()
+    logging.info(f"[任務統計 {metrics.task_id}] 耗時 {summary['elapsed_seconds']} 秒，"
+                 f"RSS 開始 {summary['rss_start_mb']} MB / 峰值 {summary['rss_peak_mb']} MB / 結束 {summary['rss_end_mb']} MB")
+
+
+def bind_task_metrics(metrics: TaskMetrics | None):
+    """將任務統計綁定到目前執行緒 (供任務自行建立的工作執行緒使用，模型請求與略過頁數才會計入該任務)。"""
+    _current.metrics = metrics
+
+
+def current_task_metrics() -> TaskMetrics | None:
+    """目前執行緒正在處理的任務統計；不在任務中時返回 None。"""
+    return getattr(_current, 'metrics', None)
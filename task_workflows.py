@@ -0,0 +1,484 @@
+# task_workflows.py
+# 各任務類型的工作流程。與 Flask / pywebview 無關，桌面應用程式與無介面的命令列模式共用。
+
+import os
+import shutil
+import logging
+
+# --- 延遲載入：SDK、文件處理函式庫與工作流程模組在第一次使用時才 import ---
+from lazy_imports import LazyModule, lazy_function
+
+from ai_config import MODEL_CONFIG
+from task_metrics import begin_task, end_task
+from task_cancel import bind_cancel_token, check_cancelled
+from model_router import RoutedModel
+from desktop_utils import copy_to_desktop_folder, copy_to_desktop_folder_async, wait_for_exports
+run_ocr_translation = lazy_function("workflow_scripts.pdf_ocr_translator", "run_ocr_translation")
+run_ocr_only = lazy_function("workflow_scripts.pdf_ocr_translator", "run_ocr_only")
+run_ocr_translation_for_images = lazy_function("workflow_scripts.pdf_ocr_translator", "run_ocr_translation_for_images")
+collect_image_paths = lazy_function("workflow_scripts.image_pages", "collect_image_paths")
+parse_page_ranges = lazy_function("workflow_scripts.page_selection", "parse_page_ranges")
+run_summarization = lazy_function("workflow_scripts.text_summarizer", "run_summarization")
+iter_text_from_file = lazy_function("workflow_scripts.text_reader", "iter_text_from_file")
+run_pdf_split = lazy_function("workflow_scripts.pdf_splitter", "run_pdf_split")
+run_chapter_summary = lazy_function("workflow_scripts.chapter_summarizer", "run_chapter_summary")
+output_writers = LazyModule("workflow_scripts.output_writers")
+parse_output_formats = lazy_function("workflow_scripts.output_writers", "parse_output_formats")
+
+ALLOWED_EXTENSIONS_PDF = {'pdf'}
+OCR_IMAGE_EXTENSIONS = {'png', 'jpg', 'jpeg', 'bmp', 'gif', 'webp'}
+ALLOWED_EXTENSIONS_OCR = {'pdf', 'zip'} | OCR_IMAGE_EXTENSIONS
+ALLOWED_EXTENSIONS_FULL_REPORT = {'pdf'}
+# +++ 新增：允許的文字檔案類型 +++
+ALLOWED_EXTENSIONS_TEXT = {'docx', 'txt'}
+
+# 任務類型 -> 允許的副檔名
+ALLOWED_EXTENSIONS_BY_TASK = {
+    'pdf_to_ppt': ALLOWED_EXTENSIONS_PDF,
+    'full_report': ALLOWED_EXTENSIONS_FULL_REPORT,
+    'ocr': ALLOWED_EXTENSIONS_OCR,
+    'summarize': ALLOWED_EXTENSIONS_PDF,
+    'file_split': ALLOWED_EXTENSIONS_PDF,
+    'text_to_ppt': ALLOWED_EXTENSIONS_TEXT,
+    'chapter_summary': ALLOWED_EXTENSIONS_PDF,
+}
+
+# ==============================================================================
+#                                輔助函式
+# ==============================================================================
+def read_text_from_file(filepath):
+    """讀取 .docx / .txt 的完整文字 (逐塊讀取後合併；可串流處理時請直接使用 iter_text_from_file)。"""
+    logging.info(f"嘗試讀取檔案: {filepath}")
+    try:
+        text = "".join(iter_text_from_file(filepath))
+        logging.info(f"成功讀取檔案: {os.path.basename(filepath)} (文字長度: {len(text)})")
+        return text
+    except Exception as e:
+        logging.error(f"讀取檔案失敗 ({filepath}): {e}", exc_info=True)
+        raise
+
+def page_selection_options(task_info) -> dict:
+    """
+    PDF 頁面選取設定：task_info 的 'page_range' (例如 "1-5, 8"，空白為全部頁面)
+    與 'auto_skip' (是否略過空白頁、重複頁與參考文獻，預設為 True)。
+    """
+    return {'page_range': task_info.get('page_range') or None, 'auto_skip': task_info.get('auto_skip', True)}
+
+def extra_output_formats(task_info) -> list[str]:
+    """
+    task_info 的 'output_formats' (例如 ['md', 'json'] 或 "md,json") 中，除了 Word 之外要同時輸出的格式。
+    簡報只由簡報步驟產生，因此也不包含 pptx。
+    """
+    return [name for name in parse_output_formats(task_info.get('output_formats') or ()) if name not in ('docx', 'pptx')]
+
+def export_extra_outputs(word_path, formats, subfolder, desired_stem) -> list:
+    """將與 word_path 同名、其他格式的輸出在背景複製到桌面資料夾，返回 Future 列表。"""
+    base = os.path.splitext(word_path)[0]
+    return [copy_to_desktop_folder_async(f"{base}.{name}", subfolder, f"{desired_stem}.{name}") for name in formats]
+
+def write_presentation(result, ppt_path) -> bool:
+    """直接由摘要內容 (DocumentResult) 產生簡報，不需讀回摘要的 Word 檔。"""
+    try:
+        output_writers.write_outputs(result, os.path.splitext(ppt_path)[0], ['pptx'])
+        return True
+    except Exception as e:
+        logging.error(f"產生簡報失敗: {e}", exc_info=True)
+        return False
+
+# ==============================================================================
+#                                工作流程函式
+# ==============================================================================
+
+# +++ 新增：處理文字檔到簡報的工作流程 +++
+def run_text_to_ppt_workflow(progress, task_id, api_key, task_info):
+    """從文字檔 (docx, txt) 開始，執行 摘要 -> 簡報 的流程。"""
+    logging.info(f"[工作流程 {task_id} - 文字檔->PPT] 開始...")
+    original_fn = task_info['original_base_filename_preserved']
+    uploaded_file = task_info['uploaded_file_path']
+    task_folder = task_info['task_output_folder']
+    
+    summary_subfolder = "sum"
+    ppt_subfolder = "ppt"
+    
+    summary_word_path = os.path.join(task_folder, "summary.docx")
+    temp_ppt_path = os.path.join(task_folder, "ppt.pptx")
+    extra_formats = extra_output_formats(task_info)
+    
+    overall_success = False
+    pending_exports = []  # 中間產物在背景輸出，不阻塞下一個步驟
+    output_path = None
+    
+    try:
+        # 步驟 1: 讀取檔案內容 (逐塊讀取，第一段湊滿時摘要就開始，不等整份檔案讀完)
+        progress.status('讀取檔案內容...', step=1, percent=10)
+        document_text = iter_text_from_file(uploaded_file)
+
+        # 步驟 2: 生成摘要
+        check_cancelled()
+        progress.status('生成摘要...', step=2, percent=25)
+        summary = run_summarization(api_key, MODEL_CONFIG['SUMMARIZE'], document_text, summary_word_path, progress, extra_formats)
+        if not summary:
+            raise Exception("步驟 2 (生成摘要) 失敗")
+        pending_exports.append(copy_to_desktop_folder_async(summary_word_path, summary_subfolder, f"sum_{original_fn}.docx"))
+        pending_exports += export_extra_outputs(summary_word_path, extra_formats, summary_subfolder, f"sum_{original_fn}")
+
+        # 步驟 3: 生成簡報
+        check_cancelled()
+        progress.status('生成簡報...', step=3, percent=80)
+        if not write_presentation(summary, temp_ppt_path):
+            raise Exception("步驟 3 (轉換為簡報) 失敗")
+
+        final_path, final_ppt_name = copy_to_desktop_folder(temp_ppt_path, ppt_subfolder, f"ppt_{original_fn}.pptx")
+        if not final_path:
+            raise Exception("儲存最終簡報到桌面失敗")
+        
+        output_path = os.path.dirname(os.path.dirname(final_path))
+        wait_for_exports(pending_exports)
+        progress.complete(f'簡報 "{final_ppt_name}" 及摘要檔案已分類儲存。', folder_path=output_path)
+        overall_success = True
+
+    except Exception as e:
+        logging.error(f"[工作流程 {task_id} - 文字檔->PPT] 失敗: {e}", exc_info=True)
+        progress.error(f'處理失敗: {e}')
+    finally:
+        wait_for_exports(pending_exports)
+        if os.path.exists(task_folder):
+            shutil.rmtree(task_folder, ignore_errors=True)
+        if not overall_success:
+            progress.done()
+
+
+def run_full_report_workflow(progress, task_id, api_key, task_info):
+    """執行 PDF -> 原文 -> 翻譯 -> 摘要 -> 簡報 的完整流程，並將4個檔案分類儲存。"""
+    logging.info(f"[工作流程 {task_id} - 完整簡報生成] 開始...")
+    original_fn = task_info['original_base_filename_preserved']
+    uploaded_pdf = task_info['uploaded_file_path']
+    task_folder = task_info['task_output_folder']
+    
+    ocr_subfolder = "ocr"
+    trans_subfolder = "trans"
+    summary_subfolder = "sum"
+    ppt_subfolder = "ppt"
+    
+    ocr_path = os.path.join(task_folder, "ocr.docx")
+    trans_path = os.path.join(task_folder, "translated.docx")
+    summary_path = os.path.join(task_folder, "summary.docx")
+    ppt_path = os.path.join(task_folder, "ppt.pptx")
+    extra_formats = extra_output_formats(task_info)
+    
+    overall_success = False
+    pending_exports = []  # 中間產物在背景輸出，不阻塞下一個步驟
+    output_path = None
+    try:
+        # 步驟 1: 純 OCR 掃描原文
+        progress.status('掃描原文 (OCR)...', step=1, percent=5)
+        ocr_result = run_ocr_only(api_key, MODEL_CONFIG['OCR'], uploaded_pdf, ocr_path, progress,
+                                  output_formats=extra_formats, **page_selection_options(task_info))
+        if not ocr_result:
+            raise Exception("步驟 1 (掃描原文) 失敗")
+        pending_exports.append(copy_to_desktop_folder_async(ocr_path, ocr_subfolder, f"ocr_{original_fn}.docx"))
+        pending_exports += export_extra_outputs(ocr_path, extra_formats, ocr_subfolder, f"ocr_{original_fn}")
+        
+        # OCR 結果直接取自記憶體中的內容，不需讀回 Word 檔
+        ocr_text = ocr_result.text
+        if not ocr_text.strip(): raise ValueError("掃描後的原文內容為空")
+
+        # 步驟 2: 翻譯原文
+        check_cancelled()
+        progress.status('翻譯原文...', step=2, percent=30)
+        translation_prompt = f"請將以下全文精確地翻譯成繁體中文，並盡可能保持原有的格式和段落結構。請不要添加任何摘要或評論，只需純粹的翻譯。\n\n---\n{ocr_text}\n---"
+        # 使用成本較低的模型進行純文字翻譯
+        trans_model = RoutedModel(MODEL_CONFIG['OCR'], api_key)
+        response = trans_model.generate_content(translation_prompt, input_chars=len(ocr_text))
+        if not hasattr(response, 'text') or not response.text: 
+            raise Exception("步驟 2 (翻譯) 失敗: AI 未返回有效的翻譯內容。")
+        
+        translated_text = response.text
+        output_writers.write_outputs(output_writers.DocumentResult.from_text(translated_text),
+                                     os.path.splitext(trans_path)[0], ['docx', *extra_formats])
+        pending_exports.append(copy_to_desktop_folder_async(trans_path, trans_subfolder, f"trans_{original_fn}.docx"))
+        pending_exports += export_extra_outputs(trans_path, extra_formats, trans_subfolder, f"trans_{original_fn}")
+
+        # 步驟 3: 生成摘要
+        check_cancelled()
+        progress.status('生成摘要...', step=3, percent=55)
+        summary = run_summarization(api_key, MODEL_CONFIG['SUMMARIZE'], translated_text, summary_path, progress, extra_formats)
+        if not summary:
+            raise Exception("步驟 3 (生成摘要) 失敗")
+        pending_exports.append(copy_to_desktop_folder_async(summary_path, summary_subfolder, f"sum_{original_fn}.docx"))
+        pending_exports += export_extra_outputs(summary_path, extra_formats, summary_subfolder, f"sum_{original_fn}")
+
+        # 步驟 4: 生成簡報
+        check_cancelled()
+        progress.status('生成簡報...', step=4, percent=80)
+        if not write_presentation(summary, ppt_path):
+            raise Exception("步驟 4 (轉換為簡報) 失敗")
+        
+        final_path, _ = copy_to_desktop_folder(ppt_path, ppt_subfolder, f"ppt_{original_fn}.pptx")
+        if not final_path: raise Exception("儲存最終簡報到桌面失敗")
+        
+        output_path = os.path.dirname(os.path.dirname(final_path))
+        wait_for_exports(pending_exports)
+        progress.complete('完整報告處理完成，4類檔案已分類儲存。', folder_path=output_path)
+        overall_success = True
+
+    except Exception as e:
+        logging.error(f"[工作流程 {task_id} - 完整簡報生成] 失敗: {e}", exc_info=True)
+        progress.error(f'處理失敗: {e}')
+    finally:
+        wait_for_exports(pending_exports)
+        if os.path.exists(task_folder): shutil.rmtree(task_folder, ignore_errors=True)
+        if not overall_success: progress.done()
+
+
+def run_full_workflow(progress, task_id, api_key, task_info):
+    logging.info(f"[工作流程 {task_id} - PDF->PPT] 開始...")
+    original_fn = task_info['original_base_filename_preserved']
+    uploaded_pdf = task_info['uploaded_file_path']
+    task_folder = task_info['task_output_folder']
+    
+    trans_subfolder = "trans"
+    summary_subfolder = "sum"
+    ppt_subfolder = "ppt"
+    
+    step1_word_path = os.path.join(task_folder, "translated.docx")
+    summary_word_path = os.path.join(task_folder, "summary.docx")
+    temp_ppt_path = os.path.join(task_folder, "ppt.pptx")
+    extra_formats = extra_output_formats(task_info)
+    overall_success = False
+    pending_exports = []  # 中間產物在背景輸出，不阻塞下一個步驟
+    output_path = None
+    try:
+        progress.status('OCR與翻譯...', step=1, percent=5)
+        step1_result = run_ocr_translation(api_key, MODEL_CONFIG['OCR'], uploaded_pdf, step1_word_path, progress,
+                                           output_formats=extra_formats, **page_selection_options(task_info))
+        if not step1_result:
+            raise Exception("步驟 1 (OCR/翻譯) 失敗")
+        pending_exports.append(copy_to_desktop_folder_async(step1_word_path, trans_subfolder, f"trans_{original_fn}.docx"))
+        pending_exports += export_extra_outputs(step1_word_path, extra_formats, trans_subfolder, f"trans_{original_fn}")
+
+        check_cancelled()
+        progress.status('生成摘要...', step=2, percent=40)
+        step1_text = step1_result.text
+        if not step1_text.strip(): raise ValueError("翻譯檔案內容為空")
+        summary = run_summarization(api_key, MODEL_CONFIG['SUMMARIZE'], step1_text, summary_word_path, progress, extra_formats)
+        if not summary:
+            raise Exception("步驟 2 (生成摘要) 失敗")
+        pending_exports.append(copy_to_desktop_folder_async(summary_word_path, summary_subfolder, f"sum_{original_fn}.docx"))
+        pending_exports += export_extra_outputs(summary_word_path, extra_formats, summary_subfolder, f"sum_{original_fn}")
+        
+        check_cancelled()
+        progress.status('生成簡報...', step=3, percent=80)
+        if not write_presentation(summary, temp_ppt_path):
+            raise Exception("步驟 3 (轉換為簡報) 失敗")
+
+        final_path, final_ppt_name = copy_to_desktop_folder(temp_ppt_path, ppt_subfolder, f"ppt_{original_fn}.pptx")
+        if not final_path: raise Exception("儲存最終簡報到桌面失敗")
+        
+        output_path = os.path.dirname(os.path.dirname(final_path))
+        wait_for_exports(pending_exports)
+        progress.complete(f'快速簡報 "{final_ppt_name}" 及過程檔案已分類儲存。', folder_path=output_path)
+        overall_success = True
+
+    except Exception as e:
+        logging.error(f"[工作流程 {task_id} - PDF->PPT] 失敗: {e}", exc_info=True)
+        progress.error(f'處理失敗: {e}')
+    finally:
+        wait_for_exports(pending_exports)
+        if os.path.exists(task_folder): shutil.rmtree(task_folder, ignore_errors=True)
+        if not overall_success: progress.done()
+
+
+def run_ocr_workflow(progress, task_id, api_key, task_info):
+    logging.info(f"[工作流程 {task_id} - OCR] 開始...")
+    original_fn = task_info['original_base_filename_preserved']
+    uploaded_file = task_info['uploaded_file_path']
+    task_folder = task_info['task_output_folder']
+    temp_docx_path = os.path.join(task_folder, "ocr_result.docx")
+    output_subfolder = "trans"
+    extra_formats = extra_output_formats(task_info)
+    overall_success = False
+    pending_exports = []
+    output_path = None
+    try:
+        progress.status('OCR 與翻譯處理中...', step=1, percent=5)
+        _, ext = os.path.splitext(uploaded_file)
+        if ext.lower() == '.pdf':
+            success = run_ocr_translation(api_key, MODEL_CONFIG['OCR'], uploaded_file, temp_docx_path, progress,
+                                          output_formats=extra_formats, **page_selection_options(task_info))
+        else:
+            # 單張圖片、zip 壓縮檔或一次上傳的多張圖片 (圖片資料夾)，依檔名順序合併為一份文件
+            image_paths = collect_image_paths(uploaded_file, os.path.join(task_folder, "images"))
+            success = run_ocr_translation_for_images(api_key, MODEL_CONFIG['OCR'], image_paths, temp_docx_path, progress,
+                                                     output_formats=extra_formats)
+        if not success: raise Exception("OCR 與翻譯步驟失敗")
+
+        pending_exports += export_extra_outputs(temp_docx_path, extra_formats, output_subfolder, f"trans_{original_fn}")
+        final_path, final_name = copy_to_desktop_folder(temp_docx_path, output_subfolder, f"trans_{original_fn}.docx")
+        if not final_path: raise Exception("儲存檔案到桌面失敗")
+
+        wait_for_exports(pending_exports)
+        output_path = os.path.dirname(os.path.dirname(final_path))
+        progress.complete(f'翻譯檔案 "{final_name}" 已儲存。', folder_path=output_path)
+        overall_success = True
+    except Exception as e:
+        logging.error(f"[工作流程 {task_id} - OCR] 失敗: {e}", exc_info=True)
+        progress.error(f'處理失敗: {e}')
+    finally:
+        wait_for_exports(pending_exports)
+        if os.path.exists(task_folder): shutil.rmtree(task_folder, ignore_errors=True)
+        if not overall_success: progress.done()
+
+
+def run_summarize_workflow(progress, task_id, api_key, task_info):
+    logging.info(f"[工作流程 {task_id} - Summarize] 開始...")
+    original_fn = task_info['original_base_filename_preserved']
+    uploaded_pdf = task_info['uploaded_file_path']
+    task_folder = task_info['task_output_folder']
+    ocr_word_path = os.path.join(task_folder, "ocr_output.docx")
+    temp_summary_path = os.path.join(task_folder, "summary.docx")
+    output_subfolder = "sum"
+    extra_formats = extra_output_formats(task_info)
+    overall_success = False
+    pending_exports = []
+    output_path = None
+    try:
+        ocr_result = run_ocr_translation(api_key, MODEL_CONFIG['OCR'], uploaded_pdf, ocr_word_path, progress, **page_selection_options(task_info))
+        if not ocr_result:
+            raise Exception("步驟 1 (OCR) 失敗")
+        
+        doc_text = ocr_result.text
+        if not doc_text.strip(): raise ValueError("OCR 結果為空")
+        if not run_summarization(api_key, MODEL_CONFIG['SUMMARIZE'], doc_text, temp_summary_path, progress, extra_formats):
+            raise Exception("步驟 2 (摘要) 失敗")
+        
+        pending_exports += export_extra_outputs(temp_summary_path, extra_formats, output_subfolder, f"sum_{original_fn}")
+        final_path, final_name = copy_to_desktop_folder(temp_summary_path, output_subfolder, f"sum_{original_fn}.docx")
+        if not final_path: raise Exception("儲存檔案到桌面失敗")
+        wait_for_exports(pending_exports)
+
+        output_path = os.path.dirname(os.path.dirname(final_path))
+        progress.complete(f'摘要檔案 "{final_name}" 已儲存。', folder_path=output_path)
+        overall_success = True
+    except Exception as e:
+        logging.error(f"[工作流程 {task_id} - Summarize] 失敗: {e}", exc_info=True)
+        progress.error(f'處理失敗: {e}')
+    finally:
+        wait_for_exports(pending_exports)
+        if os.path.exists(task_folder): shutil.rmtree(task_folder, ignore_errors=True)
+        if not overall_success: progress.done()
+
+
+def run_split_workflow(progress, task_id, api_key, task_info):
+    logging.info(f"[工作流程 {task_id} - FileSplit] 開始...")
+    uploaded_pdf = task_info['uploaded_file_path']
+    task_folder = task_info['task_output_folder']
+    output_subfolder = "檔案分割輸出"
+    overall_success = False
+    try:
+        split_count, output_dir = run_pdf_split(
+            api_key=api_key,
+            model_name=MODEL_CONFIG['PDF_SPLIT_ANALYSIS'],
+            input_pdf_path=uploaded_pdf,
+            output_folder_name=output_subfolder,
+            progress=progress
+        )
+        if split_count > 0:
+            progress.complete(f'成功分割成 {split_count} 個檔案。', folder_path=output_dir)
+            overall_success = True
+        elif split_count == 0:
+             raise Exception("AI 未能分析出有效的目錄結構，無法分割。")
+        else:
+            raise Exception("檔案分割過程中發生未知錯誤。")
+    except Exception as e:
+        logging.error(f"[工作流程 {task_id} - FileSplit] 失敗: {e}", exc_info=True)
+        progress.error(f'處理失敗: {e}')
+    finally:
+        if os.path.exists(task_folder): shutil.rmtree(task_folder, ignore_errors=True)
+        if not overall_success: progress.done()
+
+
+def run_chapter_summary_workflow(progress, task_id, api_key, task_info):
+    """依目錄將 PDF 分成章節，各章同時 OCR 與摘要，合併為一份摘要 (每章一個 H1) 與簡報。"""
+    logging.info(f"[工作流程 {task_id} - 章節摘要] 開始...")
+    original_fn = task_info['original_base_filename_preserved']
+    uploaded_pdf = task_info['uploaded_file_path']
+    task_folder = task_info['task_output_folder']
+
+    summary_subfolder = "sum"
+    ppt_subfolder = "ppt"
+
+    summary_path = os.path.join(task_folder, "summary.docx")
+    ppt_path = os.path.join(task_folder, "ppt.pptx")
+    extra_formats = extra_output_formats(task_info)
+
+    overall_success = False
+    pending_exports = []  # 中間產物在背景輸出，不阻塞下一個步驟
+    output_path = None
+    try:
+        # 步驟 1: 分析目錄，各章節同時 OCR 與摘要
+        progress.status('依章節摘要...', step=1, percent=5)
+        summary = run_chapter_summary(api_key, MODEL_CONFIG['PDF_SPLIT_ANALYSIS'], MODEL_CONFIG['OCR'],
+                                      MODEL_CONFIG['SUMMARIZE'], uploaded_pdf, summary_path, progress,
+                                      output_formats=extra_formats, **page_selection_options(task_info))
+        if not summary:
+            raise Exception("步驟 1 (章節摘要) 失敗")
+        pending_exports.append(copy_to_desktop_folder_async(summary_path, summary_subfolder, f"sum_{original_fn}.docx"))
+        pending_exports += export_extra_outputs(summary_path, extra_formats, summary_subfolder, f"sum_{original_fn}")
+
+        # 步驟 2: 生成簡報 (每章一張章節頁)
+        check_cancelled()
+        progress.status('生成簡報...', step=2, percent=90)
+        if not write_presentation(summary, ppt_path):
+            raise Exception("步驟 2 (轉換為簡報) 失敗")
+
+        final_path, final_ppt_name = copy_to_desktop_folder(ppt_path, ppt_subfolder, f"ppt_{original_fn}.pptx")
+        if not final_path: raise Exception("儲存最終簡報到桌面失敗")
+
+        output_path = os.path.dirname(os.path.dirname(final_path))
+        wait_for_exports(pending_exports)
+        progress.complete(f'章節簡報 "{final_ppt_name}" 及摘要檔案已分類儲存。', folder_path=output_path)
+        overall_success = True
+
+    except Exception as e:
+        logging.error(f"[工作流程 {task_id} - 章節摘要] 失敗: {e}", exc_info=True)
+        progress.error(f'處理失敗: {e}')
+    finally:
+        wait_for_exports(pending_exports)
+        if os.path.exists(task_folder): shutil.rmtree(task_folder, ignore_errors=True)
+        if not overall_success: progress.done()
+
+
+# 任務類型 -> 工作流程函式
+WORKFLOWS = {
+    'pdf_to_ppt': run_full_workflow,
+    'full_report': run_full_report_workflow,
+    'ocr': run_ocr_workflow,
+    'summarize': run_summarize_workflow,
+    'file_split': run_split_workflow,
+    'text_to_ppt': run_text_to_ppt_workflow,
+    'chapter_summary': run_chapter_summary_workflow,
+}
+
+def run_task(progress, task_info, api_key) -> dict:
+    """
+    依 task_info['task_type'] 執行對應的工作流程。未知的類型以 error 事件回報。
+    返回任務統計 (耗時、RSS 開始 / 峰值 / 結束等)。任務被取消時拋出 TaskCancelled。
+    """
+    task_id = task_info['task_id']
+    task_type = task_info['task_type']
+    metrics = begin_task(task_id, task_type, task_info.get('original_base_filename_preserved'))
+    # task_info 可帶入 CancelToken；工作流程在頁面 / 分段之間檢查，被取消時拋出 TaskCancelled
+    bind_cancel_token(task_info.get('cancel_token'))
+    try:
+        check_cancelled()
+        workflow = WORKFLOWS.get(task_type)
+        if workflow is None:
+            logging.warning(f"[工作流程] 未知的任務類型: {task_type} (ID: {task_id})")
+            progress.error(f'未知的任務類型: {task_type}')
+        else:
+            workflow(progress, task_id, api_key, task_info)
+    finally:
+        bind_cancel_token(None)
+        end_task(metrics)
+    return metrics.to_dict()
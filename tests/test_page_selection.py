@@ -0,0 +1,100 @@
+# tests/test_page_selection.py
+import io
+
+import fitz  # PyMuPDF
+
+from workflow_scripts.page_selection import find_reference_pages, select_pdf_pages
+
+_BODY = [f"Paragraph {n} of the chapter discusses the method and its results in plain prose." for n in range(12)]
+_CITATIONS = [f"[{n}] Author, A. and Writer, B. ({2000 + n}). Title of paper {n}. Journal 12, pp. {n}-{n + 9}."
+              for n in range(1, 13)]
+
+
+def _make_pdf(pages: list[list[str]]):
+    document = fitz.open()
+    for lines in pages:
+        page = document.new_page()
+        page.insert_text((72, 72), "\n".join(lines), fontsize=10)
+    return document
+
+
+def test_references_in_middle_do_not_swallow_later_chapters():
+    document = _make_pdf([
+        ["Chapter 1 Introduction", *_BODY],
+        ["Chapter 1 continued", *_BODY],
+        ["Chapter 2 Background", *_BODY],
+        ["Chapter 2 continued", *_BODY],
+        ["References", *_CITATIONS],
+        ["Chapter 3 Methods", *_BODY],
+        ["Chapter 3 continued", *_BODY],
+        ["Chapter 4 Results", *_BODY],
+    ])
+    assert find_reference_pages(document, list(range(8))) == {4}
+    selection = select_pdf_pages(document)
+    assert selection.skipped == {4: 'references'}
+    assert selection.indices == [0, 1, 2, 3, 5, 6, 7]
+
+
+def test_trailing_references_are_skipped_until_appendix():
+    document = _make_pdf([
+        ["Chapter 1 Introduction", *_BODY],
+        ["Chapter 1 continued", *_BODY],
+        ["Chapter 2 Results", *_BODY],
+        ["Chapter 2 continued", *_BODY],
+        ["References", *_CITATIONS],
+        _CITATIONS,
+        _CITATIONS[::-1],
+        ["Appendix A", *_BODY],
+    ])
+    assert find_reference_pages(document, list(range(8))) == {4, 5, 6}
+
+
+def test_references_end_at_prose_page_without_heading():
+    document = _make_pdf([
+        ["Chapter 1", *_BODY],
+        ["Chapter 1 continued", *_BODY],
+        ["Chapter 2", *_BODY],
+        ["References", *_CITATIONS],
+        _BODY,
+    ])
+    assert find_reference_pages(document, list(range(5))) == {3}
+
+
+def _make_image_pdf(titles: list[str]):
+    """每頁一張 720x405 的投影片圖片，只有標題文字不同，沒有文字層。"""
+    from PIL import Image, ImageDraw, ImageFont
+    font = ImageFont.load_default(size=28)
+    document = fitz.open()
+    for title in titles:
+        image = Image.new('RGB', (720, 405), 'white')
+        draw = ImageDraw.Draw(image)
+        draw.rectangle((0, 0, 719, 60), fill=(30, 60, 120))
+        draw.text((40, 180), title, fill='black', font=font)
+        stream = io.BytesIO()
+        image.save(stream, format='PNG')
+        page = document.new_page(width=720, height=405)
+        page.insert_image(page.rect, stream=stream.getvalue())
+    return document
+
+
+def test_image_only_pages_differing_in_a_number_are_kept():
+    document = _make_image_pdf(["Section 1", "Results 91.2%", "Results 97.8%", "Section 2", "Section 3"])
+    selection = select_pdf_pages(document)
+    assert selection.skipped == {}
+    assert selection.indices == [0, 1, 2, 3, 4]
+    assert selection.reused == {}
+
+
+def test_identical_image_only_pages_are_still_merged():
+    document = _make_image_pdf(["Agenda", "Agenda", "Results 91.2%", "Agenda"])
+    selection = select_pdf_pages(document)
+    assert selection.skipped == {1: 'duplicate'}
+    assert selection.indices == [0, 2, 3]
+    assert selection.reused == {3: 0}
+
+
+def test_pages_differing_only_in_title_do_not_reuse_results():
+    document = _make_image_pdf(["Section 1", "Results 91.2%", "Section 2"])
+    selection = select_pdf_pages(document)
+    assert selection.reused == {}
+    assert selection.model_indices == [0, 1, 2]
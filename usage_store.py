@@ -0,0 +1,265 @@
+# usage_store.py
+# 模型呼叫的用量紀錄：每次請求的 token 數 (usage_metadata)、延遲、模型、任務類型與重試次數，
+# 以及每個任務的耗時，保存在本機的 SQLite 檔案中，供 /usage 頁面統計吞吐量、各模型延遲與最耗用量的文件。
+# 寫入由背景執行緒批次進行，不會阻塞模型請求。
+
+import math
+import time
+import queue
+import atexit
+import sqlite3
+import logging
+import threading
+from contextlib import closing
+
+# 超過此天數的紀錄在開啟資料庫時刪除
+USAGE_RETENTION_DAYS = 90
+# 「最耗用量的文件」列出的數量
+TOP_DOCUMENTS = 10
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS model_calls (
+    id INTEGER PRIMARY KEY,
+    created_at REAL NOT NULL,
+    task_id TEXT,
+    task_type TEXT,
+    document TEXT,
+    model TEXT NOT NULL,
+    prompt_tokens INTEGER NOT NULL DEFAULT 0,
+    output_tokens INTEGER NOT NULL DEFAULT 0,
+    cached_tokens INTEGER NOT NULL DEFAULT 0,
+    latency REAL NOT NULL DEFAULT 0,
+    retries INTEGER NOT NULL DEFAULT 0,
+    pages INTEGER NOT NULL DEFAULT 0,
+    ok INTEGER NOT NULL DEFAULT 1,
+    error TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_model_calls_created_at ON model_calls (created_at);
+CREATE INDEX IF NOT EXISTS idx_model_calls_task_id ON model_calls (task_id);
+CREATE TABLE IF NOT EXISTS tasks (
+    task_id TEXT PRIMARY KEY,
+    task_type TEXT,
+    document TEXT,
+    started_at REAL NOT NULL,
+    elapsed REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_tasks_started_at ON tasks (started_at);
+"""
+
+_INSERTS = {
+    'model_calls': "INSERT INTO model_calls (created_at, task_id, task_type, document, model, prompt_tokens, output_tokens, "
+                   "cached_tokens, latency, retries, pages, ok, error) "
+                   "VALUES (:created_at, :task_id, :task_type, :document, :model, :prompt_tokens, :output_tokens, "
+                   ":cached_tokens, :latency, :retries, :pages, :ok, :error)",
+    'tasks': "INSERT OR REPLACE INTO tasks (task_id, task_type, document, started_at, elapsed) "
+             "VALUES (:task_id, :task_type, :document, :started_at, :elapsed)",
+}
+
+
+def response_usage(response) -> tuple[int, int, int]:
+    """回應的 (輸入 token 數, 輸出 token 數, 由快取讀取的 token 數)；沒有 usage_metadata 時皆為 0。"""
+    usage = getattr(response, 'usage_metadata', None)
+    if usage is None:
+        return 0, 0, 0
+    return (getattr(usage, 'prompt_token_count', 0) or 0,
+            getattr(usage, 'candidates_token_count', 0) or 0,
+            getattr(usage, 'cached_content_token_count', 0) or 0)
+
+
+def percentile(sorted_values: list[float], fraction: float) -> float | None:
+    """已排序數列的百分位數 (nearest-rank)。"""
+    if not sorted_values:
+        return None
+    return sorted_values[max(0, math.ceil(fraction * len(sorted_values)) - 1)]
+
+
+class UsageStore:
+    """以 SQLite 保存用量紀錄。record_* 可由任何執行緒呼叫，實際寫入由背景執行緒批次完成。"""
+
+    def __init__(self, path: str, retention_days: int = USAGE_RETENTION_DAYS):
+        self.path = path
+        self.retention_days = retention_days
+        self._queue = queue.SimpleQueue()
+        self._writer = None
+        self._lock = threading.Lock()
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.path, timeout=10)
+        conn.row_factory = sqlite3.Row
+        # WAL 讓統計頁面的讀取不必等待背景寫入
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.executescript(_SCHEMA)
+        return conn
+
+    def _ensure_writer(self):
+        with self._lock:
+            if self._writer is None:
+                self._writer = threading.Thread(target=self._write_loop, daemon=True, name="UsageStoreWriter")
+                self._writer.start()
+                # 行程結束前寫完佇列中剩餘的紀錄
+                atexit.register(self.close)
+
+    def _write_loop(self):
+        try:
+            conn = self._connect()
+            cutoff = time.time() - self.retention_days * 86400
+            with conn:
+                conn.execute("DELETE FROM model_calls WHERE created_at < ?", (cutoff,))
+                conn.execute("DELETE FROM tasks WHERE started_at < ?", (cutoff,))
+        except sqlite3.Error as e:
+            logging.error(f"[UsageStore] 無法開啟用量資料庫 {self.path}: {e}")
+            return
+        with closing(conn):
+            while True:
+                batch = [self._queue.get()]
+                while True:
+                    try:
+                        batch.append(self._queue.get_nowait())
+                    except queue.Empty:
+                        break
+                stop = None in batch
+                try:
+                    with conn:
+                        for table, row in filter(None, batch):
+                            conn.execute(_INSERTS[table], row)
+                except sqlite3.Error as e:
+                    logging.warning(f"[UsageStore] 寫入 {len(batch)} 筆用量紀錄失敗: {e}")
+                if stop:
+                    return
+
+    def _put(self, table: str, row: dict):
+        self._ensure_writer()
+        self._queue.put((table, row))
+
+    def record_call(self, model: str, *, task_id=None, task_type=None, document=None, prompt_tokens=0,
+                    output_tokens=0, cached_tokens=0, latency=0.0, retries=0, pages=0, error=None):
+        self._put('model_calls', {
+            'created_at': time.time(), 'task_id': task_id, 'task_type': task_type, 'document': document,
+            'model': model, 'prompt_tokens': prompt_tokens, 'output_tokens': output_tokens,
+            'cached_tokens': cached_tokens, 'latency': latency, 'retries': retries, 'pages': pages,
+            'ok': int(error is None), 'error': str(error)[:300] if error is not None else None,
+        })
+
+    def record_task(self, task_id: str, task_type: str, document: str | None, started_at: float, elapsed: float):
+        self._put('tasks', {'task_id': task_id, 'task_type': task_type, 'document': document,
+                            'started_at': started_at, 'elapsed': elapsed})
+
+    def close(self, timeout: float = 5):
+        """寫完已排入的紀錄後停止背景執行緒。"""
+        with self._lock:
+            writer, self._writer = self._writer, None
+        if writer is not None and writer.is_alive():
+            self._queue.put(None)
+            writer.join(timeout)
+
+    def dashboard(self, hours: float = 24) -> dict:
+        """最近 hours 小時內的用量統計 (供 /usage 頁面與 /api/usage 使用)。"""
+        since = time.time() - hours * 3600
+        with closing(self._connect()) as conn:
+            task_rows = conn.execute(
+                "SELECT t.task_id, t.task_type, t.document, t.elapsed, "
+                # 失敗的呼叫不計頁數 (批次失敗後逐頁重試時，同一頁不重複計算)
+                "COALESCE(SUM(CASE WHEN c.ok THEN c.pages ELSE 0 END), 0) AS pages, COUNT(c.id) AS calls, "
+                "COALESCE(SUM(c.prompt_tokens), 0) AS prompt_tokens, COALESCE(SUM(c.output_tokens), 0) AS output_tokens "
+                "FROM tasks t LEFT JOIN model_calls c ON c.task_id = t.task_id "
+                "WHERE t.started_at >= ? GROUP BY t.task_id", (since,)).fetchall()
+            call_rows = conn.execute(
+                "SELECT model, latency, ok, retries, prompt_tokens, output_tokens, cached_tokens "
+                "FROM model_calls WHERE created_at >= ?", (since,)).fetchall()
+
+        tasks = [dict(row) for row in task_rows]
+        busy_seconds = sum(task['elapsed'] for task in tasks)
+        pages = sum(task['pages'] for task in tasks)
+        task_tokens = sum(task['prompt_tokens'] + task['output_tokens'] for task in tasks)
+        throughput = {
+            'tasks': len(tasks),
+            'busy_minutes': round(busy_seconds / 60, 1),
+            'pages': pages,
+            # 以任務的執行時間為分母，閒置時間不計入
+            'pages_per_minute': round(pages / (busy_seconds / 60), 2) if busy_seconds else None,
+            'tokens_per_second': round(task_tokens / busy_seconds, 1) if busy_seconds else None,
+        }
+
+        by_model = {}
+        for row in call_rows:
+            by_model.setdefault(row['model'], []).append(row)
+        models = []
+        for model, rows in sorted(by_model.items()):
+            latencies = sorted(row['latency'] for row in rows if row['ok'])
+            output_tokens = sum(row['output_tokens'] for row in rows)
+            models.append({
+                'model': model,
+                'calls': len(rows),
+                'errors': sum(1 for row in rows if not row['ok']),
+                'retries': sum(row['retries'] for row in rows),
+                'prompt_tokens': sum(row['prompt_tokens'] for row in rows),
+                'output_tokens': output_tokens,
+                'cached_tokens': sum(row['cached_tokens'] for row in rows),
+                'p50_latency': round(percentile(latencies, 0.5), 2) if latencies else None,
+                'p95_latency': round(percentile(latencies, 0.95), 2) if latencies else None,
+                'output_tokens_per_second': round(output_tokens / sum(latencies), 1) if sum(latencies) else None,
+            })
+
+        by_type = {}
+        for task in tasks:
+            entry = by_type.setdefault(task['task_type'], {'task_type': task['task_type'], 'tasks': 0, 'calls': 0,
+                                                            'pages': 0, 'tokens': 0, 'minutes': 0.0})
+            entry['tasks'] += 1
+            entry['calls'] += task['calls']
+            entry['pages'] += task['pages']
+            entry['tokens'] += task['prompt_tokens'] + task['output_tokens']
+            entry['minutes'] += task['elapsed'] / 60
+        for entry in by_type.values():
+            entry['minutes'] = round(entry['minutes'], 1)
+
+        for task in tasks:
+            task['tokens'] = task['prompt_tokens'] + task['output_tokens']
+            task['elapsed'] = round(task['elapsed'], 1)
+        documents = sorted(tasks, key=lambda task: (task['tokens'], task['elapsed']), reverse=True)[:TOP_DOCUMENTS]
+
+        return {
+            'hours': hours,
+            'throughput': throughput,
+            'models': models,
+            'task_types': sorted(by_type.values(), key=lambda entry: entry['tokens'], reverse=True),
+            'documents': documents,
+        }
+
+
+_store = None
+
+
+def set_usage_store(store: UsageStore | None):
+    """設定全域用量紀錄 (由 app.py / headless.py 在啟動時呼叫)；未設定時不記錄。"""
+    global _store
+    _store = store
+
+
+def get_usage_store() -> UsageStore | None:
+    return _store
+
+
+def record_model_call(metrics, model: str, response=None, *, latency: float = 0.0, retries: int = 0,
+                      pages: int = 0, error: Exception | None = None):
+    """
+    記錄一次模型呼叫 (error 不為 None 表示失敗)。metrics 為發出請求的任務統計 (TaskMetrics 或 None)，
+    token 數同時累加到任務統計的 model_tokens 中。
+    """
+    prompt_tokens, output_tokens, cached_tokens = response_usage(response)
+    if metrics is not None:
+        metrics.increment('model_tokens', 'prompt', prompt_tokens)
+        metrics.increment('model_tokens', 'output', output_tokens)
+    if _store is None:
+        return
+    _store.record_call(model, task_id=getattr(metrics, 'task_id', None), task_type=getattr(metrics, 'task_type', None),
+                       document=getattr(metrics, 'document', None), prompt_tokens=prompt_tokens,
+                       output_tokens=output_tokens, cached_tokens=cached_tokens, latency=latency, retries=retries,
+                       pages=pages, error=error)
+
+
+def record_task(metrics):
+    """記錄已結束的任務 (見 task_metrics.end_task)。"""
+    if _store is None:
+        return
+    _store.record_task(metrics.task_id, metrics.task_type, metrics.document,
+                       time.time() - metrics.elapsed, metrics.elapsed)
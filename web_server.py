@@ -0,0 +1,177 @@
+# web_server.py
+# HTTP 服務層：靜態檔案快取 / 壓縮設定，以及選擇用來執行 Flask app 的伺服器。
+#
+#   werkzeug : Flask 內建的開發伺服器 (每個請求一條執行緒，無上限)
+#   waitress : 固定大小的執行緒池，適合無介面或區域網路部署 (pip install waitress)
+#   auto     : 有安裝 waitress 時使用 waitress，否則使用 werkzeug
+#
+# 任務佇列與事件頻道都存在於行程內，因此只支援單一行程、多執行緒的伺服器。
+
+import os
+import gzip
+import logging
+import mimetypes
+import threading
+
+from flask import request, send_from_directory
+
+SERVER_MODES = ('auto', 'waitress', 'werkzeug')
+# waitress 的執行緒數；每條 SSE 連線在串流期間都佔用一條執行緒
+SERVER_THREADS = 32
+# 同時開啟的 SSE 串流數上限 (預設為執行緒數的 3/4)，保留其餘執行緒處理頁面與 API 請求
+SSE_STREAM_SHARE = 0.75
+# 靜態檔案的網址帶有版本參數 (?v=修改時間)，內容變更時網址也會改變，因此可以長期快取
+STATIC_MAX_AGE = 365 * 24 * 3600
+# 動態回應超過此大小且為文字類型時以 gzip 壓縮
+GZIP_MIN_BYTES = 1024
+GZIP_LEVEL = 6
+COMPRESSIBLE_MIMETYPES = {
+    'text/html', 'text/css', 'text/plain', 'text/javascript', 'application/javascript',
+    'application/json', 'image/svg+xml',
+}
+# 可預先壓縮的靜態檔案副檔名 (圖片、音訊本身已壓縮，不處理)
+PRECOMPRESS_EXTENSIONS = {'.css', '.js', '.html', '.json', '.svg', '.txt'}
+
+
+def _accepts_gzip() -> bool:
+    return 'gzip' in request.headers.get('Accept-Encoding', '').lower()
+
+
+def _static_version(static_folder: str, filename: str) -> str | None:
+    try:
+        mtime = os.stat(os.path.join(static_folder, filename)).st_mtime_ns
+    except OSError:
+        return None
+    return format(mtime // 1_000_000, 'x')
+
+
+def _fresh_gzip(static_folder: str, filename: str) -> bool:
+    """是否有不比原始檔案舊的 .gz 檔案；原始檔案修改後未重新壓縮時送出原始檔案，避免送出過期的內容。"""
+    try:
+        return (os.stat(os.path.join(static_folder, filename + '.gz')).st_mtime_ns
+                >= os.stat(os.path.join(static_folder, filename)).st_mtime_ns)
+    except OSError:
+        return False
+
+
+def setup_static_caching(app):
+    """
+    靜態檔案：網址加上版本參數並設定一年的 Cache-Control (immutable)；
+    ETag、條件式請求與 Range (音訊拖曳播放) 由 Werkzeug 的 send_file 處理。
+    存在預先壓縮的 .gz 檔案 (且不比原始檔案舊) 且瀏覽器接受 gzip 時，直接送出壓縮版本。
+    """
+    static_folder = app.static_folder
+
+    @app.url_defaults
+    def add_static_version(endpoint, values):
+        if endpoint == 'static' and 'v' not in values:
+            version = _static_version(static_folder, values.get('filename', ''))
+            if version:
+                values['v'] = version
+
+    def send_static(filename):
+        max_age = STATIC_MAX_AGE if request.args.get('v') else app.get_send_file_max_age(filename)
+        if _accepts_gzip() and _fresh_gzip(static_folder, filename):
+            mimetype = mimetypes.guess_type(filename)[0] or 'application/octet-stream'
+            response = send_from_directory(static_folder, filename + '.gz', mimetype=mimetype, max_age=max_age)
+            response.headers['Content-Encoding'] = 'gzip'
+        else:
+            response = send_from_directory(static_folder, filename, max_age=max_age)
+        response.vary.add('Accept-Encoding')
+        if request.args.get('v'):
+            response.cache_control.immutable = True
+            response.cache_control.public = True
+        return response
+
+    app.view_functions['static'] = send_static
+
+
+def setup_gzip(app):
+    """壓縮夠大的文字類動態回應；串流回應 (SSE、檔案) 不處理。"""
+
+    @app.after_request
+    def gzip_response(response):
+        if (response.direct_passthrough or response.is_streamed or response.status_code < 200
+                or response.status_code >= 300 or 'Content-Encoding' in response.headers
+                or response.mimetype not in COMPRESSIBLE_MIMETYPES or not _accepts_gzip()):
+            return response
+        data = response.get_data()
+        if len(data) < GZIP_MIN_BYTES:
+            return response
+        response.set_data(gzip.compress(data, compresslevel=GZIP_LEVEL))
+        response.headers['Content-Encoding'] = 'gzip'
+        response.vary.add('Accept-Encoding')
+        return response
+
+
+def precompress_static(static_folder: str) -> list[str]:
+    """為可壓縮的靜態檔案產生 .gz 版本 (只在原檔較新時重建)，返回寫出的檔案。"""
+    written = []
+    for root, _, names in os.walk(static_folder):
+        for name in names:
+            if os.path.splitext(name)[1].lower() not in PRECOMPRESS_EXTENSIONS:
+                continue
+            path = os.path.join(root, name)
+            gz_path = path + '.gz'
+            if os.path.exists(gz_path) and os.path.getmtime(gz_path) >= os.path.getmtime(path):
+                continue
+            with open(path, 'rb') as source:
+                data = gzip.compress(source.read(), compresslevel=9, mtime=0)
+            with open(gz_path, 'wb') as dest:
+                dest.write(data)
+            written.append(gz_path)
+    return written
+
+
+def sse_stream_limit(threads: int | None = None) -> int:
+    return max(1, int((threads or SERVER_THREADS) * SSE_STREAM_SHARE))
+
+
+def resolve_server_mode(mode: str | None) -> str:
+    mode = (mode or 'auto').lower()
+    if mode not in SERVER_MODES:
+        raise ValueError(f"不支援的伺服器模式: {mode} (可用: {', '.join(SERVER_MODES)})")
+    if mode == 'werkzeug':
+        return mode
+    try:
+        import waitress  # noqa: F401
+        return 'waitress'
+    except ImportError as e:
+        if mode == 'waitress':
+            raise ImportError("未安裝 waitress，請執行 pip install waitress 或改用 --server werkzeug") from e
+        return 'werkzeug'
+
+
+def serve(app, host: str, port: int, mode: str | None = None, threads: int | None = None):
+    """以指定的伺服器執行 app (阻塞直到伺服器結束)。"""
+    mode = resolve_server_mode(mode)
+    threads = threads or SERVER_THREADS
+    logging.info(f"[WebServer] 使用 {mode} 於 http://{host}:{port} 提供服務"
+                 + (f" (執行緒 {threads}，SSE 串流上限 {sse_stream_limit(threads)})" if mode == 'waitress' else ""))
+    if mode == 'waitress':
+        from waitress import serve as waitress_serve
+        # SSE 每 60 秒送出 keep-alive，channel_timeout 需大於此間隔
+        waitress_serve(app, host=host, port=port, threads=threads, ident="ai-toolbox",
+                       channel_timeout=120, connection_limit=max(100, threads * 4))
+    else:
+        app.run(host=host, port=port, debug=False, use_reloader=False, threaded=True)
+
+
+class StreamLimiter:
+    """限制同時開啟的串流回應數；limit 為 None 時不限制。"""
+
+    def __init__(self, limit: int | None = None):
+        self.limit = limit
+        self.active = 0
+        self._lock = threading.Lock()
+
+    def acquire(self) -> bool:
+        with self._lock:
+            if self.limit is not None and self.active >= self.limit:
+                return False
+            self.active += 1
+            return True
+
+    def release(self):
+        with self._lock:
+            self.active -= 1
@@ -0,0 +1,208 @@
+# workflow_scripts/chapter_summarizer.py
+# 依章節摘要 PDF：以目錄 (pdf_splitter.analyze_toc) 將文件切成各章的頁面範圍，
+# 各章在自己的子流程 (lane) 中同時進行 OCR 與翻譯 -> 摘要，最後依目錄順序合併為一份摘要，
+# 每章一個 H1 (章名)，該章摘要的標題層級下移一層。
+#
+# 每章的請求量只與章節長度有關，長篇文件不會因一次摘要全文而超出模型的上下文；
+# 各章的進度以 LaneEvent 回報 (見 progress_events.LaneEmitter)，單一章節失敗時以說明段落取代，
+# 只有全部章節都失敗時整個任務才算失敗。
+
+import os
+import re
+import json
+import logging
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+import fitz  # PyMuPDF
+
+from progress_events import as_emitter
+from model_router import RoutedModel
+from task_cancel import bind_cancel_token, current_cancel_token, check_cancelled
+from task_metrics import bind_task_metrics, current_task_metrics
+from workflow_scripts.pdf_splitter import analyze_toc, toc_chapters, TocChapter, TOC_DISCOVERY_MODE
+from workflow_scripts.pdf_ocr_translator import run_ocr_translation
+from workflow_scripts.text_summarizer import summarize_to_markdown
+from workflow_scripts.page_selection import parse_page_ranges, range_indices, format_page_ranges
+from workflow_scripts.output_writers import Block, DocumentResult, write_outputs
+
+# 同時處理的章節數 (每章內部的頁面 / 分段請求仍由金鑰池控制並行數)
+CHAPTER_MAX_LANES = 4
+# 找不到目錄時，依此頁數將選取的頁面切成固定長度的段落
+CHAPTER_FALLBACK_PAGES = 30
+# 摘要的標題下移一層後的最深層級 (Markdown 只有 6 層)
+MAX_HEADING_LEVEL = 6
+
+# 多層目錄中的子章節 (例如 "1.1 研究背景")，併入所屬的章節
+_SUBSECTION_TITLE = re.compile(r'^\s*\d+(?:\.\d+)+\.?\s')
+
+
+def _top_level_entries(toc: list[dict]) -> list[dict]:
+    """去除子章節項目；全部都像子章節時 (無法判斷層級) 保留原目錄。"""
+    entries = [item for item in toc if not _SUBSECTION_TITLE.match(str(item.get('title', '')))]
+    return entries or toc
+
+
+def _fallback_chapters(indices: list[int]) -> list[tuple[TocChapter, list[int]]]:
+    """
+    沒有目錄時，將選取的頁面依 CHAPTER_FALLBACK_PAGES 切成固定長度的段落。
+    返回 [(段落, 該段選取的頁面索引)]；段落的 start/end 只是範圍的兩端，中間未選取的頁面不處理。
+    """
+    chapters = []
+    for number, offset in enumerate(range(0, len(indices), CHAPTER_FALLBACK_PAGES), start=1):
+        group = indices[offset:offset + CHAPTER_FALLBACK_PAGES]
+        title = f"第 {format_page_ranges(group)} 頁"
+        chapters.append((TocChapter(number, title, group[0], group[-1]), group))
+    return chapters
+
+
+def plan_chapters(model, input_pdf_path: str, progress=None, page_range: str | None = None,
+                  toc_discovery: str = TOC_DISCOVERY_MODE) -> list[tuple[TocChapter, str]]:
+    """
+    返回 [(章節, 該章要處理的頁碼範圍字串)]，依目錄順序排列。只包含 page_range 中的頁面，
+    沒有選取頁面的章節 (以及第一章之前的封面、目錄頁) 不處理。
+    找不到目錄或分析失敗時，改為每 CHAPTER_FALLBACK_PAGES 頁一段。頁碼範圍格式錯誤時拋出 ValueError。
+    """
+    progress = as_emitter(progress)
+    spans = parse_page_ranges(page_range)
+    with fitz.open(input_pdf_path) as pdf_document:
+        num_pages = len(pdf_document)
+        selected = range_indices(spans, num_pages)
+        try:
+            toc = analyze_toc(model, pdf_document, progress, toc_discovery)
+        except (json.JSONDecodeError, TypeError, AttributeError) as e:
+            logging.warning(f"  目錄分析的回應格式錯誤，改為依頁數分段: {e}")
+            toc = []
+        except Exception as e:
+            logging.warning(f"  目錄分析失敗，改為依頁數分段: {e}")
+            toc = []
+
+    selected_set = set(selected)
+    planned = []
+    for chapter in toc_chapters(_top_level_entries(toc), num_pages):
+        indices = [index for index in range(chapter.start, chapter.end + 1) if index in selected_set]
+        if indices:
+            planned.append((chapter, format_page_ranges(indices)))
+    if not planned and selected:
+        if toc:
+            logging.warning("  目錄中的章節都不在選取的頁面範圍內，改為依頁數分段。")
+        progress.status(f'未找到可用的目錄，改為每 {CHAPTER_FALLBACK_PAGES} 頁一段進行摘要。')
+        planned = [(chapter, format_page_ranges(group)) for chapter, group in _fallback_chapters(selected)]
+    return planned
+
+
+def _chapter_blocks(chapter: TocChapter, summary_markdown: str | None, error: str | None) -> list[Block]:
+    """章名為 H1，摘要的標題下移一層；失敗的章節 (summary_markdown 為 None) 以說明段落取代摘要。"""
+    blocks = [Block('heading', chapter.title, 1)]
+    if summary_markdown is None:
+        blocks.append(Block('paragraph', f"(本章處理失敗: {error})"))
+        return blocks
+    for block in DocumentResult.from_markdown(summary_markdown).blocks:
+        if block.kind == 'heading':
+            block.level = min(block.level + 1, MAX_HEADING_LEVEL)
+        blocks.append(block)
+    return blocks
+
+
+def run_chapter_summary(api_key: str, toc_model_name: str, ocr_model_name: str, summary_model_name: str,
+                        input_pdf_path: str, output_summary_path: str, progress=None, page_range: str | None = None,
+                        auto_skip: bool = True, output_formats=None,
+                        max_lanes: int = CHAPTER_MAX_LANES) -> DocumentResult | None:
+    """
+    依章節摘要 PDF，結果儲存為 Word (及 output_formats 中的其他格式，與 Word 同名)。
+    各章的 OCR 與翻譯結果暫存在 output_summary_path 所在資料夾的 chapters/ 中。
+    返回合併後的摘要內容，全部章節都失敗時返回 None。任務被取消時拋出 TaskCancelled。
+    """
+    progress = as_emitter(progress)
+    logging.info(f"開始依章節摘要: {os.path.basename(input_pdf_path)}")
+    progress.status('分析目錄結構...', percent=5)
+    try:
+        toc_model = RoutedModel(toc_model_name, api_key)
+        planned = plan_chapters(toc_model, input_pdf_path, progress, page_range)
+    except ValueError as e:
+        progress.error(f'頁碼範圍錯誤: {e}')
+        return None
+    except Exception as e:
+        logging.error(f"  開啟 PDF 或分析目錄時發生錯誤: {e}", exc_info=True)
+        progress.error(f'分析目錄失敗: {e}')
+        return None
+    if not planned:
+        progress.error('選取的頁面範圍內沒有需要處理的頁面')
+        return None
+
+    total = len(planned)
+    logging.info(f"  共 {total} 個章節: " + '; '.join(f"{chapter.title} (第 {spec} 頁)" for chapter, spec in planned))
+    progress.status(f'共 {total} 個章節，開始同時處理...', percent=30)
+    chapters_folder = os.path.join(os.path.dirname(output_summary_path), "chapters")
+    os.makedirs(chapters_folder, exist_ok=True)
+
+    lanes = {chapter.number: progress.lane(chapter.number, chapter.title) for chapter, _ in planned}
+    for lane in lanes.values():
+        lane.status('等待處理...')
+
+    # 工作執行緒需要任務的取消權杖與統計 (模型請求、略過頁數才會計入此任務)
+    cancel_token = current_cancel_token()
+    metrics = current_task_metrics()
+
+    def process_chapter(chapter: TocChapter, spec: str) -> tuple[str | None, str | None]:
+        """返回 (摘要 Markdown, 失敗原因)。"""
+        bind_cancel_token(cancel_token)
+        bind_task_metrics(metrics)
+        lane = lanes[chapter.number]
+        try:
+            check_cancelled()
+            lane.status(f'OCR 與翻譯 (第 {spec} 頁)...')
+            chapter_path = os.path.join(chapters_folder, f"chapter_{chapter.number:02d}.docx")
+            ocr_result = run_ocr_translation(api_key, ocr_model_name, input_pdf_path, chapter_path, lane,
+                                             page_range=spec, auto_skip=auto_skip)
+            if not ocr_result or not ocr_result.text.strip():
+                lane.error('未能取得此章的文字')
+                return None, '未能取得此章的文字'
+
+            check_cancelled()
+            lane.status('生成摘要...')
+            summary_model = RoutedModel(summary_model_name, api_key)
+            summary_markdown = summarize_to_markdown(summary_model, ocr_result.text, lane)
+            lane.complete('完成')
+            return summary_markdown, None
+        except Exception as e:
+            logging.error(f"  章節 '{chapter.title}' 處理失敗: {e}", exc_info=True)
+            lane.error(str(e))
+            return None, str(e)
+        finally:
+            bind_cancel_token(None)
+            bind_task_metrics(None)
+
+    summaries = {}
+    with ThreadPoolExecutor(max_workers=max(1, min(max_lanes, total)), thread_name_prefix="ChapterLane") as executor:
+        futures = {executor.submit(process_chapter, chapter, spec): chapter for chapter, spec in planned}
+        try:
+            for finished, future in enumerate(as_completed(futures), start=1):
+                # TaskCancelled 會在這裡重新拋出
+                summaries[futures[future].number] = future.result()
+                progress.progress(finished, total, f'已完成 {finished}/{total} 個章節')
+        except BaseException:
+            for future in futures:
+                future.cancel()
+            raise
+
+    failed = [chapter.title for chapter, _ in planned if summaries[chapter.number][0] is None]
+    if len(failed) == total:
+        progress.error('所有章節都處理失敗')
+        return None
+    if failed:
+        logging.warning(f"  {len(failed)} 個章節處理失敗: {', '.join(failed)}")
+
+    check_cancelled()
+    progress.status('合併各章摘要並儲存...', percent=85)
+    blocks = []
+    for chapter, _ in planned:
+        blocks.extend(_chapter_blocks(chapter, *summaries[chapter.number]))
+    result = DocumentResult(blocks)
+    try:
+        write_outputs(result, os.path.splitext(output_summary_path)[0], ['docx', *(output_formats or ())])
+    except Exception as e:
+        logging.error(f"  寫入章節摘要失敗: {e}", exc_info=True)
+        progress.error(f'寫入摘要檔案失敗: {e}')
+        return None
+    logging.info(f"  章節摘要儲存成功: {os.path.basename(output_summary_path)} ({total - len(failed)}/{total} 個章節)")
+    return result
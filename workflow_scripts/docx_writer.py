@@ -0,0 +1,109 @@
+# workflow_scripts/docx_writer.py
+import os
+import re
+import json
+import zipfile
+from xml.sax.saxutils import escape
+
+import docx
+
+# 使用 python-docx 內建的預設範本，輸出的樣式與 docx.Document() 完全相同
+_TEMPLATE_PATH = os.path.join(os.path.dirname(docx.__file__), 'templates', 'default.docx')
+_DOCUMENT_PART = 'word/document.xml'
+# XML 1.0 不允許的控制字元 (模型輸出偶爾會夾帶)
+_INVALID_XML_CHARS = re.compile(r'[\x00-\x08\x0b\x0c\x0e-\x1f]')
+
+
+class StreamingDocxWriter:
+    """
+    逐段寫入 DOCX 的寫入器：word/document.xml 直接串流寫進 zip，
+    不在記憶體中建立完整的文件物件模型，記憶體用量與段落數無關。
+    用法：
+        with StreamingDocxWriter(path) as writer:
+            writer.add_paragraph("內文")
+            writer.add_paragraph("標題", style="Heading1")
+    """
+
+    def __init__(self, output_path: str):
+        self.output_path = output_path
+        self.paragraph_count = 0
+        self._zip = None
+        self._stream = None
+        self._body_tail = ''
+
+    def __enter__(self):
+        with zipfile.ZipFile(_TEMPLATE_PATH) as template:
+            document_xml = template.read(_DOCUMENT_PART).decode('utf-8')
+            self._zip = zipfile.ZipFile(self.output_path, 'w', compression=zipfile.ZIP_DEFLATED)
+            for item in template.infolist():
+                if item.filename != _DOCUMENT_PART:
+                    self._zip.writestr(item, template.read(item.filename))
+        # 範本的 <w:body> 只有 <w:sectPr>，段落寫在兩者之間
+        body_start = document_xml.index('<w:body>') + len('<w:body>')
+        sect_start = document_xml.index('<w:sectPr', body_start)
+        self._body_tail = document_xml[sect_start:]
+        self._stream = self._zip.open(_DOCUMENT_PART, 'w', force_zip64=True)
+        self._write(document_xml[:body_start])
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+        if exc_type is not None and os.path.exists(self.output_path):
+            os.remove(self.output_path)
+        return False
+
+    def _write(self, text: str):
+        self._stream.write(text.encode('utf-8'))
+
+    def add_paragraph(self, text: str, style: str | None = None):
+        """寫入一個段落；段落內的換行轉為 Word 的換行 (<w:br/>)。style 為樣式 ID，例如 'Heading1'。"""
+        text = _INVALID_XML_CHARS.sub('', text)
+        runs = '<w:r><w:br/></w:r>'.join(
+            f'<w:r><w:t xml:space="preserve">{escape(line)}</w:t></w:r>' for line in text.split('\n')
+        )
+        props = f'<w:pPr><w:pStyle w:val="{style}"/></w:pPr>' if style else ''
+        self._write(f'<w:p>{props}{runs}</w:p>')
+        self.paragraph_count += 1
+
+    def close(self):
+        if self._stream is not None:
+            self._write(self._body_tail)
+            self._stream.close()
+            self._stream = None
+        if self._zip is not None:
+            self._zip.close()
+            self._zip = None
+
+
+class PageRecordWriter:
+    """
+    OCR 結果的只附加寫入 (append-only) 中繼檔：每頁一行 JSON，寫入後立即 flush。
+    紀錄格式：{"page": 頁碼 (從 1 開始), "ok": 是否成功, "text": 文字}
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._file = open(path, 'w', encoding='utf-8')
+
+    def write(self, page: int, text: str, ok: bool = True):
+        self._file.write(json.dumps({'page': page, 'ok': ok, 'text': text}, ensure_ascii=False) + '\n')
+        self._file.flush()
+
+    def close(self):
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+        return False
+
+
+def iter_page_records(path: str):
+    """逐行讀取 PageRecordWriter 產生的中繼檔。"""
+    with open(path, 'r', encoding='utf-8') as f:
+        for line in f:
+            if line.strip():
+                yield json.loads(line)
+
@@ -0,0 +1,118 @@
+# workflow_scripts/image_pages.py
+# 多張圖片 (或 zip 壓縮檔) 的 OCR 前處理：依檔名自然順序排列，
+# 在工作執行緒池中校正 EXIF 方向並縮小尺寸，供 PageWindow 當作「頁面」逐一取用。
+import os
+import io
+import re
+import zipfile
+from concurrent.futures import ThreadPoolExecutor
+
+from PIL import Image, ImageOps
+
+IMAGE_EXTENSIONS = {'png', 'jpg', 'jpeg', 'bmp', 'gif', 'webp'}
+# 送出前將圖片的長邊縮小到此像素數 (手機照片常見 4000px 以上，對 OCR 沒有幫助)
+IMAGE_MAX_SIDE = 2048
+IMAGE_JPEG_QUALITY = 85
+# 前處理的執行緒數 (PIL 的解碼與縮放會釋放 GIL)
+IMAGE_WORKERS = min(4, os.cpu_count() or 1)
+# 單一 zip 中最多處理的圖片數，以及解壓後的總大小上限
+ZIP_MAX_IMAGES = 1000
+ZIP_MAX_TOTAL_BYTES = 1024 * 1024 * 1024
+
+
+def natural_sort_key(name: str):
+    """讓 page2.jpg 排在 page10.jpg 之前。"""
+    return [int(part) if part.isdigit() else part.lower() for part in re.split(r'(\d+)', name)]
+
+
+def _is_image_name(name: str) -> bool:
+    base = os.path.basename(name)
+    return not base.startswith('.') and os.path.splitext(base)[1].lower().lstrip('.') in IMAGE_EXTENSIONS
+
+
+def extract_zip_images(zip_path: str, extract_dir: str) -> list[str]:
+    """將 zip 中的圖片解壓到 extract_dir (不保留原本的目錄結構)，返回依自然順序排列的路徑。"""
+    os.makedirs(extract_dir, exist_ok=True)
+    with zipfile.ZipFile(zip_path) as archive:
+        members = [m for m in archive.infolist()
+                   if not m.is_dir() and _is_image_name(m.filename) and '__MACOSX/' not in m.filename]
+        members.sort(key=lambda m: natural_sort_key(m.filename))
+        if len(members) > ZIP_MAX_IMAGES:
+            raise ValueError(f"壓縮檔中的圖片超過 {ZIP_MAX_IMAGES} 張")
+        if sum(m.file_size for m in members) > ZIP_MAX_TOTAL_BYTES:
+            raise ValueError("壓縮檔解壓後的大小超過上限")
+        paths = []
+        for index, member in enumerate(members):
+            # 以序號加上原始檔名命名，避免路徑穿越與不同資料夾中的同名檔案互相覆蓋
+            target = os.path.join(extract_dir, f"{index:04d}_{os.path.basename(member.filename)}")
+            with archive.open(member) as source, open(target, 'wb') as dest:
+                while chunk := source.read(1024 * 1024):
+                    dest.write(chunk)
+            paths.append(target)
+    return paths
+
+
+def collect_image_paths(input_path: str, extract_dir: str) -> list[str]:
+    """輸入可以是 zip、圖片資料夾或單張圖片，返回依自然順序排列的圖片路徑。"""
+    if os.path.isdir(input_path):
+        names = sorted((n for n in os.listdir(input_path) if _is_image_name(n)), key=natural_sort_key)
+        return [os.path.join(input_path, n) for n in names]
+    if input_path.lower().endswith('.zip'):
+        return extract_zip_images(input_path, extract_dir)
+    return [input_path]
+
+
+def normalize_image(image_path: str, max_side: int = IMAGE_MAX_SIDE) -> bytes:
+    """依 EXIF 轉正方向、縮小到長邊不超過 max_side，並以 JPEG 編碼。"""
+    with Image.open(image_path) as img:
+        img = ImageOps.exif_transpose(img)
+        if img.mode in ('RGBA', 'LA', 'P'):
+            # 透明背景補白，避免 JPEG 轉換後變成黑底
+            img = img.convert('RGBA')
+            background = Image.new('RGB', img.size, (255, 255, 255))
+            background.paste(img, mask=img.getchannel('A'))
+            img = background
+        elif img.mode != 'RGB':
+            img = img.convert('RGB')
+        img.thumbnail((max_side, max_side), Image.LANCZOS)
+        buffer = io.BytesIO()
+        img.save(buffer, format='JPEG', quality=IMAGE_JPEG_QUALITY, optimize=True)
+        return buffer.getvalue()
+
+
+class ImagePageRenderer:
+    """
+    PageWindow 使用的渲染函式：render(index) 返回第 index 張圖片的 JPEG bytes。
+    每次呼叫時會預先把後面 workers 張圖片送進執行緒池處理，前處理與 AI 請求因此可以重疊。
+    """
+
+    def __init__(self, image_paths: list[str], workers: int = IMAGE_WORKERS):
+        self.image_paths = image_paths
+        self.workers = max(1, workers)
+        self._futures = {}
+        self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="ImagePrepWorker")
+
+    def _submit(self, index: int):
+        if index < len(self.image_paths) and index not in self._futures:
+            self._futures[index] = self._executor.submit(normalize_image, self.image_paths[index])
+
+    def __call__(self, index: int) -> bytes:
+        for ahead in range(index, index + self.workers + 1):
+            self._submit(ahead)
+        try:
+            return self._futures.pop(index).result()
+        except Exception as e:
+            raise RuntimeError(f"無法讀取圖片 {os.path.basename(self.image_paths[index])}: {e}") from e
+
+    def close(self):
+        for future in self._futures.values():
+            future.cancel()
+        self._futures.clear()
+        self._executor.shutdown(wait=True)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+        return False
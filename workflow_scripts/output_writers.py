@@ -0,0 +1,269 @@
+# workflow_scripts/output_writers.py
+# 輸出格式層：工作流程把模型的輸出整理成記憶體中的 DocumentResult (標題 / 段落 / 項目符號，附頁碼)，
+# 再由各格式的寫入器同時輸出。每種格式都直接由 DocumentResult 產生，不需要先寫出 DOCX 再讀回解析。
+#
+#   result = DocumentResult.from_markdown(summary_markdown)
+#   paths = write_outputs(result, "/tmp/task/summary", ["docx", "md", "json"])
+#   # {'docx': '/tmp/task/summary.docx', 'md': '/tmp/task/summary.md', 'json': '/tmp/task/summary.json'}
+#
+# 新的格式以 register_output_writer(名稱, 函式) 加入；函式簽名為 writer(result, output_path)。
+
+import os
+import re
+import json
+import logging
+from dataclasses import dataclass, field
+from concurrent.futures import ThreadPoolExecutor
+
+from document_pool import get_document_pool
+from workflow_scripts.docx_writer import StreamingDocxWriter
+
+_HEADING = re.compile(r'^(#{1,6})\s+(.*)$')
+_BULLET = re.compile(r'^([ \t]*)[*\-•]\s+(.*)$')
+_BLANK_LINES = re.compile(r'\n\s*\n')
+
+
+@dataclass
+class Block:
+    """一個文件區塊。kind 為 'heading' / 'paragraph' / 'bullet'；level 為標題層級 (1 起) 或項目縮排層級 (0 起)。"""
+    kind: str
+    text: str
+    level: int = 0
+    page: int | None = None
+
+
+@dataclass
+class TextLayout:
+    """純文字版本與每個區塊在其中的字元位置 ([start, end))，TXT 與 JSON 共用，兩者的位置因此一致。"""
+    text: str
+    spans: list[tuple[int, int]] = field(default_factory=list)
+
+
+def _parse_blocks(text: str, page: int | None = None) -> list[Block]:
+    """
+    將模型輸出的文字 (可能帶有 Markdown 標題與項目符號) 切成區塊：
+    以空白行分段，標題與項目符號各自成為一個區塊，其餘連續的行合併為一個段落 (保留段落內的換行)。
+    """
+    blocks = []
+    for chunk in _BLANK_LINES.split((text or '').strip()):
+        lines = []
+        for line in chunk.split('\n'):
+            heading = _HEADING.match(line.strip())
+            bullet = _BULLET.match(line)
+            if (heading or bullet) and lines:
+                blocks.append(Block('paragraph', '\n'.join(lines), page=page))
+                lines = []
+            if heading:
+                blocks.append(Block('heading', heading.group(2).strip(), len(heading.group(1)), page))
+            elif bullet:
+                indent = len(bullet.group(1).expandtabs(4))
+                blocks.append(Block('bullet', bullet.group(2).strip(), min(indent // 2, 8), page))
+            elif line.strip():
+                lines.append(line.strip())
+        if lines:
+            blocks.append(Block('paragraph', '\n'.join(lines), page=page))
+    return blocks
+
+
+def _separator(previous: Block, block: Block) -> str:
+    """區塊之間以空白行分隔；同一頁中連續的項目符號只換行 (Markdown 的緊湊清單)。"""
+    return '\n' if previous.kind == block.kind == 'bullet' and previous.page == block.page else '\n\n'
+
+
+class DocumentResult:
+    """工作流程輸出的內容 (依順序排列的區塊)；建立後不再修改，可由多個寫入器同時讀取。"""
+
+    def __init__(self, blocks: list[Block]):
+        self.blocks = blocks
+        self.layout = self._build_layout()
+
+    @classmethod
+    def from_markdown(cls, markdown: str) -> 'DocumentResult':
+        return cls(_parse_blocks(markdown))
+
+    @classmethod
+    def from_text(cls, text: str) -> 'DocumentResult':
+        """不解析 Markdown，依空白行切成段落 (例如純文字的翻譯結果)。"""
+        return cls([Block('paragraph', block.strip()) for block in _BLANK_LINES.split((text or '').strip()) if block.strip()])
+
+    @classmethod
+    def from_pages(cls, records) -> 'DocumentResult':
+        """由逐頁紀錄 ({"page", "text", ...}，見 docx_writer.PageRecordWriter) 建立，每個區塊帶有頁碼。"""
+        blocks = []
+        for record in records:
+            blocks.extend(_parse_blocks(record['text'], record['page']))
+        return cls(blocks)
+
+    def _build_layout(self) -> TextLayout:
+        parts, spans, offset = [], [], 0
+        previous = None
+        for block in self.blocks:
+            if block.kind == 'bullet':
+                rendered = '  ' * block.level + '• ' + block.text
+            else:
+                rendered = block.text
+            if previous is not None:
+                separator = _separator(previous, block)
+                parts.append(separator)
+                offset += len(separator)
+            spans.append((offset, offset + len(rendered)))
+            parts.append(rendered)
+            offset += len(rendered)
+            previous = block
+        return TextLayout(''.join(parts), spans)
+
+    @property
+    def text(self) -> str:
+        """純文字內容 (段落之間以空白行分隔)，供後續步驟 (例如摘要) 直接使用。"""
+        return self.layout.text
+
+
+# ==============================================================================
+#                                各格式的寫入器
+# ==============================================================================
+def write_docx(result: DocumentResult, output_path: str):
+    with StreamingDocxWriter(output_path) as writer:
+        for block in result.blocks:
+            if block.kind == 'heading':
+                writer.add_paragraph(block.text, style=f'Heading{min(block.level, 9)}')
+            elif block.kind == 'bullet':
+                writer.add_paragraph(block.text, style='ListBullet' if block.level == 0 else f'ListBullet{min(block.level + 1, 3)}')
+            else:
+                writer.add_paragraph(block.text)
+
+
+def write_markdown(result: DocumentResult, output_path: str):
+    """逐頁的結果在每頁開頭加上 <!-- page n --> 註解。"""
+    previous = None
+    with open(output_path, 'w', encoding='utf-8') as f:
+        for block in result.blocks:
+            if previous is not None:
+                f.write(_separator(previous, block))
+            if block.page is not None and (previous is None or block.page != previous.page):
+                f.write(f'<!-- page {block.page} -->\n\n')
+            if block.kind == 'heading':
+                f.write(f"{'#' * block.level} {block.text}")
+            elif block.kind == 'bullet':
+                f.write(f"{'  ' * block.level}- {block.text}")
+            else:
+                f.write(block.text)
+            previous = block
+        f.write('\n')
+
+
+def write_text(result: DocumentResult, output_path: str):
+    with open(output_path, 'w', encoding='utf-8') as f:
+        f.write(result.layout.text)
+        f.write('\n')
+
+
+def write_json(result: DocumentResult, output_path: str):
+    """
+    結構化 JSON：text 為純文字內容 (與 TXT 輸出相同)，blocks / headings / pages 中的 start、end
+    為在 text 中的字元位置 ([start, end))。
+    """
+    blocks, headings, pages = [], [], []
+    for block, (start, end) in zip(result.blocks, result.layout.spans):
+        entry = {'type': block.kind, 'text': block.text, 'start': start, 'end': end}
+        if block.kind != 'paragraph':
+            entry['level'] = block.level
+        if block.page is not None:
+            entry['page'] = block.page
+            if pages and pages[-1]['page'] == block.page:
+                pages[-1]['end'] = end
+            else:
+                pages.append({'page': block.page, 'start': start, 'end': end})
+        if block.kind == 'heading':
+            headings.append({key: entry[key] for key in ('text', 'level', 'start', 'end', 'page') if key in entry})
+        blocks.append(entry)
+    with open(output_path, 'w', encoding='utf-8') as f:
+        json.dump({'text': result.layout.text, 'pages': pages, 'headings': headings, 'blocks': blocks},
+                  f, ensure_ascii=False)
+
+
+def write_pptx(result: DocumentResult, output_path: str):
+    """H1 為章節頁、H2 為內容頁，其餘區塊為內容頁上的項目 (版面規則見 summary_to_ppt)。"""
+    from workflow_scripts.summary_to_ppt import write_presentation
+    items = ((block.kind == 'heading' and block.level == 1, block.kind == 'heading' and block.level == 2,
+              block.text, block.level if block.kind == 'bullet' else 0) for block in result.blocks)
+    if not write_presentation(items, output_path, os.path.basename(output_path)):
+        raise ValueError("內容中沒有可轉換為投影片的 H1/H2 結構")
+
+
+# 格式名稱 (同時也是副檔名) -> 寫入函式
+OUTPUT_WRITERS = {
+    'docx': write_docx,
+    'md': write_markdown,
+    'txt': write_text,
+    'json': write_json,
+    'pptx': write_pptx,
+}
+# 內建的寫入器：子行程 import 本模組時也有相同的設定，只有這些格式交給行程池寫出
+_BUILTIN_WRITERS = dict(OUTPUT_WRITERS)
+
+
+def register_output_writer(name: str, writer):
+    """加入或取代一種輸出格式；writer(result, output_path) 失敗時應拋出例外。"""
+    OUTPUT_WRITERS[name.lower().lstrip('.')] = writer
+
+
+def parse_output_formats(spec) -> list[str]:
+    """解析以逗號分隔的格式字串 (或列表)，去除重複並保留順序；未知的格式拋出 ValueError。"""
+    if isinstance(spec, str):
+        spec = re.split(r'[,，\s]+', spec)
+    formats = []
+    for name in spec or ():
+        name = name.strip().lower().lstrip('.')
+        if not name:
+            continue
+        if name not in OUTPUT_WRITERS:
+            raise ValueError(f"不支援的輸出格式: {name} (可用: {', '.join(OUTPUT_WRITERS)})")
+        if name not in formats:
+            formats.append(name)
+    return formats
+
+
+def write_outputs(result: DocumentResult, output_base: str, formats) -> dict[str, str]:
+    """
+    以 output_base (不含副檔名) 加上各格式的副檔名寫出所有格式，各寫入器在執行緒中同時執行。
+    返回 {格式: 路徑}；任何一種格式失敗時，其餘格式仍會寫完，再拋出第一個錯誤。
+    有設定文件建構行程池時 (見 document_pool) 內建格式在子行程中寫出，不佔用本行程的 GIL；
+    以 register_output_writer 加入或取代的格式只存在於本行程，仍在本行程中寫出。
+    """
+    pool = get_document_pool()
+    if pool is None:
+        return write_outputs_local(result, output_base, formats)
+    formats = parse_output_formats(formats)
+    pooled = [name for name in formats if OUTPUT_WRITERS[name] is _BUILTIN_WRITERS.get(name)]
+    local = [name for name in formats if name not in pooled]
+    paths = {}
+    pool_error = None
+    if pooled:
+        try:
+            paths.update(pool.write_outputs(result, output_base, pooled))
+        except Exception as e:
+            if not local:
+                raise
+            pool_error = e
+    if local:
+        paths.update(write_outputs_local(result, output_base, local))
+    if pool_error is not None:
+        raise pool_error
+    return {name: paths[name] for name in formats}
+
+
+def write_outputs_local(result: DocumentResult, output_base: str, formats) -> dict[str, str]:
+    """在目前的行程中執行 write_outputs。"""
+    formats = parse_output_formats(formats)
+    paths = {name: f"{output_base}.{name}" for name in formats}
+    if len(formats) == 1:
+        OUTPUT_WRITERS[formats[0]](result, paths[formats[0]])
+    elif formats:
+        with ThreadPoolExecutor(max_workers=len(formats), thread_name_prefix="OutputWriter") as executor:
+            futures = {name: executor.submit(OUTPUT_WRITERS[name], result, paths[name]) for name in formats}
+        errors = [(name, future.exception()) for name, future in futures.items() if future.exception() is not None]
+        if errors:
+            name, error = errors[0]
+            raise RuntimeError(f"寫出 {name} 格式失敗: {error}") from error
+    logging.info(f"  已寫出 {', '.join(os.path.basename(path) for path in paths.values())} ({len(result.blocks)} 個區塊)")
+    return paths
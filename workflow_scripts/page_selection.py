@@ -0,0 +1,300 @@
+# workflow_scripts/page_selection.py
+# 決定 PDF 的哪些頁面要送給模型：使用者指定的頁碼範圍，以及自動略過的頁面
+#   - 空白頁：以極小的灰階縮圖計算墨跡比例，並確認文字層幾乎沒有文字
+#   - 重複頁：與前一個保留頁面的縮圖幾乎相同，且確認內容相同 (例如重複插入的投影片)
+#   - 參考文獻：文件後半段的文字層出現「References / 參考文獻」等標題後，看起來像文獻列表的頁面
+#     (遇到下一個章節 / 附錄標題，或不再是文獻列表的頁面即停止，各章末的參考文獻不會吞掉後面的章節)
+# 另外以縮圖的感知雜湊 (dHash) 找出文件中不相鄰但幾乎相同的頁面 (例如簡報中重複的標題 / 章節頁)，
+# 這些頁面只送出第一次出現的頁面，結果依頁碼順序重複使用。
+# 縮圖只用來篩選候選頁面 (只差一個數字或標題的掃描頁縮圖幾乎相同)：略過或沿用結果之前，
+# 需兩頁都沒有圖片且文字層相同，或以 OCR 的解析度渲染後像素完全相同 (見 _confirm_duplicate)。
+# 這些判斷都在本機完成，只有少數候選頁面需要完整渲染，成本遠低於一次模型請求。
+
+import re
+import hashlib
+import logging
+from dataclasses import dataclass, field
+
+import fitz  # PyMuPDF
+from PIL import Image
+
+# 縮圖寬度 (像素)；空白與重複判斷都以此縮圖為準
+THUMBNAIL_WIDTH = 128
+# 比頁面背景 (最常見的灰階值) 暗超過此值的像素視為墨跡；細小的文字在縮圖中只是淺灰色，不能用固定的深色門檻
+INK_DELTA = 24
+# 墨跡像素比例低於此值、且文字層字元數不超過 BLANK_MAX_TEXT_CHARS (例如只有頁碼) 時視為空白頁
+BLANK_MAX_INK_RATIO = 0.001
+BLANK_MAX_TEXT_CHARS = 8
+# 兩頁縮圖中灰階差異超過 DUPLICATE_PIXEL_DELTA 的像素比例低於此值時，視為重複頁
+DUPLICATE_MAX_DIFF_RATIO = 0.005
+DUPLICATE_PIXEL_DELTA = 32
+# 感知雜湊的邊長 (DEDUP_HASH_SIZE² 位元)；漢明距離不超過 DEDUP_MAX_DISTANCE 的頁面為候選，
+# 再以縮圖逐像素比對確認 (只有標題文字不同的簡報頁，雜湊可能幾乎相同)
+DEDUP_HASH_SIZE = 16
+DEDUP_MAX_DISTANCE = 6
+# 確認重複時的渲染倍率 (與 OCR 送出的頁面相同)；此倍率下的灰階像素需完全相同
+DUPLICATE_CONFIRM_ZOOM = 1.5
+# 參考文獻標題只在文件的後段 (頁碼位置比例) 才採用，避免把目錄中的「References」誤判為章節開始
+REFERENCE_MIN_POSITION = 0.5
+# 標題之前的文字少於此字元數 (頁首、頁碼) 時，標題所在的頁面也一併略過
+REFERENCE_HEADING_TOP_CHARS = 40
+# 參考文獻標題之後的頁面，看起來像引用條目的行數比例低於此值時視為參考文獻已結束
+REFERENCE_MIN_CITATION_RATIO = 0.3
+
+_REFERENCE_HEADING = re.compile(
+    r'^(?:\d+(?:\.\d+)*\.?|[IVX]+\.)?\s*(references?|bibliography|works cited|literature cited|'
+    r'參考文獻|參考資料|引用文獻|参考文献|参考资料)\s*[:：]?$', re.IGNORECASE)
+_APPENDIX_HEADING = re.compile(
+    r'^(?:appendix|appendices|supplementary (?:material|information)|附錄|附录)(?:\s+[A-Z0-9]+)?\b.*$',
+    re.IGNORECASE)
+# 章節標題 (頁面頂端)：參考文獻之後出現時表示下一章開始
+_CHAPTER_HEADING = re.compile(
+    r'^(?:(?:chapter|part|section)\s+(?:\d+|[IVXLC]+)\b.*|第\s*[\d一二三四五六七八九十百]+\s*[章節节篇部].*|'
+    r'\d+(?:\.\d+)*\.?\s+[A-Z][A-Za-z\s\-]{2,38})$', re.IGNORECASE)
+# 引用條目的特徵：[12] / 12. 開頭的編號、(2019) 或 2019. 的年份、et al.、doi、卷期頁碼
+_CITATION_LINE = re.compile(
+    r'^\[\d+\]|^\d+\.\s|\(\s*(?:19|20)\d{2}[a-z]?\s*\)|\b(?:19|20)\d{2}[a-z]?[.,;]|\bet al\.|\bdoi\b|'
+    r'\bpp?\.\s*\d|\bvol\.', re.IGNORECASE)
+_RANGE_PART = re.compile(r'^(\d*)\s*-\s*(\d*)$')
+
+SKIP_REASON_LABELS = {'blank': '空白頁', 'duplicate': '重複頁', 'references': '參考文獻'}
+
+
+@dataclass
+class PageSelection:
+    """
+    選取結果：indices 為要輸出的頁面索引 (從 0 開始、遞增)，skipped 為 {頁面索引: 略過原因}，
+    reused 為 {頁面索引: 代表頁面索引}，這些頁面不送給模型，直接沿用代表頁面 (較前面的頁面) 的結果。
+    """
+    indices: list[int]
+    skipped: dict[int, str] = field(default_factory=dict)
+    reused: dict[int, int] = field(default_factory=dict)
+
+    @property
+    def model_indices(self) -> list[int]:
+        """需要送給模型的頁面。"""
+        return [index for index in self.indices if index not in self.reused]
+
+    def skipped_counts(self) -> dict[str, int]:
+        counts = {}
+        for reason in self.skipped.values():
+            counts[reason] = counts.get(reason, 0) + 1
+        return counts
+
+    def describe_skipped(self) -> str:
+        return '、'.join(f"{SKIP_REASON_LABELS.get(reason, reason)} {count} 頁"
+                        for reason, count in self.skipped_counts().items())
+
+
+def parse_page_ranges(spec: str | None) -> list[tuple[int, int | None]]:
+    """
+    解析頁碼範圍字串 (頁碼從 1 開始)，例如 "1-5, 8, 10-"；返回 [(起始頁, 結束頁或 None)]。
+    空字串或 None 表示全部頁面，返回空列表。格式錯誤時拋出 ValueError。
+    """
+    spans = []
+    for part in re.split(r'[,，;；\s]+', (spec or '').strip()):
+        if not part:
+            continue
+        if part.isdigit():
+            start = end = int(part)
+        else:
+            match = _RANGE_PART.match(part.replace('–', '-').replace('~', '-'))
+            if not match or not (match.group(1) or match.group(2)):
+                raise ValueError(f"無法解析的頁碼範圍: {part}")
+            start = int(match.group(1)) if match.group(1) else 1
+            end = int(match.group(2)) if match.group(2) else None
+        if start < 1 or (end is not None and end < start):
+            raise ValueError(f"無效的頁碼範圍: {part}")
+        spans.append((start, end))
+    return spans
+
+
+def range_indices(spans: list[tuple[int, int | None]], num_pages: int) -> list[int]:
+    """將 parse_page_ranges 的結果轉為文件中存在的頁面索引 (從 0 開始、遞增、不重複)。"""
+    if not spans:
+        return list(range(num_pages))
+    selected = set()
+    for start, end in spans:
+        selected.update(range(start - 1, min(end if end is not None else num_pages, num_pages)))
+    return sorted(selected)
+
+
+def format_page_ranges(indices) -> str:
+    """range_indices 的反向：將頁面索引 (從 0 開始) 轉為頁碼範圍字串，例如 [0, 1, 2, 7] -> "1-3, 8"。"""
+    parts = []
+    for index in sorted(set(indices)):
+        if parts and parts[-1][1] == index - 1:
+            parts[-1][1] = index
+        else:
+            parts.append([index, index])
+    return ', '.join(f"{start + 1}" if start == end else f"{start + 1}-{end + 1}" for start, end in parts)
+
+
+def _page_lines(page) -> list[str]:
+    return [line.strip() for line in page.get_text("text").splitlines() if line.strip()]
+
+
+def _looks_like_bibliography(lines: list[str]) -> bool:
+    """頁面頂端沒有章節 / 附錄標題，且有足夠比例的行看起來像引用條目。"""
+    if not lines:
+        return False
+    if any(_APPENDIX_HEADING.match(line) or _CHAPTER_HEADING.match(line) for line in lines[:5]):
+        return False
+    citations = sum(1 for line in lines if _CITATION_LINE.search(line))
+    return citations / len(lines) >= REFERENCE_MIN_CITATION_RATIO
+
+
+def find_reference_pages(pdf_document, indices: list[int]) -> set[int]:
+    """
+    依文字層的標題找出參考文獻所在的頁面 (只看 indices 中的頁面)。
+    從標題的下一頁 (標題位於頁面頂端時包含該頁) 起略過，直到頁面頂端出現章節或附錄標題、
+    或頁面不再像文獻列表 (見 _looks_like_bibliography) 為止；之後的頁面可再遇到新的參考文獻標題。
+    沒有文字層的掃描檔找不到標題，返回空集合。
+    """
+    num_pages = len(pdf_document)
+    min_index = int(num_pages * REFERENCE_MIN_POSITION)
+    skipped = set()
+    in_references = False
+    for index in indices:
+        if index < min_index:
+            continue
+        lines = _page_lines(pdf_document.load_page(index))
+        if in_references:
+            if _looks_like_bibliography(lines):
+                skipped.add(index)
+                continue
+            in_references = False
+        chars_before = 0
+        for line in lines:
+            if len(line) <= 40 and _REFERENCE_HEADING.match(line):
+                in_references = True
+                if chars_before < REFERENCE_HEADING_TOP_CHARS:
+                    skipped.add(index)
+                break
+            chars_before += len(line)
+    return skipped
+
+
+def _thumbnail(page):
+    """渲染寬度約 THUMBNAIL_WIDTH 的灰階縮圖 (fitz.Pixmap)。"""
+    scale = THUMBNAIL_WIDTH / max(page.rect.width, 1)
+    return page.get_pixmap(matrix=fitz.Matrix(scale, scale), colorspace=fitz.csGRAY, alpha=False)
+
+
+def difference_hash(pixmap, size: int = DEDUP_HASH_SIZE) -> int:
+    """
+    灰階縮圖的差異雜湊 (dHash)：縮為 (size + 1) x size 後比較每列相鄰像素的明暗，共 size² 位元。
+    掃描時的輕微位移、壓縮雜訊與亮度差異幾乎不影響結果。
+    """
+    image = Image.frombytes('L', (pixmap.width, pixmap.height), pixmap.samples, 'raw', 'L', pixmap.stride)
+    pixels = list(image.resize((size + 1, size), Image.BOX).getdata())
+    bits = 0
+    for row in range(size):
+        offset = row * (size + 1)
+        for col in range(size):
+            bits = (bits << 1) | (pixels[offset + col] > pixels[offset + col + 1])
+    return bits
+
+
+def _ink_ratio(samples: bytes) -> float:
+    if not samples:
+        return 0.0
+    histogram = [0] * 256
+    for value in samples:
+        histogram[value] += 1
+    background = max(range(256), key=histogram.__getitem__)
+    return sum(histogram[:max(0, background - INK_DELTA)]) / len(samples)
+
+
+def _is_near_duplicate(a: bytes, b: bytes) -> bool:
+    if not a or len(a) != len(b):
+        return False
+    differing = sum(1 for x, y in zip(a, b) if abs(x - y) > DUPLICATE_PIXEL_DELTA)
+    return differing / len(a) < DUPLICATE_MAX_DIFF_RATIO
+
+
+def _render_digest(pdf_document, index: int, digests: dict) -> bytes | None:
+    """以 DUPLICATE_CONFIRM_ZOOM 渲染的灰階像素雜湊 (每頁只渲染一次)；渲染失敗時為 None。"""
+    if index not in digests:
+        try:
+            page = pdf_document.load_page(index)
+            pix = page.get_pixmap(matrix=fitz.Matrix(DUPLICATE_CONFIRM_ZOOM, DUPLICATE_CONFIRM_ZOOM),
+                                  colorspace=fitz.csGRAY, alpha=False)
+            digests[index] = hashlib.blake2b(pix.samples, digest_size=16).digest()
+        except Exception as e:
+            logging.warning(f"  第 {index + 1} 頁渲染失敗，不視為重複頁: {e}")
+            digests[index] = None
+    return digests[index]
+
+
+def _confirm_duplicate(pdf_document, page: tuple, other: tuple, digests: dict) -> bool:
+    """
+    縮圖接近的兩頁 (頁面索引, 文字, 是否有圖片) 是否確實相同：兩頁都只有文字時比較文字層，
+    其餘 (掃描頁、投影片圖片) 需完整渲染後像素相同，只差一個數字或標題的頁面不會被合併。
+    """
+    index, text, has_images = page
+    other_index, other_text, other_has_images = other
+    if text and other_text:
+        if text != other_text:
+            return False
+        if not has_images and not other_has_images:
+            return True
+    digest = _render_digest(pdf_document, index, digests)
+    return digest is not None and digest == _render_digest(pdf_document, other_index, digests)
+
+
+def select_pdf_pages(pdf_document, page_range: str | None = None, auto_skip: bool = True) -> PageSelection:
+    """
+    依頁碼範圍與自動略過規則決定要處理的頁面。auto_skip 為 False 時只套用頁碼範圍，
+    也不做重複頁面的合併。需在渲染執行緒開始使用文件之前呼叫 (PyMuPDF 的文件物件不可跨執行緒同時使用)。
+    重複頁的略過與結果沿用都需經過 _confirm_duplicate 確認，縮圖相近本身不足以略過頁面。
+    """
+    num_pages = len(pdf_document)
+    indices = range_indices(parse_page_ranges(page_range), num_pages)
+    if not auto_skip:
+        return PageSelection(indices)
+
+    skipped = {index: 'references' for index in find_reference_pages(pdf_document, indices)}
+    selected = []
+    reused = {}
+    previous_thumbnail = None
+    previous_page = None
+    # 已送給模型的頁面：(雜湊, 縮圖, (頁面索引, 文字, 是否有圖片))
+    representatives = []
+    # 確認重複時完整渲染的像素雜湊：頁面索引 -> 雜湊
+    digests = {}
+    for index in indices:
+        if index in skipped:
+            continue
+        page = pdf_document.load_page(index)
+        text = page.get_text("text").strip()
+        try:
+            pixmap = _thumbnail(page)
+            thumbnail = pixmap.samples
+        except Exception as e:
+            # 縮圖失敗時不做判斷，交給正式渲染處理 (失敗時會記錄為錯誤頁)
+            logging.warning(f"  第 {index + 1} 頁縮圖渲染失敗，不做空白 / 重複判斷: {e}")
+            selected.append(index)
+            previous_thumbnail = previous_page = None
+            continue
+        if len(text) <= BLANK_MAX_TEXT_CHARS and _ink_ratio(thumbnail) < BLANK_MAX_INK_RATIO:
+            skipped[index] = 'blank'
+            continue
+        current = (index, text, bool(page.get_images()))
+        # 版面相同但內容不同的頁面縮圖可能很接近，縮圖只篩選候選頁面，需再確認內容相同
+        if (previous_thumbnail is not None and _is_near_duplicate(thumbnail, previous_thumbnail)
+                and _confirm_duplicate(pdf_document, current, previous_page, digests)):
+            skipped[index] = 'duplicate'
+            continue
+        selected.append(index)
+        previous_thumbnail, previous_page = thumbnail, current
+        page_hash = difference_hash(pixmap)
+        for rep_hash, rep_thumbnail, rep_page in representatives:
+            if ((page_hash ^ rep_hash).bit_count() <= DEDUP_MAX_DISTANCE
+                    and _is_near_duplicate(thumbnail, rep_thumbnail)
+                    and _confirm_duplicate(pdf_document, current, rep_page, digests)):
+                reused[index] = rep_page[0]
+                break
+        else:
+            representatives.append((page_hash, thumbnail, current))
+    return PageSelection(selected, dict(sorted(skipped.items())), reused)
@@ -0,0 +1,226 @@
+# workflow_scripts/page_window.py
+import os
+import logging
+import threading
+import fitz  # PyMuPDF
+
+from document_pool import get_document_pool
+
+# 同時存在的已渲染頁面數上限 (包含正在送給 AI 的頁面)
+PAGE_WINDOW_SIZE = 3
+# 已渲染頁面的編碼後位元組總量上限；單頁超過上限時仍允許單獨存在
+PAGE_WINDOW_MAX_BYTES = 48 * 1024 * 1024
+# 每渲染幾頁清空一次 MuPDF 的內部快取
+STORE_SHRINK_INTERVAL = 20
+
+
+class RenderedPage:
+    """
+    一個已渲染並編碼好的頁面；處理完畢後必須呼叫 release() 歸還視窗額度。
+    渲染失敗的頁面 data 為空，error 為當時的例外。
+    """
+
+    __slots__ = ('index', 'data', 'mime_type', 'size', 'error', '_window')
+
+    def __init__(self, index: int, data: bytes, mime_type: str, window, error: Exception | None = None):
+        self.index = index
+        self.data = data
+        self.mime_type = mime_type
+        self.size = len(data)
+        self.error = error
+        self._window = window
+
+    def as_part(self) -> dict:
+        return {"mime_type": self.mime_type, "data": self.data}
+
+    def release(self):
+        if self._window is not None:
+            self._window._release(self)
+            self._window = None
+            self.data = None
+
+
+class PageWindow:
+    """
+    在背景執行緒中預先渲染頁面，但同時存在的頁面數與位元組總量都有上限；
+    消費端處理完一頁並 release() 後，渲染端才會繼續渲染下一頁。
+    render_fn(index) -> bytes 只會在渲染執行緒中被呼叫。
+
+        with PageWindow(render_fn, range(n)) as window:
+            for page in window:
+                ...
+                page.release()
+    """
+
+    def __init__(self, render_fn, page_indices, mime_type: str = "image/png",
+                 max_pages: int = PAGE_WINDOW_SIZE, max_bytes: int = PAGE_WINDOW_MAX_BYTES, metrics=None):
+        self.render_fn = render_fn
+        self.page_indices = list(page_indices)
+        self.mime_type = mime_type
+        self.max_pages = max(1, max_pages)
+        self.max_bytes = max_bytes
+        self.metrics = metrics
+        self.peak_pages = 0
+        self.peak_bytes = 0
+        self._cond = threading.Condition()
+        self._ready = []          # 已渲染、尚未被取走的頁面 (依順序)
+        self._live_pages = 0      # 已渲染、尚未 release 的頁面數
+        self._live_bytes = 0
+        self._producer_done = False
+        self._producer_waiting = False   # 渲染端正在等待額度 (消費端手上的頁面需先 release)
+        self._producer_error = None
+        self._stopped = False
+        self._thread = None
+
+    def __enter__(self):
+        self._thread = threading.Thread(target=self._produce, daemon=True, name="PageRenderThread")
+        self._thread.start()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+        return False
+
+    def close(self):
+        with self._cond:
+            self._stopped = True
+            for page in self._ready:
+                page._window = None
+                page.data = None
+            self._ready.clear()
+            self._cond.notify_all()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def _has_budget(self) -> bool:
+        if self._live_pages == 0:
+            return True
+        return self._live_pages < self.max_pages and self._live_bytes < self.max_bytes
+
+    def _produce(self):
+        try:
+            for rendered_count, index in enumerate(self.page_indices, start=1):
+                with self._cond:
+                    while not self._stopped and not self._has_budget():
+                        if not self._producer_waiting:
+                            self._producer_waiting = True
+                            self._cond.notify_all()
+                        self._cond.wait()
+                    self._producer_waiting = False
+                    if self._stopped:
+                        return
+                try:
+                    page = RenderedPage(index, self.render_fn(index), self.mime_type, self)
+                except Exception as e:
+                    # 單頁渲染失敗只影響該頁，交由消費端記錄為錯誤頁
+                    logging.error("  第 %d 頁渲染失敗: %s", index + 1, e)
+                    page = RenderedPage(index, b'', self.mime_type, self, error=e)
+                with self._cond:
+                    if self._stopped:
+                        return
+                    self._live_pages += 1
+                    self._live_bytes += page.size
+                    self.peak_pages = max(self.peak_pages, self._live_pages)
+                    self.peak_bytes = max(self.peak_bytes, self._live_bytes)
+                    self._ready.append(page)
+                    self._cond.notify_all()
+                if self.metrics is not None:
+                    self.metrics.sample_rss()
+                if rendered_count % STORE_SHRINK_INTERVAL == 0:
+                    fitz.TOOLS.store_shrink(100)
+        except Exception as e:
+            logging.error(f"  頁面渲染失敗: {e}", exc_info=True)
+            self._producer_error = e
+        finally:
+            with self._cond:
+                self._producer_done = True
+                self._cond.notify_all()
+
+    def _release(self, page: RenderedPage):
+        with self._cond:
+            self._live_pages -= 1
+            self._live_bytes -= page.size
+            self._cond.notify_all()
+
+    def __iter__(self):
+        for batch in self.iter_batches(1):
+            yield batch[0]
+
+    def iter_batches(self, batch_size: int):
+        """
+        依序產出最多 batch_size 頁的批次。渲染端因額度不足而停下時 (手上的頁面尚未 release)，
+        先產出未滿的批次，避免互相等待。
+        """
+        batch = []
+        while True:
+            with self._cond:
+                while not self._ready and not self._producer_done and not (batch and self._producer_waiting):
+                    self._cond.wait()
+                if self._ready:
+                    batch.append(self._ready.pop(0))
+                    if len(batch) < batch_size:
+                        continue
+                elif not batch:
+                    if self._producer_error is not None:
+                        raise self._producer_error
+                    return
+            yield batch
+            batch = []
+
+
+class PdfPageRenderer:
+    """
+    make_pdf_page_renderer 的返回值：render(index) -> bytes。用完後需 close() (或以 with 使用)，
+    由行程池渲染時子行程才會關閉開啟的 PDF。
+    """
+
+    def __init__(self, render_fn, close_fn=None):
+        self._render_fn = render_fn
+        self._close_fn = close_fn
+
+    def __call__(self, index: int) -> bytes:
+        return self._render_fn(index)
+
+    def close(self):
+        close_fn, self._close_fn = self._close_fn, None
+        if close_fn is not None:
+            close_fn()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+        return False
+
+
+def make_pdf_page_renderer(pdf_document, matrix=None, dpi=None, image_format: str = "png") -> PdfPageRenderer:
+    """
+    建立 PDF 頁面渲染函式。有設定文件建構行程池時 (見 document_pool)，由子行程以檔案路徑開啟同一份 PDF 渲染，
+    不佔用本行程的 GIL；沒有行程池或文件不在磁碟上時在目前的行程中渲染。
+    """
+    pool = get_document_pool()
+    pdf_path = getattr(pdf_document, 'name', None)
+    if pool is not None and pdf_path and os.path.isfile(pdf_path):
+        return PdfPageRenderer(pool.pdf_page_renderer(pdf_path, matrix, dpi, image_format),
+                               lambda: pool.close_document(pdf_path))
+    return PdfPageRenderer(make_local_pdf_page_renderer(pdf_document, matrix, dpi, image_format))
+
+
+def make_local_pdf_page_renderer(pdf_document, matrix=None, dpi=None, image_format: str = "png"):
+    """在目前的行程中渲染的 PDF 頁面渲染函式；pixmap 在編碼後立即釋放，不等 GC 回收。"""
+    pixmap_kwargs = {}
+    if matrix is not None:
+        pixmap_kwargs['matrix'] = matrix
+    if dpi is not None:
+        pixmap_kwargs['dpi'] = dpi
+    def render(index: int) -> bytes:
+        page = pdf_document.load_page(index)
+        pix = page.get_pixmap(**pixmap_kwargs)
+        try:
+            return pix.tobytes(image_format)
+        finally:
+            pix = None
+            page = None
+    return render
@@ -1,128 +1,385 @@
 # workflow_scripts/pdf_ocr_translator.py (修正版)
-import google.generativeai as genai
 import os
 import fitz  # PyMuPDF
-from PIL import Image
-import docx
 import time
-import json
+import re
 import logging
+import asyncio
+import tempfile
+from collections import deque
+from contextlib import aclosing
 from ai_config import PROMPTS # <--- 從 ai_config 導入 Prompts
+from progress_events import as_emitter
+from workflow_scripts.docx_writer import PageRecordWriter, iter_page_records
+from workflow_scripts.output_writers import DocumentResult, write_outputs
+from workflow_scripts.image_pages import ImagePageRenderer
+from workflow_scripts.page_window import PAGE_WINDOW_SIZE, PageWindow, make_pdf_page_renderer
+from workflow_scripts.page_selection import select_pdf_pages
+from task_metrics import current_task_metrics
+from task_cancel import current_cancel_token
+from model_router import RoutedModel, analyze_pdf_page, merge_page_features
+from async_engine import aiter_blocking, get_engine, ordered_map
+from logging_setup import sampled_level
 
 API_DELAY = 0.5
+# 同時進行中的頁面請求數上限；實際並行數為金鑰池的總同時請求數 (單一金鑰時為 1，即逐頁處理)。
+# 請求由 async_engine 的事件迴圈驅動，不會為每個請求佔用一條執行緒
+OCR_MAX_IN_FLIGHT = 64
+# 每個請求包含的頁數 (K)；1 表示逐頁請求。批次失敗或無法切回各頁時，改以單頁請求重試
+OCR_BATCH_SIZE = 4
 
-def _process_pdf_pages(model, prompt_text, input_pdf_path, progress_queue):
-    """通用內部函式，用於處理 PDF 頁面並返回 AI 生成的文字。"""
-    full_text = ""
+_PAGE_MARKER = re.compile(r'^[ \t]*<<<\s*PAGE\s+(\d+)\s*>>>[ \t]*$', re.MULTILINE)
+
+async def _ocr_page(model, prompt_text, rendered_page, page_features=None):
+    """送出單頁請求，返回 (頁碼, 文字, 是否成功)；頁面圖片在請求結束後立即釋放。"""
+    page_number = rendered_page.index + 1
+    route_hint = {'page': page_features} if page_features is not None else {}
+    try:
+        response = await model.generate_content_async([rendered_page.as_part()], cached_prefix=[prompt_text], **route_hint)
+
+        if hasattr(response, 'text') and response.text:
+            return page_number, response.text.strip(), True
+        block_reason = f" (Block Reason: {response.prompt_feedback.block_reason})" if hasattr(response, 'prompt_feedback') else ""
+        logging.warning("    頁面 %d: [警告: 未生成文字%s]", page_number, block_reason)
+        return page_number, f"[--- 第 {page_number} 頁處理失敗{block_reason} ---]", False
+    except Exception as page_e:
+        logging.error("    頁面 %d: [錯誤: %s]", page_number, page_e)
+        return page_number, f"[--- 第 {page_number} 頁處理錯誤: {page_e} ---]", False
+    finally:
+        rendered_page.release()
+        await asyncio.sleep(API_DELAY)
+
+def split_batch_response(text: str, page_numbers: list[int]) -> dict[int, str]:
+    """
+    依 <<<PAGE n>>> 分隔標記將批次回應切回各頁。只接受本批次的頁碼，
+    重複出現的頁碼視為不可靠而捨棄；返回 {頁碼: 文字}，缺少的頁碼不在結果中。
+    """
+    markers = [m for m in _PAGE_MARKER.finditer(text or '') if int(m.group(1)) in page_numbers]
+    counts = {}
+    for m in markers:
+        counts[int(m.group(1))] = counts.get(int(m.group(1)), 0) + 1
+    pages = {}
+    for i, m in enumerate(markers):
+        number = int(m.group(1))
+        if counts[number] > 1:
+            continue
+        end = markers[i + 1].start() if i + 1 < len(markers) else len(text)
+        pages[number] = text[m.end():end].strip()
+    return pages
+
+async def _ocr_batch(model, prompt_text, rendered_pages, features_list):
+    """
+    將多個頁面放進同一個請求，返回各頁的 (頁碼, 文字, 是否成功) 列表。
+    整批失敗時逐頁重試；回應中缺少分隔標記的頁面也改以單頁請求補齊。
+    """
+    unreadable = [page for page in rendered_pages if page.error is not None]
+    if unreadable:
+        results = []
+        for page in unreadable:
+            page.release()
+            results.append((page.index + 1, f"[--- 第 {page.index + 1} 頁讀取失敗: {page.error} ---]", False))
+        readable = [(page, f) for page, f in zip(rendered_pages, features_list) if page.error is None]
+        if readable:
+            results += await _ocr_batch(model, prompt_text, [p for p, _ in readable], [f for _, f in readable])
+        return sorted(results)
+
+    if len(rendered_pages) == 1:
+        return [await _ocr_page(model, prompt_text, rendered_pages[0], features_list[0])]
+
+    page_numbers = [page.index + 1 for page in rendered_pages]
+    # 固定的提示文字作為前綴；夠長時由 context caching 只上傳一次 (見 PooledModel)
+    prompt_prefix = [prompt_text + PROMPTS["OCR_BATCH_FORMAT"].format(page_count=len(rendered_pages))]
+    contents = []
+    for number, page in zip(page_numbers, rendered_pages):
+        contents.append(f"[頁碼 {number}]")
+        contents.append(page.as_part())
+    features = [f for f in features_list if f is not None]
+    route_hint = {'page': merge_page_features(features)} if features else {}
+    metrics = getattr(model, 'metrics', None)
+
+    def response_pages(response) -> dict[int, str]:
+        return split_batch_response(response.text if hasattr(response, 'text') else '', page_numbers)
+
+    batch_failed = False
+    try:
+        # 用量紀錄只計入回應中實際取得結果的頁數，缺少的頁面由下方的單頁請求各自記錄
+        response = await model.generate_content_async(contents, cached_prefix=prompt_prefix,
+                                                       count_pages=lambda r: len(response_pages(r)), **route_hint)
+        texts = response_pages(response)
+    except Exception as batch_e:
+        logging.warning("    第 %d-%d 頁批次請求失敗，改為逐頁處理: %s", page_numbers[0], page_numbers[-1], batch_e)
+        texts, batch_failed = {}, True
+    await asyncio.sleep(API_DELAY)
+
+    results = []
+    for number, page, page_features in zip(page_numbers, rendered_pages, features_list):
+        if number in texts:
+            page.release()
+            results.append((number, texts[number], True))
+        else:
+            results.append(await _ocr_page(model, prompt_text, page, page_features))
+    retried = len(page_numbers) - len(texts)
+    if retried and not batch_failed:
+        logging.warning("    批次回應缺少 %d/%d 頁的結果，已改以單頁請求補齊。", retried, len(page_numbers))
+    if metrics is not None:
+        metrics.increment('ocr_requests', 'batch')
+        if retried:
+            metrics.increment('ocr_requests', 'batch_page_retries', retried)
+    return results
+
+def _process_pages(model, prompt_text, render_fn, page_indices, progress, pages_path,
+                   batch_size=None, page_features=None, mime_type="image/png", reused=None):
+    """
+    通用內部函式：依序處理 page_indices 中的頁面 (PDF 頁面或圖片，由 render_fn(index) 產生影像 bytes)，
+    並將每頁的 AI 結果依頁碼順序立即附加寫入 pages_path (JSONL)。不在 page_indices 中的頁面不會被渲染或送出。
+    reused 為 {頁面索引: 代表頁面索引}：這些頁面不渲染也不送出，寫出時直接沿用代表頁面的結果。
+    每個請求包含 batch_size 頁 (預設 OCR_BATCH_SIZE)；使用金鑰池的模型時，多個請求會在 async_engine 的事件迴圈中
+    同時分派到不同的 API Key。
+    返回成功取得文字的頁數。
+    """
+    page_indices = list(page_indices)
+    num_pages = len(page_indices)
+    reused = reused or {}
+    model_indices = [index for index in page_indices if index not in reused]
+    # 等待寫出的沿用頁面 (依頁碼順序)；代表頁面一定在前面，寫到後面的頁面之前其結果已經可用
+    pending_reused = deque(index for index in page_indices if index in reused)
+    representatives = set(reused.values())
+    reusable = {}
+    pages_with_text = 0
     page_errors = 0
-    pdf_document = fitz.open(input_pdf_path)
-    num_pages = len(pdf_document)
-    logging.info(f"  PDF 共有 {num_pages} 頁，使用 Prompt: '{prompt_text[:20]}...'")
-    if progress_queue:
-        progress_queue.put(json.dumps({'type': 'progress', 'current': 0, 'total': num_pages, 'status': '開始處理頁面...'}))
-
-    for page_num in range(num_pages):
-        current_page_for_report = page_num + 1
-        logging.info(f"    處理第 {current_page_for_report}/{num_pages} 頁...")
-        if progress_queue:
-            progress_queue.put(json.dumps({'type': 'progress', 'current': current_page_for_report, 'total': num_pages, 'status': f'處理中... ({current_page_for_report}/{num_pages})'}))
-
-        page = pdf_document.load_page(page_num)
-        try:
-            pix = page.get_pixmap(matrix=fitz.Matrix(1.5, 1.5))
-            img_bytes = pix.tobytes("png")
-            image_part = {"mime_type": "image/png", "data": img_bytes}
-            
-            response = model.generate_content([prompt_text, image_part])
-
-            if hasattr(response, 'text') and response.text:
-                page_text = response.text.strip()
-                full_text += page_text + "\n\n"
-            else:
-                page_errors += 1
-                block_reason = f" (Block Reason: {response.prompt_feedback.block_reason})" if hasattr(response, 'prompt_feedback') else ""
-                logging.warning(f"    頁面 {current_page_for_report}: [警告: 未生成文字{block_reason}]")
-                full_text += f"[--- 第 {current_page_for_report} 頁處理失敗{block_reason} ---]\n\n"
-            
-            time.sleep(API_DELAY)
-        except Exception as page_e:
+    pages_done = 0
+    pool = getattr(model, 'pool', None)
+    in_flight = min(pool.max_in_flight, OCR_MAX_IN_FLIGHT) if pool is not None else 1
+    batch_size = max(1, batch_size or OCR_BATCH_SIZE)
+    logging.info(f"  共有 {num_pages} 頁" + (f" (其中 {len(reused)} 頁沿用相同頁面的結果)" if reused else "")
+                 + f"，並行數 {in_flight}，每批 {batch_size} 頁，使用 Prompt: '{prompt_text[:20]}...'")
+    progress.progress(0, num_pages, '開始處理頁面...')
+
+    cancel_token = current_cancel_token()
+    batches_sent = 0
+
+    def ocr_batch(batch):
+        nonlocal batches_sent
+        # 每批送出前檢查任務是否已被取消 (已送出的請求由 async_engine 取消)
+        if cancel_token is not None:
+            cancel_token.check()
+        batches_sent += 1
+        # 逐批的進度日誌取樣記錄 (進度本身由 progress 事件回報)
+        logging.log(sampled_level(batches_sent), "    處理第 %d-%d 頁...", batch[0].index + 1, batch[-1].index + 1)
+        features = [page_features[page.index] if page_features else None for page in batch]
+        return _ocr_batch(model, prompt_text, batch, features)
+
+    def write_page(page_writer, page_number, text, ok):
+        nonlocal pages_with_text, page_errors, pages_done
+        page_writer.write(page_number, text, ok=ok)
+        if ok and text:
+            pages_with_text += 1
+        elif not ok:
             page_errors += 1
-            logging.error(f"    頁面 {current_page_for_report}: [錯誤: {page_e}]")
-            full_text += f"[--- 第 {current_page_for_report} 頁處理錯誤: {page_e} ---]\n\n"
-            time.sleep(API_DELAY)
-    
-    pdf_document.close()
+        pages_done += 1
+        progress.progress(pages_done, num_pages, f'處理中... ({pages_done}/{num_pages})')
+
+    def write_reused(page_writer, before_index):
+        while pending_reused and pending_reused[0] < before_index:
+            index = pending_reused.popleft()
+            source = reused[index]
+            text, ok = reusable[source]
+            if not ok:
+                text = f"[--- 第 {index + 1} 頁與第 {source + 1} 頁相同，但該頁處理失敗 ---]"
+            write_page(page_writer, index + 1, text, ok)
+
+    async def process(window, page_writer):
+        # 頁面在渲染執行緒中產生，由執行緒池取出後交給事件迴圈；結果依頁碼順序寫出
+        batches = aiter_blocking(window.iter_batches(batch_size))
+        async with aclosing(ordered_map(ocr_batch, batches, in_flight)) as results:
+            async for batch_results in results:
+                for page_number, text, ok in batch_results:
+                    write_reused(page_writer, page_number - 1)
+                    write_page(page_writer, page_number, text, ok)
+                    if page_number - 1 in representatives:
+                        reusable[page_number - 1] = (text, ok)
+        write_reused(page_writer, float('inf'))
+
+    # 頁面在背景預先渲染，但同時存在的已渲染頁面數與位元組數有上限，避免大型檔案耗盡記憶體
+    metrics = current_task_metrics()
+    with PageRecordWriter(pages_path) as page_writer, \
+            PageWindow(render_fn, model_indices, mime_type=mime_type,
+                       max_pages=max(PAGE_WINDOW_SIZE, (in_flight + 1) * batch_size), metrics=metrics) as window:
+        get_engine().run(process(window, page_writer))
+
+    logging.info(f"  頁面視窗峰值: {window.peak_pages} 頁 / {window.peak_bytes / 1024 / 1024:.1f} MB")
+    if metrics is not None:
+        metrics.sample_rss()
+        metrics.extra['page_window_peak_mb'] = round(max(metrics.extra.get('page_window_peak_mb', 0), window.peak_bytes / 1024 / 1024), 1)
     if page_errors > 0:
         logging.warning(f"  注意：處理過程中出現 {page_errors} 個頁面錯誤。")
-    
-    return full_text
 
-def run_ocr_translation(api_key: str, model_name: str, input_pdf_path: str, output_word_path: str, progress_queue=None) -> bool:
-    """對 PDF 執行 OCR 和翻譯，結果儲存為 Word。"""
+    return pages_with_text
+
+def _process_pdf_pages(model, prompt_text, input_pdf_path, progress, pages_path, batch_size=None,
+                       page_range=None, auto_skip=True):
+    """
+    逐頁處理 PDF (見 _process_pages)。只處理 page_range (例如 "1-5, 8") 中的頁面；
+    auto_skip 時另外略過空白頁、重複頁與參考文獻，文件中其他位置出現過的相同頁面則沿用第一次的結果
+    (見 page_selection)，這些頁面都不會送給模型。
+    返回成功取得文字的頁數。
+    """
+    pdf_document = fitz.open(input_pdf_path)
+    try:
+        # 頁面選取與模型路由都需在渲染執行緒開始使用文件之前完成
+        selection = select_pdf_pages(pdf_document, page_range, auto_skip)
+        if selection.skipped:
+            logging.info(f"  依頁面內容略過 {len(selection.skipped)} 頁 ({selection.describe_skipped()}): "
+                         f"{', '.join(str(i + 1) for i in selection.skipped)}")
+            progress.status(f'已略過 {selection.describe_skipped()}')
+        if selection.reused:
+            logging.info(f"  {len(selection.reused)} 頁與前面的頁面相同，沿用其結果: "
+                         + ', '.join(f"{i + 1}←{r + 1}" for i, r in selection.reused.items()))
+        metrics = current_task_metrics()
+        if metrics is not None:
+            for reason, count in selection.skipped_counts().items():
+                metrics.increment('ocr_pages_skipped', reason, count)
+            if selection.reused:
+                metrics.increment('ocr_pages_skipped', 'reused', len(selection.reused))
+        if not selection.indices:
+            raise ValueError("選取的頁面範圍內沒有需要處理的頁面")
+        # 模型路由依頁面的文字層與圖片多寡選擇分級
+        page_features = None
+        if getattr(model, 'routing_enabled', False):
+            page_features = {i: analyze_pdf_page(pdf_document.load_page(i)) for i in selection.model_indices}
+        with make_pdf_page_renderer(pdf_document, matrix=fitz.Matrix(1.5, 1.5)) as render:
+            return _process_pages(model, prompt_text, render, selection.indices, progress, pages_path,
+                                  batch_size=batch_size, page_features=page_features, reused=selection.reused)
+    finally:
+        pdf_document.close()
+
+def _process_image_pages(model, prompt_text, image_paths, progress, pages_path, batch_size=None):
+    """將多張圖片當作依序排列的頁面處理 (見 _process_pages)。返回成功取得文字的頁數。"""
+    with ImagePageRenderer(image_paths) as render:
+        return _process_pages(model, prompt_text, render, range(len(image_paths)), progress, pages_path,
+                              batch_size=batch_size, mime_type="image/jpeg")
+
+def benchmark_ocr_batch_sizes(api_key: str, model_name: str, input_pdf_path: str, batch_sizes=(1, 2, 4, 8)) -> list[dict]:
+    """
+    以不同的每批頁數 (K) 對同一份 PDF 執行僅 OCR，返回各 K 的總耗時、每頁秒數與取得文字的頁數，
+    用於調整 OCR_BATCH_SIZE。結果不會寫出 Word 檔。
+    """
+    with fitz.open(input_pdf_path) as pdf_document:
+        num_pages = len(pdf_document)
+    results = []
+    with tempfile.TemporaryDirectory(prefix="ocr_batch_benchmark_") as temp_dir:
+        for batch_size in batch_sizes:
+            model = RoutedModel(model_name, api_key)
+            start = time.perf_counter()
+            pages_with_text = _process_pdf_pages(model, PROMPTS["OCR_ONLY"], input_pdf_path, as_emitter(None),
+                                                 os.path.join(temp_dir, f"k{batch_size}.jsonl"), batch_size=batch_size,
+                                                 auto_skip=False)
+            elapsed = time.perf_counter() - start
+            results.append({
+                'batch_size': batch_size,
+                'pages': num_pages,
+                'seconds': round(elapsed, 2),
+                'seconds_per_page': round(elapsed / max(num_pages, 1), 3),
+                'pages_with_text': pages_with_text,
+            })
+            logging.info(f"  [Benchmark] K={batch_size}: {elapsed:.1f} 秒，每頁 {elapsed / max(num_pages, 1):.2f} 秒，取得文字 {pages_with_text}/{num_pages} 頁")
+    return results
+
+def _pages_path_for(output_word_path: str) -> str:
+    """逐頁中繼檔與輸出的 Word 放在同一個 (任務) 資料夾中。"""
+    return os.path.splitext(output_word_path)[0] + "_pages.jsonl"
+
+def _write_page_outputs(pages_path: str, output_word_path: str, output_formats=None) -> DocumentResult:
+    """
+    由逐頁中繼檔建立 DocumentResult，寫出 Word 以及 output_formats 指定的其他格式
+    (與 Word 同名、不同副檔名，見 output_writers)。
+    """
+    result = DocumentResult.from_pages(iter_page_records(pages_path))
+    write_outputs(result, os.path.splitext(output_word_path)[0], ['docx', *(output_formats or ())])
+    return result
+
+def run_ocr_translation(api_key: str, model_name: str, input_pdf_path: str, output_word_path: str, progress=None,
+                        page_range: str | None = None, auto_skip: bool = True, output_formats=None) -> DocumentResult | None:
+    """
+    對 PDF 執行 OCR 和翻譯，結果儲存為 Word (及 output_formats 中的其他格式)。
+    page_range / auto_skip 見 _process_pdf_pages。返回結果內容，失敗時返回 None。
+    """
+    progress = as_emitter(progress)
     logging.info(f"開始 OCR 與翻譯: {os.path.basename(input_pdf_path)}")
     try:
-        model = genai.GenerativeModel(model_name)
-        translated_text = _process_pdf_pages(model, PROMPTS["OCR_TRANSLATE"], input_pdf_path, progress_queue)
-        
-        if translated_text.strip():
-            doc = docx.Document()
-            doc.add_paragraph(translated_text)
-            doc.save(output_word_path)
+        model = RoutedModel(model_name, api_key)
+        pages_path = _pages_path_for(output_word_path)
+        pages_with_text = _process_pdf_pages(model, PROMPTS["OCR_TRANSLATE"], input_pdf_path, progress, pages_path,
+                                             page_range=page_range, auto_skip=auto_skip)
+
+        if pages_with_text:
+            result = _write_page_outputs(pages_path, output_word_path, output_formats)
             logging.info(f"  翻譯 Word 檔案儲存成功: {os.path.basename(output_word_path)}")
-            return True
+            return result
         else:
             logging.warning("!! 警告: 未能從此 PDF 檔案中取得任何翻譯文字。")
-            if progress_queue: progress_queue.put(json.dumps({'type': 'error', 'message': '未能取得任何翻譯文字'}))
-            return False
+            progress.error('未能取得任何翻譯文字')
+            return None
     except Exception as e:
         logging.error(f"!! 嚴重錯誤: 執行 OCR 與翻譯時發生錯誤: {e}", exc_info=True)
-        if progress_queue: progress_queue.put(json.dumps({'type': 'error', 'message': f'處理 PDF 檔案失敗: {e}'}))
-        return False
+        progress.error(f'處理 PDF 檔案失敗: {e}')
+        return None
 
-def run_ocr_only(api_key: str, model_name: str, input_pdf_path: str, output_word_path: str, progress_queue=None) -> bool:
-    """【只】對 PDF 執行 OCR (不翻譯)，結果儲存為 Word。"""
+def run_ocr_only(api_key: str, model_name: str, input_pdf_path: str, output_word_path: str, progress=None,
+                 page_range: str | None = None, auto_skip: bool = True, output_formats=None) -> DocumentResult | None:
+    """
+    【只】對 PDF 執行 OCR (不翻譯)，結果儲存為 Word (及 output_formats 中的其他格式)。
+    page_range / auto_skip 見 _process_pdf_pages。返回結果內容，失敗時返回 None。
+    """
+    progress = as_emitter(progress)
     logging.info(f"開始僅 OCR: {os.path.basename(input_pdf_path)}")
     try:
-        model = genai.GenerativeModel(model_name)
-        ocr_text = _process_pdf_pages(model, PROMPTS["OCR_ONLY"], input_pdf_path, progress_queue)
+        model = RoutedModel(model_name, api_key)
+        pages_path = _pages_path_for(output_word_path)
+        pages_with_text = _process_pdf_pages(model, PROMPTS["OCR_ONLY"], input_pdf_path, progress, pages_path,
+                                             page_range=page_range, auto_skip=auto_skip)
 
-        if ocr_text.strip():
-            doc = docx.Document()
-            doc.add_paragraph(ocr_text)
-            doc.save(output_word_path)
+        if pages_with_text:
+            result = _write_page_outputs(pages_path, output_word_path, output_formats)
             logging.info(f"  OCR Word 檔案儲存成功: {os.path.basename(output_word_path)}")
-            return True
+            return result
         else:
             logging.warning("!! 警告: 未能從此 PDF 檔案中取得任何 OCR 文字。")
-            if progress_queue: progress_queue.put(json.dumps({'type': 'error', 'message': '未能取得任何 OCR 文字'}))
-            return False
+            progress.error('未能取得任何 OCR 文字')
+            return None
     except Exception as e:
         logging.error(f"!! 嚴重錯誤: 執行僅 OCR 時發生錯誤: {e}", exc_info=True)
-        if progress_queue: progress_queue.put(json.dumps({'type': 'error', 'message': f'處理 PDF 檔案失敗: {e}'}))
-        return False
+        progress.error(f'處理 PDF 檔案失敗: {e}')
+        return None
 
-def run_ocr_translation_for_image(api_key: str, model_name: str, input_image_path: str, output_docx_path: str, progress_queue=None) -> bool:
-    """對單張圖片執行 OCR 和翻譯。"""
-    logging.info(f"開始處理圖片 OCR 與翻譯: {os.path.basename(input_image_path)}")
+def run_ocr_translation_for_images(api_key: str, model_name: str, image_paths: list[str], output_docx_path: str, progress=None,
+                                   output_formats=None) -> DocumentResult | None:
+    """
+    對多張圖片依序執行 OCR 和翻譯，合併為一份 Word (及 output_formats 中的其他格式)。
+    圖片會先校正方向並縮小，再與 PDF 頁面一樣以批次、並行的方式送出。返回結果內容，失敗時返回 None。
+    """
+    progress = as_emitter(progress)
+    logging.info(f"開始處理 {len(image_paths)} 張圖片的 OCR 與翻譯")
     try:
-        model = genai.GenerativeModel(model_name)
-        img = Image.open(input_image_path)
-        
-        if progress_queue: progress_queue.put(json.dumps({'type': 'status', 'status': '呼叫 AI 進行辨識翻譯...'}))
-        
-        response = model.generate_content([PROMPTS["OCR_TRANSLATE"], img])
+        if not image_paths:
+            raise ValueError("沒有可處理的圖片")
+        model = RoutedModel(model_name, api_key)
+        pages_path = _pages_path_for(output_docx_path)
+        pages_with_text = _process_image_pages(model, PROMPTS["OCR_TRANSLATE"], image_paths, progress, pages_path)
 
-        if hasattr(response, 'text') and response.text:
-            translated_text = response.text.strip()
-            doc = docx.Document()
-            doc.add_paragraph(translated_text)
-            doc.save(output_docx_path)
+        if pages_with_text:
+            result = _write_page_outputs(pages_path, output_docx_path, output_formats)
             logging.info(f"圖片 OCR 翻譯結果儲存成功: {os.path.basename(output_docx_path)}")
-            return True
+            return result
         else:
-            block_reason = f" (Block Reason: {response.prompt_feedback.block_reason})" if hasattr(response, 'prompt_feedback') else ""
-            raise Exception(f"Gemini API 未能生成有效的翻譯文字{block_reason}")
+            logging.warning("!! 警告: 未能從圖片中取得任何翻譯文字。")
+            progress.error('未能取得任何翻譯文字')
+            return None
     except Exception as e:
         logging.error(f"處理圖片 OCR 與翻譯時發生錯誤: {e}", exc_info=True)
-        if progress_queue: progress_queue.put(json.dumps({'type': 'error', 'message': f'處理圖片失敗: {e}'}))
-        return False
\ No newline at end of file
+        progress.error(f'處理圖片失敗: {e}')
+        return None
+
+def run_ocr_translation_for_image(api_key: str, model_name: str, input_image_path: str, output_docx_path: str, progress=None) -> DocumentResult | None:
+    """對單張圖片執行 OCR 和翻譯。"""
+    return run_ocr_translation_for_images(api_key, model_name, [input_image_path], output_docx_path, progress)
@@ -1,137 +1,279 @@
 # workflow_scripts/pdf_splitter.py (更新版)
-import google.generativeai as genai
 import os
 import fitz  # PyMuPDF
 import json
 import logging
 import re
+from dataclasses import dataclass
 from ai_config import PROMPTS
+from progress_events import as_emitter
+from model_router import RoutedModel
+from async_engine import get_engine
+from task_cancel import check_cancelled
+from workflow_scripts.page_window import make_pdf_page_renderer
 # 導入新的桌面工具函式
-from desktop_utils import get_desktop_path, BASE_OUTPUT_FOLDER_NAME
+from desktop_utils import get_output_root
 
 def sanitize_filename(filename):
     """清理檔案名稱，移除不合法的字元。"""
     return re.sub(r'[\\/*?:"<>|]', "", filename).strip()
 
-def run_pdf_split(api_key: str, model_name: str, input_pdf_path: str, output_folder_name: str, progress_queue=None) -> tuple[int, str | None]:
+# --- 目錄探測設定 ---
+# "adaptive": 先以文字層 / 低解析度縮圖探測目錄所在頁，只將這些頁面以完整解析度送出分析
+# "fixed":    舊行為，固定送出前 15 頁與後 5 頁
+TOC_DISCOVERY_MODE = "adaptive"
+TOC_PROBE_MAX_PAGES = 40       # 探測時從文件開頭最多掃描的頁數
+TOC_PROBE_TAIL_PAGES = 5       # 探測時額外掃描的文件末尾頁數
+TOC_PROBE_THUMB_DPI = 36       # 無文字層時，縮圖探測使用的 DPI
+TOC_FULL_DPI = 150             # 送出完整分析時使用的 DPI
+TOC_MAX_PAGES_TO_SEND = 8      # 完整解析度最多送出的頁數
+TOC_MAX_IMAGE_BYTES = 24 * 1024 * 1024  # 單次分析請求中圖片的位元組總量上限
+TOC_MIN_TEXT_CHARS = 30        # 頁面文字層少於此字數時視為掃描頁
+
+TOC_KEYWORD_PATTERN = re.compile(r'目\s*錄|目\s*次|table\s+of\s+contents|\bcontents\b', re.IGNORECASE)
+# 「標題 ..... 12」或「標題 12」這類以頁碼結尾的行；羅馬數字頁碼 (前言的 iv、xii) 只在有點線引導、
+# tab 或多個空白時才採用，且需是合法的羅馬數字，避免把以 did、civil 等字結尾的內文行當成目錄項目
+_TOC_LEADER = r'(?:\.{2,}|…+|·{2,})'
+_ROMAN_NUMERAL = r'(?=[ivxlcdm])m{0,3}(?:cm|cd|d?c{0,3})(?:xc|xl|l?x{0,3})(?:ix|iv|v?i{0,3})'
+TOC_ENTRY_LINE_PATTERN = re.compile(
+    rf'(?:(?:{_TOC_LEADER}|\s)\s*[0-9]{{1,4}}|(?:{_TOC_LEADER}|\t|\s{{2,}})\s*{_ROMAN_NUMERAL})\s*$', re.IGNORECASE)
+
+
+def _fixed_toc_pages(num_pages):
+    """舊版固定取樣：前 15 頁與後 5 頁。"""
+    pages = list(range(min(15, num_pages))) + list(range(max(15, num_pages - 5), num_pages))
+    return sorted(set(pages))
+
+
+def _probe_page_indices(num_pages):
+    """探測範圍：文件開頭 TOC_PROBE_MAX_PAGES 頁與末尾 TOC_PROBE_TAIL_PAGES 頁。"""
+    head = range(min(TOC_PROBE_MAX_PAGES, num_pages))
+    tail = range(max(TOC_PROBE_MAX_PAGES, num_pages - TOC_PROBE_TAIL_PAGES), num_pages)
+    return sorted(set(head) | set(tail))
+
+
+def _score_toc_text(text):
+    """依頁面文字層判斷其為目錄頁的可能性，分數越高越像目錄。"""
+    lines = [line.strip() for line in text.splitlines() if line.strip()]
+    if not lines:
+        return 0
+    entry_lines = sum(1 for line in lines if len(line) > 2 and TOC_ENTRY_LINE_PATTERN.search(line))
+    score = 0
+    if TOC_KEYWORD_PATTERN.search("\n".join(lines[:5])):
+        score += 5
+    if entry_lines >= 3 and entry_lines / len(lines) >= 0.3:
+        score += 3 + min(entry_lines // 5, 3)
+    return score
+
+
+def _probe_toc_pages_by_text(pdf_document, probe_pages):
+    """
+    以文字層探測目錄頁。
+    返回 (目錄頁索引列表, 是否有可用的文字層)；若大部分頁面沒有文字層則視為掃描檔。
+    """
+    scores = {}
+    pages_with_text = 0
+    for page_num in probe_pages:
+        text = pdf_document.load_page(page_num).get_text("text")
+        if len(text.strip()) >= TOC_MIN_TEXT_CHARS:
+            pages_with_text += 1
+        scores[page_num] = _score_toc_text(text)
+
+    has_text_layer = pages_with_text >= max(1, len(probe_pages) // 2)
+    toc_pages = [p for p in probe_pages if scores[p] >= 5]
+    # 目錄常跨多頁，續頁通常沒有「目錄」標題，只要仍有頁碼行就一併納入
+    extended = set(toc_pages)
+    for page_num in toc_pages:
+        next_page = page_num + 1
+        while next_page in scores and scores[next_page] >= 3 and next_page not in extended:
+            extended.add(next_page)
+            next_page += 1
+    return sorted(extended), has_text_layer
+
+
+def _probe_toc_pages_by_thumbnails(model, pdf_document, probe_pages):
+    """以低解析度縮圖請 AI 找出目錄頁，只回傳頁面索引，不做完整分析。"""
+    contents = [PROMPTS["PDF_SPLIT_TOC_LOCATE"]]
+    with make_pdf_page_renderer(pdf_document, dpi=TOC_PROBE_THUMB_DPI) as render_thumbnail:
+        for page_num in probe_pages:
+            contents.append(f"[頁面索引 {page_num}]")
+            contents.append({"mime_type": "image/png", "data": render_thumbnail(page_num)})
+    # 縮圖探測只需判斷是否為目錄頁，交給最快的分級
+    response = model.generate_content(contents, generation_config={"response_mime_type": "application/json"}, tier="fast")
+    located = json.loads(response.text)
+    return sorted({int(p) for p in located if isinstance(p, (int, float)) and int(p) in probe_pages})
+
+
+def discover_toc_pages(model, pdf_document, mode=TOC_DISCOVERY_MODE):
+    """
+    找出需要以完整解析度送給 AI 分析的頁面索引。
+    adaptive 模式下先做廉價探測，探測不到目錄時退回固定取樣。
+    """
+    num_pages = len(pdf_document)
+    if mode != "adaptive":
+        return _fixed_toc_pages(num_pages)
+
+    probe_pages = _probe_page_indices(num_pages)
+    toc_pages, has_text_layer = _probe_toc_pages_by_text(pdf_document, probe_pages)
+    if toc_pages:
+        logging.info(f"  文字層探測到目錄頁: {[p + 1 for p in toc_pages]}")
+    elif not has_text_layer:
+        try:
+            toc_pages = _probe_toc_pages_by_thumbnails(model, pdf_document, probe_pages)
+            logging.info(f"  縮圖探測到目錄頁: {[p + 1 for p in toc_pages]}")
+        except Exception as e:
+            logging.warning(f"  縮圖探測目錄失敗，改用固定取樣: {e}")
+            toc_pages = []
+
+    if not toc_pages:
+        logging.info("  未探測到目錄頁，改用固定取樣 (前 15 頁與後 5 頁)。")
+        return _fixed_toc_pages(num_pages)
+    return toc_pages[:TOC_MAX_PAGES_TO_SEND]
+
+
+def analyze_toc(model, pdf_document, progress=None, toc_discovery: str = TOC_DISCOVERY_MODE) -> list[dict]:
+    """
+    找出目錄頁並請 AI 分析目錄結構，返回依頁碼排序的目錄項目 [{"title", "page"}, ...] (沒有目錄時為空列表)。
+    AI 回應不是有效的 JSON 時拋出 json.JSONDecodeError / TypeError；其他呼叫錯誤直接拋出。
+    """
+    progress = as_emitter(progress)
+
+    # --- 1. 提取頁面圖片以供 AI 分析 ---
+    progress.status('準備分析頁面...', percent=10)
+
+    image_parts = []
+    pages_to_analyze = discover_toc_pages(model, pdf_document, toc_discovery)
+    logging.info(f"  將以完整解析度分析 {len(pages_to_analyze)} 頁: {[p + 1 for p in pages_to_analyze]}")
+
+    image_bytes_total = 0
+    with make_pdf_page_renderer(pdf_document, dpi=TOC_FULL_DPI) as render:
+        for page_num in pages_to_analyze:
+            check_cancelled()
+            img_bytes = render(page_num)
+            if image_parts and image_bytes_total + len(img_bytes) > TOC_MAX_IMAGE_BYTES:
+                logging.warning(f"  分析圖片已達 {image_bytes_total / 1024 / 1024:.1f} MB 上限，略過第 {page_num + 1} 頁之後的頁面。")
+                break
+            image_bytes_total += len(img_bytes)
+            image_parts.append({"mime_type": "image/png", "data": img_bytes})
+
+    # --- 2. 呼叫 AI 分析目錄 ---
+    progress.status('AI 正在分析目錄結構...', percent=25)
+    prompt = PROMPTS["PDF_SPLIT_TOC_ANALYSIS"]
+    # 經由 async_engine 送出：任務被取消時可中止這個包含多張整頁圖片的請求
+    response = get_engine().run(model.generate_content_async([prompt] + image_parts, generation_config={"response_mime_type": "application/json"}))
+    image_parts = None  # 請求完成後立即釋放頁面圖片
+    try:
+        toc = json.loads(response.text)
+    except (json.JSONDecodeError, TypeError, AttributeError):
+        logging.error(f"解析 AI 回應的 JSON 失敗，原始回應: {getattr(response, 'text', 'N/A')}")
+        raise
+    if not toc:
+        return []
+    logging.info(f"AI 分析出的目錄結構: {toc}")
+    toc.sort(key=lambda x: x.get('page', float('inf')))
+    return toc
+
+
+@dataclass
+class TocChapter:
+    """目錄項目對應的頁面範圍 (頁面索引從 0 開始，end 包含在內)；number 為在目錄中的序號 (從 1 開始)。"""
+    number: int
+    title: str
+    start: int
+    end: int
+
+
+def toc_chapters(toc: list[dict], num_pages: int) -> list[TocChapter]:
+    """
+    將 analyze_toc 的目錄項目轉為頁面範圍：每個項目從其頁碼開始，到下一個項目的前一頁為止。
+    頁碼超出文件範圍或格式錯誤的項目會被略過 (記錄警告)。
+    """
+    chapters = []
+    for i, item in enumerate(toc):
+        try:
+            title = str(item['title']).strip()
+            start_page_index = item['page'] - 1
+
+            if start_page_index < 0 or start_page_index >= num_pages:
+                logging.warning(f"跳過無效頁碼: 標題 '{title}', 頁碼 {item['page']}")
+                continue
+
+            if i + 1 < len(toc):
+                end_page_index = toc[i + 1]['page'] - 2
+            else:
+                end_page_index = num_pages - 1
+
+            chapters.append(TocChapter(i + 1, title, start_page_index, max(start_page_index, min(end_page_index, num_pages - 1))))
+        except (KeyError, TypeError) as e:
+            logging.warning(f"跳過格式錯誤的目錄項目: {item}, 錯誤: {e}")
+    return chapters
+
+
+def run_pdf_split(api_key: str, model_name: str, input_pdf_path: str, output_folder_name: str, progress=None, toc_discovery: str = TOC_DISCOVERY_MODE) -> tuple[int, str | None]:
     """
     使用 AI 分析 PDF 目錄並進行分割。
     返回 (成功分割的檔案數量, 輸出資料夾路徑)。
     """
+    progress = as_emitter(progress)
     logging.info(f"開始智能分割 PDF: {os.path.basename(input_pdf_path)}")
-    if progress_queue:
-        progress_queue.put(json.dumps({'type': 'status', 'status': '初始化模型...', 'percent': 5}))
+    progress.status('初始化模型...', percent=5)
 
     try:
-        model = genai.GenerativeModel(model_name)
+        model = RoutedModel(model_name, api_key)
         pdf_document = fitz.open(input_pdf_path)
         num_pages = len(pdf_document)
     except Exception as e:
         logging.error(f"初始化或開啟 PDF 失敗: {e}")
-        if progress_queue: progress_queue.put(json.dumps({'type': 'error', 'message': f'開啟 PDF 失敗: {e}'}))
+        progress.error(f'開啟 PDF 失敗: {e}')
         return -1, None
 
-    # --- 1. 提取頁面圖片以供 AI 分析 ---
-    if progress_queue:
-        progress_queue.put(json.dumps({'type': 'status', 'status': '準備分析頁面...', 'percent': 10}))
-    
-    image_parts = []
-    pages_to_analyze = list(range(min(15, num_pages))) + list(range(max(15, num_pages - 5), num_pages))
-    pages_to_analyze = sorted(list(set(pages_to_analyze)))
-
-    for page_num in pages_to_analyze:
-        page = pdf_document.load_page(page_num)
-        pix = page.get_pixmap(dpi=150)
-        img_bytes = pix.tobytes("png")
-        image_parts.append({"mime_type": "image/png", "data": img_bytes})
-
-    # --- 2. 呼叫 AI 分析目錄 ---
-    if progress_queue:
-        progress_queue.put(json.dumps({'type': 'status', 'status': 'AI 正在分析目錄結構...', 'percent': 25}))
-    
     try:
-        prompt = PROMPTS["PDF_SPLIT_TOC_ANALYSIS"]
-        response = model.generate_content([prompt] + image_parts, generation_config={"response_mime_type": "application/json"})
-        toc_data_text = response.text
-        toc = json.loads(toc_data_text)
-        
+        toc = analyze_toc(model, pdf_document, progress, toc_discovery)
         if not toc:
             logging.warning("AI 未能從文件中找到目錄。")
-            if progress_queue: progress_queue.put(json.dumps({'type': 'error', 'message': 'AI 未能分析出目錄，無法分割。'}))
+            progress.error('AI 未能分析出目錄，無法分割。')
             return 0, None
-
-        logging.info(f"AI 分析出的目錄結構: {toc}")
     except (json.JSONDecodeError, TypeError, AttributeError) as e:
-        logging.error(f"解析 AI 回應的 JSON 失敗: {e}\n原始回應: {response.text if 'response' in locals() else 'N/A'}")
-        if progress_queue: progress_queue.put(json.dumps({'type': 'error', 'message': f'AI 回應格式錯誤: {e}'}))
+        progress.error(f'AI 回應格式錯誤: {e}')
         return -1, None
     except Exception as e:
         logging.error(f"呼叫 AI 分析目錄時發生錯誤: {e}")
-        if progress_queue: progress_queue.put(json.dumps({'type': 'error', 'message': f'AI 分析失敗: {e}'}))
+        progress.error(f'AI 分析失敗: {e}')
         return -1, None
 
     # --- 3. 處理頁碼並分割 PDF ---
-    if progress_queue:
-        progress_queue.put(json.dumps({'type': 'status', 'status': '正在根據目錄進行分割...', 'percent': 70}))
+    progress.status('正在根據目錄進行分割...', percent=70)
 
-    toc.sort(key=lambda x: x.get('page', float('inf')))
-    
     try:
-        desktop_path = get_desktop_path()
-        base_output_dir = os.path.join(desktop_path, BASE_OUTPUT_FOLDER_NAME)
+        base_output_dir = get_output_root()
         original_pdf_name = os.path.splitext(os.path.basename(input_pdf_path))[0]
         final_output_dir = os.path.join(base_output_dir, output_folder_name, original_pdf_name)
         os.makedirs(final_output_dir, exist_ok=True)
     except Exception as e:
         logging.error(f"建立輸出資料夾失敗: {e}")
-        if progress_queue: progress_queue.put(json.dumps({'type': 'error', 'message': f'建立桌面資料夾失敗: {e}'}))
+        progress.error(f'建立桌面資料夾失敗: {e}')
         return -1, None
         
     split_count = 0
-    for i, item in enumerate(toc):
+    for chapter in toc_chapters(toc, num_pages):
+        check_cancelled()
+        title = sanitize_filename(chapter.title)
         try:
-            title = sanitize_filename(item['title'])
-            start_page_printed = item['page']
-            
-            start_page_index = start_page_printed - 1
-
-            if start_page_index < 0 or start_page_index >= num_pages:
-                logging.warning(f"跳過無效頁碼: 標題 '{title}', 頁碼 {start_page_printed}")
-                continue
-
-            if i + 1 < len(toc):
-                end_page_printed = toc[i+1]['page']
-                end_page_index = end_page_printed - 2
-            else:
-                end_page_index = num_pages - 1
-            
-            if end_page_index < start_page_index:
-                end_page_index = start_page_index
-
             split_pdf = fitz.open()
-            split_pdf.insert_pdf(pdf_document, from_page=start_page_index, to_page=end_page_index)
+            split_pdf.insert_pdf(pdf_document, from_page=chapter.start, to_page=chapter.end)
             
-            output_filename = f"{i+1:02d}_{title}.pdf"
+            output_filename = f"{chapter.number:02d}_{title}.pdf"
             output_path = os.path.join(final_output_dir, output_filename)
             split_pdf.save(output_path)
             split_pdf.close()
             split_count += 1
             logging.info(f"已儲存分割檔案: {output_filename}")
             
-            if progress_queue:
-                 progress_queue.put(json.dumps({
-                     'type': 'progress', 
-                     'current': i + 1, 
-                     'total': len(toc),
-                     'status': f'已分割: {title}'
-                 }))
+            progress.progress(chapter.number, len(toc), f'已分割: {title}')
 
-        except (KeyError, TypeError) as e:
-            logging.warning(f"跳過格式錯誤的目錄項目: {item}, 錯誤: {e}")
-            continue
         except Exception as e:
-            logging.error(f"分割章節 '{item.get('title', 'N/A')}' 時出錯: {e}")
+            logging.error(f"分割章節 '{chapter.title}' 時出錯: {e}")
             continue
             
     pdf_document.close()
-    return split_count, final_output_dir
\ No newline at end of file
+    return split_count, final_output_dir
@@ -0,0 +1,167 @@
+# workflow_scripts/text_reader.py
+# 串流讀取文字檔案 (.docx / .txt)：逐段產出文字，不需先把整份文件載入記憶體，
+# 摘要可在檔案讀完之前就開始送出第一段。
+#
+#   for piece in iter_text_from_file(path):
+#       ...
+#
+# DOCX 直接以 iterparse 逐一讀取 word/document.xml 中的段落，不建立 python-docx 的完整物件模型；
+# TXT 由開頭的位元組判斷編碼 (BOM、UTF-8、UTF-16、Big5 / GBK)，再以增量解碼器逐塊解碼。
+
+import os
+import codecs
+import locale
+import logging
+import zipfile
+import xml.etree.ElementTree as ET
+
+# 每次產出的文字約為此字元數 (DOCX 以段落為單位，可能略多)
+TEXT_PIECE_CHARS = 64 * 1024
+# TXT 每次讀取的位元組數，以及用來判斷編碼的開頭位元組數
+READ_BLOCK_BYTES = 256 * 1024
+SNIFF_BYTES = 64 * 1024
+# 雙位元組字元中，第二個位元組小於 0xA1 的比例高於此值時判斷為 Big5 (GB2312 常用字的第二位元組都 >= 0xA1)
+BIG5_LOW_TRAIL_RATIO = 0.1
+
+_W = '{http://schemas.openxmlformats.org/wordprocessingml/2006/main}'
+_MC_FALLBACK = '{http://schemas.openxmlformats.org/markup-compatibility/2006}Fallback'
+_BOMS = (
+    (codecs.BOM_UTF32_LE, 'utf-32'),
+    (codecs.BOM_UTF32_BE, 'utf-32'),
+    (codecs.BOM_UTF8, 'utf-8-sig'),
+    (codecs.BOM_UTF16_LE, 'utf-16'),
+    (codecs.BOM_UTF16_BE, 'utf-16'),
+)
+
+
+def _decodes(sample: bytes, encoding: str) -> bool:
+    """以增量解碼器檢查 sample 是否為合法的 encoding (結尾被截斷的多位元組字元不算錯誤)。"""
+    try:
+        codecs.getincrementaldecoder(encoding)().decode(sample, final=False)
+        return True
+    except UnicodeDecodeError:
+        return False
+
+
+def _big5_low_trail_ratio(sample: bytes) -> float:
+    pairs = low = 0
+    i = 0
+    while i < len(sample) - 1:
+        if sample[i] >= 0x81:
+            pairs += 1
+            if 0x40 <= sample[i + 1] < 0xA1:
+                low += 1
+            i += 2
+        else:
+            i += 1
+    return low / pairs if pairs else 0.0
+
+
+def detect_encoding(sample: bytes) -> str:
+    """依檔案開頭的位元組判斷文字編碼；無法判斷時使用系統的預設編碼。"""
+    for bom, encoding in _BOMS:
+        if sample.startswith(bom):
+            return encoding
+    # 沒有 BOM 的 UTF-16：英數字元的另一個位元組為 0 (需在 UTF-8 之前判斷，0 本身也是合法的 UTF-8)
+    if len(sample) >= 4:
+        even_zeros, odd_zeros = sample[0::2].count(0), sample[1::2].count(0)
+        if odd_zeros > len(sample) * 0.3 and even_zeros < len(sample) * 0.05:
+            return 'utf-16-le'
+        if even_zeros > len(sample) * 0.3 and odd_zeros < len(sample) * 0.05:
+            return 'utf-16-be'
+    # 一般文字檔不含 NUL 字元；含有 0 的樣本不視為 UTF-8，避免把 \x00 送給模型
+    if 0 not in sample and _decodes(sample, 'utf-8'):
+        return 'utf-8'
+    big5_ok, gbk_ok = _decodes(sample, 'cp950'), _decodes(sample, 'gb18030')
+    if big5_ok and gbk_ok:
+        return 'cp950' if _big5_low_trail_ratio(sample) > BIG5_LOW_TRAIL_RATIO else 'gb18030'
+    if big5_ok or gbk_ok:
+        return 'cp950' if big5_ok else 'gb18030'
+    return locale.getpreferredencoding(False)
+
+
+def iter_txt_text(filepath: str, encoding: str | None = None):
+    """逐塊產出 TXT 的內容；未指定編碼時由開頭位元組判斷。無法解碼的位元組以替代字元取代。"""
+    with open(filepath, 'rb') as f:
+        head = f.read(SNIFF_BYTES)
+        encoding = encoding or detect_encoding(head)
+        logging.info(f"  文字檔編碼: {encoding} ({os.path.basename(filepath)})")
+        decoder = codecs.getincrementaldecoder(encoding)(errors='replace')
+        block = head
+        while block:
+            text = decoder.decode(block)
+            if text:
+                yield text
+            block = f.read(READ_BLOCK_BYTES)
+        tail = decoder.decode(b'', final=True)
+        if tail:
+            yield tail
+
+
+def _paragraph_text(paragraph) -> str:
+    parts = []
+    for node in paragraph.iter():
+        if node.tag == f'{_W}t':
+            parts.append(node.text or '')
+        elif node.tag == f'{_W}tab':
+            parts.append('\t')
+        elif node.tag in (f'{_W}br', f'{_W}cr'):
+            parts.append('\n')
+    return ''.join(parts)
+
+
+def iter_docx_paragraphs(filepath: str):
+    """
+    逐一產出 DOCX 本文中非空白段落的文字 (包含表格與文字方塊中的段落)。
+    以 iterparse 讀取 word/document.xml，處理完的元素立即清除，記憶體用量與文件大小無關。
+    """
+    with zipfile.ZipFile(filepath) as archive, archive.open('word/document.xml') as xml_stream:
+        body = None
+        depth = 0
+        fallback_depth = 0
+        for event, elem in ET.iterparse(xml_stream, events=('start', 'end')):
+            if event == 'start':
+                depth += 1
+                if elem.tag == f'{_W}body':
+                    body = elem
+                elif elem.tag == _MC_FALLBACK:
+                    # 相容性替代內容 (例如文字方塊的 VML 版本) 與主要內容重複，略過
+                    fallback_depth += 1
+                continue
+            depth -= 1
+            if elem.tag == _MC_FALLBACK:
+                fallback_depth -= 1
+            elif elem.tag == f'{_W}p':
+                if fallback_depth == 0:
+                    text = _paragraph_text(elem)
+                    if text.strip():
+                        yield text
+                elem.clear()
+            # <w:body> 的直接子元素處理完畢後即可從樹中移除
+            if body is not None and depth == 2:
+                body.clear()
+
+
+def iter_docx_text(filepath: str):
+    """將 DOCX 的段落以換行連接，約每 TEXT_PIECE_CHARS 字元產出一次。"""
+    buffer, size = [], 0
+    first = True
+    for paragraph in iter_docx_paragraphs(filepath):
+        buffer.append(paragraph if first else '\n' + paragraph)
+        first = False
+        size += len(buffer[-1])
+        if size >= TEXT_PIECE_CHARS:
+            yield ''.join(buffer)
+            buffer, size = [], 0
+    if buffer:
+        yield ''.join(buffer)
+
+
+def iter_text_from_file(filepath: str):
+    """依副檔名逐塊產出 .docx / .txt 的文字；連接所有片段即為完整內容。"""
+    extension = os.path.splitext(filepath)[1].lower()
+    if extension == '.docx':
+        return iter_docx_text(filepath)
+    if extension == '.txt':
+        return iter_txt_text(filepath)
+    raise ValueError(f"不支援讀取文字的檔案類型: {extension}")
@@ -1,15 +1,26 @@
 # workflow_scripts/text_summarizer.py (修改版)
-import google.generativeai as genai
 import os
-import docx
-import time
 import re
-import json # 用於進度回報
+import asyncio
 import logging # 使用 logging
+from contextlib import aclosing
+from progress_events import as_emitter # 用於進度回報
+from model_router import RoutedModel
+from async_engine import get_engine, ordered_map, aiter_blocking
+from workflow_scripts.output_writers import DocumentResult, write_outputs
+from task_cancel import check_cancelled
 
 # --- Prompt 保持不變 ---
+# 文件全文放在前面作為可快取的前綴 (context caching)，摘要指示放在後面；
+# 同一份文件重複摘要時不必再次上傳全文
+SUMMARY_DOCUMENT_TEMPLATE = """以下是需要摘要的文件全文：
+---
+{document_text}
+---
+"""
+
 SUMMARY_PROMPT = """
-請仔細閱讀並理解以下提供的文件全文。
+請仔細閱讀並理解上方提供的文件全文。
 你的任務是為這份文件生成一份【詳盡】、【保留所有重要資訊】且【結構清晰、層次分明】的【繁體中文】摘要。
 
 請嚴格遵循以下指示進行摘要與格式化：
@@ -27,126 +38,194 @@ SUMMARY_PROMPT = """
     * 確保摘要的邏輯流暢，且項目符號下的內容確實反映了原文相應部分的重點。
 5.  **格式要求：** 確保輸出的 Markdown 格式（主要依賴 `#`, `##`, `* `）正確、層次清晰，以便後續程式能準確解析。
 6.  **輸出限制：** 請【只輸出】符合上述格式要求的完整 Markdown 摘要內容，不要包含任何額外的前言（例如 "這是您的摘要："）、結語或與摘要無關的文字。輸出應直接從第一個 `# 主要主題` 開始。
-
-以下是需要摘要的文件全文：
----
-{document_text}
----
 """
 # --- Prompt 結束 ---
 
 API_DELAY = 1 # 秒
+# 超過此字元數的文件會切成多段分別摘要 (各段可分派到不同的 API Key 同時處理)，再依原順序合併
+SUMMARY_CHUNK_CHARS = 120000
+_BLANK_LINES = re.compile(r'\n\s*\n')
 
 # --- 移除 get_text_from_docx，因為文字會在 app.py 中讀取 ---
 # def get_text_from_docx(filepath): ...
 
-# +++ 修改函式簽名：接收 document_text 和 progress_queue +++
-def run_summarization(api_key: str, model_name: str, document_text: str, output_summary_path: str, progress_queue=None) -> bool:
+class _ChunkPacker:
+    """將依序加入的段落合併為不超過 max_chars 的段落群；單一段落過長時直接截斷切分。"""
+
+    def __init__(self, max_chars: int):
+        self.max_chars = max_chars
+        self.current, self.current_len = [], 0
+
+    def add(self, block: str):
+        """加入一個段落，返回因此而完成的段落群。"""
+        done = []
+        if self.current and self.current_len + len(block) > self.max_chars:
+            done.append(self.flush())
+        while len(block) > self.max_chars:
+            done.append(block[:self.max_chars])
+            block = block[self.max_chars:]
+        if self.current and self.current_len + len(block) > self.max_chars:
+            done.append(self.flush())
+        self.current.append(block)
+        self.current_len += len(block) + 2
+        return done
+
+    def flush(self) -> str:
+        chunk = "\n\n".join(self.current)
+        self.current, self.current_len = [], 0
+        return chunk
+
+
+def _iter_text_chunks(pieces, max_chars: int | None = None):
+    """
+    依空白行將逐塊讀入的文字 (見 text_reader.iter_text_from_file) 切成不超過 max_chars (預設 SUMMARY_CHUNK_CHARS)
+    的段落群，每湊滿一段就立即產出，不需等整份文件讀完。
+    """
+    max_chars = max_chars or SUMMARY_CHUNK_CHARS
+    packer = _ChunkPacker(max_chars)
+    buffer = ''
+    for piece in pieces:
+        buffer = (buffer + piece) if buffer else piece.lstrip()
+        blocks = _BLANK_LINES.split(buffer)
+        # 最後一段可能還沒讀完，留到下一塊；沒有空白行的超長內容先依 max_chars 切出
+        buffer = blocks.pop()
+        while len(buffer) > max_chars:
+            blocks.append(buffer[:max_chars])
+            buffer = buffer[max_chars:]
+        for block in blocks:
+            yield from packer.add(block)
+    buffer = buffer.rstrip()
+    if buffer:
+        yield from packer.add(buffer)
+    if packer.current:
+        yield packer.flush()
+
+
+def _split_text_chunks(text: str, max_chars: int | None = None) -> list[str]:
+    """依空白行將文字切成不超過 max_chars (預設 SUMMARY_CHUNK_CHARS) 的段落群；單一段落過長時直接截斷切分。"""
+    return list(_iter_text_chunks([text], max_chars))
+
+async def _summarize_chunks_async(model, chunks, progress) -> list:
+    async def summarize(chunk):
+        response = await model.generate_content_async(SUMMARY_PROMPT, input_chars=len(chunk),
+                                                      cached_prefix=[SUMMARY_DOCUMENT_TEMPLATE.format(document_text=chunk)])
+        # API 延遲
+        await asyncio.sleep(API_DELAY)
+        return response
+
+    pool = getattr(model, 'pool', None)
+    in_flight = pool.max_in_flight if pool is not None else 1
+    responses = []
+    # 串流讀取的段落 (產生器) 在執行緒池中逐段取出，讀檔與已送出的摘要請求同時進行；總段數要讀完才知道
+    total = len(chunks) if isinstance(chunks, list) else None
+    items = chunks if total is not None else aiter_blocking(chunks)
+    async with aclosing(ordered_map(summarize, items, in_flight)) as results:
+        async for response in results:
+            responses.append(response)
+            if total is None:
+                progress.status(f'已完成第 {len(responses)} 段摘要...')
+            elif total > 1:
+                progress.status(f'已完成第 {len(responses)}/{total} 段摘要...', percent=30 + 45 * len(responses) // total)
+    return responses
+
+def _summarize_chunks(model, chunks, progress) -> list:
+    """
+    送出各段的摘要請求 (在 async_engine 的事件迴圈中並行，並行數依金鑰池而定)，依原順序返回回應。
+    chunks 可以是列表或逐段產出的可迭代物件 (例如 _iter_text_chunks)。
+    任務被取消時，尚未完成的請求會被中止並拋出 TaskCancelled。
+    """
+    return get_engine().run(_summarize_chunks_async(model, chunks, progress))
+
+def summarize_to_markdown(model, document_text, progress=None) -> str:
     """
-    根據提供的文字內容生成摘要，並將結果儲存為 Word 文件。
+    以 model 摘要 document_text (完整文字或逐塊產出文字的可迭代物件)，返回 Markdown 摘要，不寫出檔案。
+    內容為空或 AI 未生成摘要時拋出 ValueError (訊息可直接回報給使用者)；呼叫模型的錯誤直接拋出。
+    """
+    progress = as_emitter(progress)
+    if isinstance(document_text, str):
+        # 檢查輸入文字是否有效
+        if not document_text.strip():
+            raise ValueError('輸入的文字內容為空。')
+        chunks = _split_text_chunks(document_text)
+        logging.info(f"  文字內容有效 ({len(document_text)} 字元，共 {len(chunks)} 段)，呼叫 Gemini API 生成摘要...")
+    else:
+        chunks = _iter_text_chunks(document_text)
+        logging.info("  串流讀取文字內容，逐段呼叫 Gemini API 生成摘要...")
+
+    responses = _summarize_chunks(model, chunks, progress)
+    if not responses:
+        raise ValueError('輸入的文字內容為空。')
+    failed_responses = [r for r in responses if not (hasattr(r, 'text') and r.text)]
+    if failed_responses:
+        response = failed_responses[0]
+        block_reason = ""
+        if hasattr(response, 'prompt_feedback') and response.prompt_feedback:
+             block_reason = f" (Block Reason: {response.prompt_feedback.block_reason})"
+        logging.warning(f"  !! 警告: Gemini API 未能生成有效的摘要文字{block_reason}。")
+        raise ValueError(f'AI 未能生成摘要{block_reason}')
+    return "\n\n".join(r.text.strip() for r in responses)
+
+# +++ 修改函式簽名：接收 document_text 和 progress +++
+def run_summarization(api_key: str, model_name: str, document_text, output_summary_path: str, progress=None,
+                      output_formats=None) -> DocumentResult | None:
+    """
+    根據提供的文字內容生成摘要，並將結果儲存為 Word 文件 (及 output_formats 中的其他格式，與 Word 同名)。
 
     Args:
         api_key: Gemini API 金鑰。
         model_name: 要使用的 Gemini 模型名稱。
-        document_text: 要摘要的完整文字內容。
+        document_text: 要摘要的完整文字內容，或逐塊產出文字的可迭代物件 (見 text_reader.iter_text_from_file)；
+            後者在第一段湊滿時就開始送出摘要請求，不需等整份文件讀完。
         output_summary_path: 輸出摘要 Word 檔案的路徑。
-        progress_queue: 用於傳遞進度訊息的 queue.Queue 物件 (可選)。
+        progress: 用於回報進度的 ProgressEmitter 或任何具備 put(event) 的物件 (可選)。
+        output_formats: 除了 Word 之外要同時寫出的格式，例如 ['md', 'json'] (可選)。
 
     Returns:
-        bool: 成功時返回 True，失敗時返回 False。
+        DocumentResult | None: 成功時返回摘要內容 (後續步驟可直接使用，例如產生簡報)，失敗時返回 None。
     """
+    progress = as_emitter(progress)
     logging.info(f"開始生成摘要...")
-    if progress_queue:
-        progress_queue.put(json.dumps({'type': 'status', 'status': '初始化摘要模型...', 'percent': 10})) # 提供初始進度
+    progress.status('初始化摘要模型...', percent=10) # 提供初始進度
 
     try:
         # 假設 API Key 已在外部配置
         # genai.configure(api_key=api_key)
-        model = genai.GenerativeModel(model_name)
+        model = RoutedModel(model_name, api_key)
         logging.info(f"  使用的摘要模型: {model_name}")
     except Exception as e:
         logging.error(f"  設定 Gemini 或建立模型時發生錯誤: {e}")
-        if progress_queue:
-            progress_queue.put(json.dumps({'type': 'error', 'message': f'建立摘要模型失敗: {e}'}))
-        return False
-
-    # 檢查輸入文字是否有效
-    if not document_text or not document_text.strip():
-        logging.warning("  輸入的文字內容為空。")
-        if progress_queue:
-            progress_queue.put(json.dumps({'type': 'error', 'message': '輸入的文字內容為空。'}))
-        return False
+        progress.error(f'建立摘要模型失敗: {e}')
+        return None
 
-    logging.info("  文字內容有效，呼叫 Gemini API 生成摘要...")
-    if progress_queue:
-        progress_queue.put(json.dumps({'type': 'status', 'status': '正在呼叫 AI 生成摘要...', 'percent': 30}))
+    progress.status('正在呼叫 AI 生成摘要...', percent=30)
 
     try:
-        # 使用傳入的 document_text 格式化 Prompt
-        prompt_with_text = SUMMARY_PROMPT.format(document_text=document_text)
-        response = model.generate_content(prompt_with_text)
-
-        # API 延遲
-        time.sleep(API_DELAY)
-
-        if hasattr(response, 'text') and response.text:
-            summary_markdown = response.text.strip()
-            logging.info("  摘要生成成功，正在寫入 Word 檔案...")
-            if progress_queue:
-                progress_queue.put(json.dumps({'type': 'status', 'status': '正在格式化並儲存摘要檔案...', 'percent': 80}))
-
-            try:
-                summary_doc = docx.Document()
-                lines = summary_markdown.splitlines()
-                for line in lines:
-                    line_stripped = line.strip()
-                    if not line_stripped: continue
-
-                    # --- Word 文件寫入邏輯保持不變 ---
-                    if line_stripped.startswith('# '):
-                        text = re.sub(r'^#\s+', '', line_stripped)
-                        para = summary_doc.add_paragraph(text)
-                        para.style = 'Heading 1'
-                    elif line_stripped.startswith('## '):
-                        text = re.sub(r'^##\s+', '', line_stripped)
-                        para = summary_doc.add_paragraph(text)
-                        para.style = 'Heading 2'
-                    elif line_stripped.startswith('### '):
-                         text = re.sub(r'^###\s+', '', line_stripped)
-                         para = summary_doc.add_paragraph(text)
-                         para.style = 'Heading 3'
-                    elif line_stripped.startswith('* ') or line_stripped.startswith('- '):
-                         text = re.sub(r'^[*\-]\s+', '', line_stripped)
-                         para = summary_doc.add_paragraph(text)
-                         para.style = 'List Bullet'
-                    else:
-                        para = summary_doc.add_paragraph(line_stripped)
-                # --- Word 文件寫入邏輯結束 ---
-
-                summary_doc.save(output_summary_path)
-                logging.info(f"  摘要 Word 檔案儲存成功: {os.path.basename(output_summary_path)}")
-                # 成功訊息由 workflow 函式發送
-                return True
-
-            except Exception as write_e:
-                logging.error(f"  !! 錯誤: 寫入摘要 Word 檔案 '{os.path.basename(output_summary_path)}' 時失敗: {write_e}")
-                if progress_queue:
-                    progress_queue.put(json.dumps({'type': 'error', 'message': f'寫入摘要檔案失敗: {write_e}'}))
-                return False
-        else:
-            block_reason = ""
-            if hasattr(response, 'prompt_feedback') and response.prompt_feedback:
-                 block_reason = f" (Block Reason: {response.prompt_feedback.block_reason})"
-            logging.warning(f"  !! 警告: Gemini API 未能生成有效的摘要文字{block_reason}。")
-            if progress_queue:
-                 progress_queue.put(json.dumps({'type': 'error', 'message': f'AI 未能生成摘要{block_reason}'}))
-            return False
-
+        summary_markdown = summarize_to_markdown(model, document_text, progress)
+    except ValueError as e:
+        logging.warning(f"  {e}")
+        progress.error(str(e))
+        return None
     except Exception as api_e:
         logging.error(f"  !! 錯誤: 呼叫 Gemini API 時發生錯誤: {api_e}", exc_info=True)
-        if progress_queue:
-             progress_queue.put(json.dumps({'type': 'error', 'message': f'呼叫 AI 時發生錯誤: {api_e}'}))
-        return False
+        progress.error(f'呼叫 AI 時發生錯誤: {api_e}')
+        return None
+
+    check_cancelled()
+    logging.info("  摘要生成成功，正在寫入 Word 檔案...")
+    progress.status('正在格式化並儲存摘要檔案...', percent=80)
+
+    try:
+        # Markdown 的 # / ## / ### 轉為標題，* / - 轉為項目符號；各格式由同一份內容同時寫出
+        result = DocumentResult.from_markdown(summary_markdown)
+        write_outputs(result, os.path.splitext(output_summary_path)[0], ['docx', *(output_formats or ())])
+        logging.info(f"  摘要 Word 檔案儲存成功: {os.path.basename(output_summary_path)}")
+        # 成功訊息由 workflow 函式發送
+        return result
+
+    except Exception as write_e:
+        logging.error(f"  !! 錯誤: 寫入摘要 Word 檔案 '{os.path.basename(output_summary_path)}' 時失敗: {write_e}")
+        progress.error(f'寫入摘要檔案失敗: {write_e}')
+        return None
 
 # --- (可以保留 if __name__ == '__main__': 用於單獨測試) ---
 # if __name__ == '__main__':